@@ -0,0 +1,110 @@
+# admision.py - Control de admisión: trabajo concurrente contra la BD acotado al pool
+
+import heapq
+import itertools
+import threading
+
+
+PRIORIDAD_ALTA   = 0    # llamar_paciente que tiene que recargar el ruteo desde la BD
+PRIORIDAD_NORMAL = 1    # resto de eventos de socket y rutas /api
+PRIORIDAD_BAJA   = 2    # listados del panel de administración
+
+
+class Saturado(Exception):
+    """No hay lugar en la BD ni en la cola: responder 503 con Retry-After."""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Servidor saturado, reintentar en {retry_after}s')
+        self.retry_after = retry_after
+
+
+class _Espera:
+    __slots__ = ('prioridad', 'evento', 'admitido', 'rechazado')
+
+    def __init__(self, prioridad):
+        self.prioridad = prioridad
+        self.evento    = threading.Event()
+        self.admitido  = False
+        self.rechazado = False
+
+
+class ControlAdmision:
+    """
+    Semáforo con prioridades delante de la BD.
+
+    - Hasta `capacidad` trabajos a la vez (pool_size + max_overflow): nadie
+      espera dentro del pool, donde el timeout es de 30 s.
+    - Los demás esperan en una cola corta (`cola_max`) como máximo `espera`
+      segundos; el lugar que se libera va al de mejor prioridad.
+    - Con la cola llena, un pedido de más prioridad desplaza al peor de la
+      cola (que recibe 503); si no hay a quién desplazar, el que llega recibe
+      503 en el acto. Fallar rápido evita que las screens y recepciones
+      reintenten encima de pedidos que igual iban a vencer.
+    """
+
+    def __init__(self, capacidad, cola_max=20, espera=2.0, retry_after=2):
+        self.capacidad   = capacidad
+        self.cola_max    = cola_max
+        self.espera      = espera
+        self.retry_after = retry_after
+        self._en_uso     = 0
+        self._cola       = []    # heap (prioridad, seq, _Espera)
+        self._seq        = itertools.count()
+        self._lock       = threading.Lock()
+        self.admitidos   = 0
+        self.rechazados  = 0
+
+    def _rechazar(self):
+        self.rechazados += 1
+        return Saturado(self.retry_after)
+
+    def entrar(self, prioridad=PRIORIDAD_NORMAL):
+        with self._lock:
+            if self._en_uso < self.capacidad and not self._cola:
+                self._en_uso   += 1
+                self.admitidos += 1
+                return
+
+            if len(self._cola) >= self.cola_max:
+                peor = max(self._cola, key=lambda e: (e[0], e[1]))
+                if peor[0] <= prioridad:
+                    raise self._rechazar()
+                self._cola.remove(peor)
+                heapq.heapify(self._cola)
+                peor[2].rechazado = True
+                peor[2].evento.set()
+
+            espera = _Espera(prioridad)
+            heapq.heappush(self._cola, (prioridad, next(self._seq), espera))
+
+        espera.evento.wait(self.espera)
+
+        with self._lock:
+            if espera.admitido:
+                self.admitidos += 1
+                return
+            if not espera.rechazado:
+                # Venció la espera: sale de la cola
+                self._cola = [e for e in self._cola if e[2] is not espera]
+                heapq.heapify(self._cola)
+            raise self._rechazar()
+
+    def salir(self):
+        with self._lock:
+            if self._cola:
+                # El lugar pasa directo al mejor de la cola (no vuelve a competir)
+                _, _, siguiente = heapq.heappop(self._cola)
+                siguiente.admitido = True
+                siguiente.evento.set()
+            else:
+                self._en_uso -= 1
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'capacidad':  self.capacidad,
+                'en_uso':     self._en_uso,
+                'en_cola':    len(self._cola),
+                'admitidos':  self.admitidos,
+                'rechazados': self.rechazados,
+            }
@@ -1,14 +1,30 @@
 from gevent import monkey
 monkey.patch_all()
-from flask import Flask, request, jsonify, render_template, redirect
+from bd_gevent import hacer_cooperativo
+hacer_cooperativo()   # psycopg2 cede al hub de gevent mientras espera a PostgreSQL
+from flask import Flask, request, jsonify, render_template, redirect, send_file, Response, g
 from flask_cors import CORS
 from datetime import datetime, timedelta, timezone
 from functools import wraps
-import os, hashlib
-from gtts import gTTS
+import os
+import re
+from concurrent.futures import TimeoutError as TTSTimeoutError
 import jwt
-from models import db, Usuario, init_db, Pantalla, Paciente, Turno, uuid, pantalla_recepciones
+from models import (db, Usuario, init_db, Pantalla, Paciente, Turno, uuid, pantalla_recepciones,
+                    normalizar_nombre, SecuenciaPaciente)
 from config import config
+from tts import MotorTTS, textos_anuncio
+from tts_proveedores import crear_cadena
+from sesiones_screen import RegistroSesionesScreen
+from estado_compartido import crear_almacen
+from difusion_socketio import opciones_difusion
+from ruteo_llamados import TablaRuteo
+from llamados_recientes import HistorialLlamados
+from planificador import Planificador
+from admision import ControlAdmision, Saturado, PRIORIDAD_ALTA, PRIORIDAD_NORMAL, PRIORIDAD_BAJA
+from cola_recepcion import (cola_actual, paciente_en_cola, registrar_cambio, cambios_desde,
+                            buscar_turno_activo, codigo_turno_activo, reconstruir_indice,
+                            verificar_indice, usar_almacen)
 from flask_socketio import SocketIO, emit, join_room
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
@@ -57,9 +73,30 @@ with app.app_context():
     except Exception as e:
         print(f'❌ Error de conexión: {e}')
 
+# Estado compartido entre workers (ver estado_compartido.py): feed de la cola
+# de recepción, altas/bajas del cache de TTS, conexiones de las screens (sid /
+# device / pantalla), su grace period al desconectarse y los últimos llamados
+almacen_estado = crear_almacen(app.config['ESTADO_URL'])
+usar_almacen(almacen_estado)
+print(f"[ESTADO] 🗄️ Estado compartido en: {almacen_estado.nombre}")
+
 TTS_CACHE_DIR = os.path.join(os.path.dirname(__file__), 'static', 'tts_cache')
 os.makedirs(TTS_CACHE_DIR, exist_ok=True)
 
+motor_tts = MotorTTS(TTS_CACHE_DIR,
+                     workers=app.config['TTS_WORKERS'],
+                     timeout=app.config['TTS_TIMEOUT'],
+                     max_bytes=int(app.config['TTS_CACHE_MAX_MB'] * 1024 * 1024),
+                     memoria_bytes=int(app.config['TTS_MEMORIA_MB'] * 1024 * 1024),
+                     beep_mp3=app.config['TTS_BEEP_MP3'],
+                     proveedores=crear_cadena(app.config['TTS_PROVEEDORES'],
+                                              timeout=app.config['TTS_PROVEEDOR_TIMEOUT'],
+                                              umbral=app.config['TTS_CIRCUITO_FALLOS'],
+                                              espera=app.config['TTS_CIRCUITO_ESPERA'],
+                                              voz=app.config['TTS_VOZ']),
+                     voz=app.config['TTS_VOZ'],
+                     almacen=almacen_estado)
+
 # JWT Secret — en produccion usa variable de entorno
 JWT_SECRET = os.environ.get('JWT_SECRET', 'jwt-secret-turnero-2024-cambiar-en-produccion')
 JWT_EXPIRATION_HOURS = 8  # Token expira en 8 horas
@@ -67,13 +104,30 @@ JWT_EXPIRATION_HOURS = 8  # Token expira en 8 horas
 migrate = Migrate(app, db)
 
 CORS(app, supports_credentials=True, origins=['*'])
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='gevent', logger=False, engineio_logger=False)
-
-_ultimo_llamado=None
-_screen_sids={}
-_screen_pantalla = {}  
-_screen_disconnect_timers={}
-_screen_disconnect_active = {}      
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='gevent', logger=False, engineio_logger=False,
+                    **opciones_difusion(app.config['SOCKETIO_COLA'], app.config['SOCKETIO_CANAL'],
+                                        app.config['SQLALCHEMY_DATABASE_URI']))
+
+SCREEN_GRACIA_SEG = 5
+sesiones_screen   = RegistroSesionesScreen(almacen_estado, ttl=300)
+
+# recepcionista → pantalla/panel para llamar_paciente sin ir a la BD
+tabla_ruteo = TablaRuteo(almacen_estado, revision=app.config['RUTEO_REVISION_SEG'])
+
+# Últimos llamados de cada panel de cada pantalla, para restaurar screens que reconectan
+historial_llamados = HistorialLlamados(almacen_estado,
+                                       por_panel=app.config['LLAMADOS_POR_PANEL'],
+                                       vigencia=app.config['LLAMADO_VIGENCIA_SEG'])
+
+# Trabajo simultáneo contra la BD acotado al pool (ver admision.py): lo que no
+# entra espera poco en una cola con prioridades y, si no hay lugar, 503 inmediato
+_opciones_pool     = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+control_admision   = ControlAdmision(
+    app.config['ADMISION_CAPACIDAD'] or (_opciones_pool.get('pool_size', 5) + _opciones_pool.get('max_overflow', 10)),
+    cola_max=app.config['ADMISION_COLA'],
+    espera=app.config['ADMISION_ESPERA'],
+    retry_after=app.config['ADMISION_RETRY_AFTER'])
+print(f"[ADMISION] 🚦 Capacidad {control_admision.capacidad} | cola {control_admision.cola_max}")
 
 # ===================================
 # HELPERS JWT       
@@ -388,7 +442,8 @@ def screen():
 def generar_tts():
     """
     Genera o devuelve desde cache un MP3 con el texto del turno.
-    Body: { "texto": "Paciente Juan García. Código A C 1. Diríjase a recepción 2." }
+    Body: { "texto": "Paciente Juan García. Código A, C, 1.", "beep": false }
+    Los anuncios de llamado se arman con fragmentos cacheados (ver tts.py).
     """
     try:
         data  = request.get_json()
@@ -397,28 +452,160 @@ def generar_tts():
         if not texto:
             return jsonify({'success': False, 'message': 'Texto vacío'}), 400
 
-        # Cache por hash del texto — evita regenerar el mismo anuncio
-        hash_key   = hashlib.md5(texto.encode()).hexdigest()
-        nombre_mp3 = f"{hash_key}.mp3"
-        ruta_mp3   = os.path.join(TTS_CACHE_DIR, nombre_mp3)
-
-        if not os.path.exists(ruta_mp3):
-            tts = gTTS(text=texto, lang='es', slow=False)
-            tts.save(ruta_mp3)
-            print(f"[TTS] 🔊 MP3 generado: {nombre_mp3}")
-        else:
+        # Cache por hash del texto — evita regenerar el mismo anuncio.
+        # La síntesis corre en el pool de motor_tts: pedidos simultáneos del
+        # mismo texto comparten un único trabajo.
+        nombre_mp3, desde_cache = motor_tts.obtener(texto, beep=bool(data.get('beep')))
+        if desde_cache:
             print(f"[TTS] 📦 MP3 desde cache: {nombre_mp3}")
 
         return jsonify({
             'success': True,
-            'url':     f'/static/tts_cache/{nombre_mp3}'
+            'url':     f'/api/tts/audio/{nombre_mp3}'
         }), 200
 
+    except TTSTimeoutError:
+        print(f"[TTS] ⏱️ Timeout sintetizando: {texto[:40]}")
+        return jsonify({'success': False, 'message': 'Tiempo de síntesis agotado'}), 504
+
+    except Exception as e:
+        print(f"[TTS] ❌ Error: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+_RE_AUDIO_TTS = re.compile(r'^([0-9a-f]{32})(-d)?\.mp3$')
+
+
+def _respuesta_audio(nombre_mp3):
+    """
+    Sirve un MP3 del cache. El nombre es el hash del contenido, así que lleva
+    ETag fuerte y Cache-Control inmutable; make_conditional resuelve
+    If-None-Match (304) y Range (206). El audio de respaldo (-d) no se cachea.
+
+    Caliente: bytes desde la RAM de motor_tts. Frío: send_file, que con
+    gunicorn usa wsgi.file_wrapper (sendfile del sistema, sin pasar por Python);
+    después se sube a RAM para los replays.
+    """
+    degradado = nombre_mp3.endswith('-d.mp3')
+    datos     = None if degradado else motor_tts.memoria.obtener(nombre_mp3)
+
+    if datos is not None:
+        resp = Response(datos, mimetype='audio/mpeg')
+        resp.set_etag(nombre_mp3[:32])
+        resp.cache_control.public    = True
+        resp.cache_control.max_age   = 31536000
+        resp.cache_control.immutable = True
+        return resp.make_conditional(request, accept_ranges=True, complete_length=len(datos))
+
+    try:
+        resp = send_file(os.path.join(TTS_CACHE_DIR, nombre_mp3), mimetype='audio/mpeg',
+                         conditional=True,
+                         etag=False if degradado else nombre_mp3[:32],
+                         max_age=None if degradado else 31536000)
+    except FileNotFoundError:
+        # Desalojado (por otro worker) entre la consulta al índice y el envío
+        if not degradado:
+            motor_tts.cache.quitar(nombre_mp3[:32])
+        return jsonify({'success': False, 'message': 'Audio no encontrado'}), 404
+    if degradado:
+        resp.cache_control.no_store = True
+    else:
+        resp.cache_control.public    = True
+        resp.cache_control.immutable = True
+        motor_tts.promover(nombre_mp3)
+    return resp
+
+
+@app.route('/api/tts/audio', methods=['GET'])
+@app.route('/api/tts/audio/<nombre_mp3>', methods=['GET'])
+def audio_tts(nombre_mp3=None):
+    """
+    MP3 de un anuncio en un solo GET, sintetizándolo si hace falta.
+    - /api/tts/audio?texto=...[&beep=1]          (lo que usa screen_turnos.js)
+    - /api/tts/audio/<hash>.mp3[?texto=...]      (URL que devuelve POST /api/tts)
+    """
+    texto = request.args.get('texto', '').strip()
+    beep  = request.args.get('beep') == '1'
+
+    if nombre_mp3 is not None:
+        m = _RE_AUDIO_TTS.match(nombre_mp3)
+        if not m:
+            return jsonify({'success': False, 'message': 'Audio no encontrado'}), 404
+        if m.group(2):
+            if not os.path.exists(os.path.join(TTS_CACHE_DIR, nombre_mp3)):
+                return jsonify({'success': False, 'message': 'Audio no encontrado'}), 404
+            return _respuesta_audio(nombre_mp3)
+        if texto and motor_tts.clave_pedido(texto, beep) != m.group(1):
+            return jsonify({'success': False, 'message': 'El hash no corresponde al texto'}), 400
+        if not texto:
+            if not motor_tts.cache.consultar(m.group(1)):
+                return jsonify({'success': False, 'message': 'Audio no encontrado'}), 404
+            return _respuesta_audio(nombre_mp3)
+    elif not texto:
+        return jsonify({'success': False, 'message': 'Texto vacío'}), 400
+
+    try:
+        nombre_mp3, _ = motor_tts.obtener(texto, beep=beep)
+        return _respuesta_audio(nombre_mp3)
+
+    except TTSTimeoutError:
+        print(f"[TTS] ⏱️ Timeout sintetizando: {texto[:40]}")
+        return jsonify({'success': False, 'message': 'Tiempo de síntesis agotado'}), 504
+
     except Exception as e:
         print(f"[TTS] ❌ Error: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+@app.route('/api/tts/cache', methods=['GET'])
+@rol_requerido('admin')
+def estadisticas_tts_cache():
+    """Hit ratio, bytes en uso y desalojos del cache de MP3."""
+    return jsonify({
+        'success':      True,
+        'cache':        motor_tts.cache.estadisticas(),
+        'memoria':      motor_tts.memoria.estadisticas(),
+        'sintesis':     motor_tts.sintesis,
+        'canonizacion': motor_tts.estadisticas_canon(),
+        'proveedores':  motor_tts.proveedores.estado()
+    }), 200
+
+
+def _recepciones_vinculadas():
+    """Nombres de los recepcionistas asignados a alguna pantalla vinculada."""
+    stmt = (db.select(Usuario.nombre_completo)
+            .join(pantalla_recepciones, pantalla_recepciones.c.recepcionista_id == Usuario.id)
+            .join(Pantalla, Pantalla.id == pantalla_recepciones.c.pantalla_id)
+            .where(Pantalla.estado == 'vinculada'))
+    return [n for n in db.session.execute(stmt).scalars() if n]
+
+
+def precalentar_anuncio(nombre, codigo_turno):
+    """
+    Encarga en segundo plano el audio con que las pantallas van a anunciar
+    este turno, para que llamar_paciente encuentre el MP3 ya en cache.
+    Nunca interrumpe el registro: cualquier error solo se loguea.
+    """
+    try:
+        encargados = motor_tts.precalentar(
+            textos_anuncio(nombre, codigo_turno, _recepciones_vinculadas()))
+        if encargados:
+            print(f"[TTS] 🔥 Precalentando {encargados} anuncio(s) de {codigo_turno}")
+    except Exception as e:
+        print(f"[TTS] ⚠️ No se pudo precalentar {codigo_turno}: {e}")
+
+
+def descartar_anuncio(nombre, codigo_turno):
+    """Borra el audio precalentado de un turno reemplazado o eliminado."""
+    if not codigo_turno:
+        return
+    try:
+        # Solo "Paciente X. Código Y.": el "Diríjase a recepción N." es compartido
+        motor_tts.descartar(textos_anuncio(nombre, codigo_turno))
+    except Exception as e:
+        print(f"[TTS] ⚠️ No se pudo descartar {codigo_turno}: {e}")
+
+
 
 # ===================================
 # RUTAS DE GESTION DE USUARIOS
@@ -492,6 +679,7 @@ def create_user():
         print(f"[{datetime.now()}] Usuario creado: {usuario} - Rol: {rol}")
 
         if new_user.rol == 'medico':
+            registrar_cambio('reinicio')
             socketio.emit('usuario_actualizado', {
                 'tipo':    'nuevo',
                 'usuario': {
@@ -574,6 +762,9 @@ def desactivar_usuario(user_id):
         }
 
         # Notificar a TODAS las salas relevantes para que las páginas "caigan"
+        if user.rol == 'medico':
+            registrar_cambio('reinicio')
+
         salas = ['admin', 'registro', 'recepcion', user.rol]
         for sala in set(salas):  # set() evita duplicados
             socketio.emit('usuario_desactivado', payload, room=sala)
@@ -613,6 +804,9 @@ def restaurar_usuario(user_id):
             }
         }
 
+        if user.rol == 'medico':
+            registrar_cambio('reinicio')
+
         salas = ['admin', 'registro', 'recepcion', user.rol]
         for sala in set(salas):
             socketio.emit('usuario_restaurado', payload, room=sala)
@@ -653,6 +847,7 @@ def vaciar_papelera_usuarios():
             db.session.delete(user)
 
         db.session.commit()
+        tabla_ruteo.invalidar()
 
         # Notificar a todas las salas
         for uid, rol, usuario, nombre in datos:
@@ -701,6 +896,7 @@ def delete_user(user_id):
 
         db.session.delete(user)
         db.session.commit()
+        tabla_ruteo.invalidar()
 
         payload = {'usuario_id': uid, 'rol': rol, 'usuario': usuario_nombre, 'nombre': nombre}
         for sala in set(['admin', 'registro', 'recepcion', rol]):
@@ -735,6 +931,7 @@ def update_user(user_id):
             if existente and str(existente.id) != user_id:
                 return jsonify({'success': False, 'message': 'El nombre de usuario ya existe'}), 400
 
+        rol_anterior         = user.rol
         user.usuario         = nuevo_usuario
         user.nombre_completo = data.get('nombre_completo', user.nombre_completo)
         user.rol             = data.get('rol', user.rol)
@@ -744,6 +941,10 @@ def update_user(user_id):
             user.set_password(data['password'])
 
         db.session.commit()
+        tabla_ruteo.invalidar()
+
+        if 'medico' in (rol_anterior, user.rol):
+            registrar_cambio('reinicio')
 
         payload_admin = {
             'tipo':    'edicion',
@@ -791,7 +992,7 @@ def update_user(user_id):
 def get_pantallas():
     try:
         pantallas = Pantalla.query.order_by(Pantalla.numero).all()
-        return jsonify({'success': True, 'pantallas': [p.to_dict() for p in pantallas]}), 200
+        return jsonify({'success': True, 'pantallas': Pantalla.serializar(pantallas)}), 200
     except Exception as e:
         print(f'[ERROR get_pantallas] {e}')
         return jsonify({'success': False, 'message': 'Error al obtener pantallas'}), 500
@@ -802,7 +1003,7 @@ def get_pantallas():
 def get_pantallas_recepcion():
     try:
         pantallas = Pantalla.query.all()
-        return jsonify({'success': True, 'pantallas': [p.to_dict() for p in pantallas]}), 200
+        return jsonify({'success': True, 'pantallas': Pantalla.serializar(pantallas)}), 200
     except Exception as e:
         return jsonify({'success': False, 'message': 'Error al obtener pantallas'}), 500
 
@@ -856,6 +1057,7 @@ def limpiar_historial_recepcion():
             # Limpiar historial SOLO de sus pantallas
             for pantalla in pantallas_suyas:
                 sala_pantalla = f'screen_{pantalla.id}'
+                historial_llamados.limpiar(pantalla.id)
                 socketio.emit('limpiar_historial', {
                     'motivo': 'limpiar_manual',
                     'numRecepcion': usuario.nombre_completo,
@@ -897,6 +1099,7 @@ def limpiar_historial_recepcion():
             
             for pantalla in pantallas_recepcionista:
                 sala_pantalla = f'screen_{pantalla.id}'
+                historial_llamados.limpiar(pantalla.id)
                 socketio.emit('limpiar_historial', {
                     'motivo': 'limpiar_manual',
                     'numRecepcion': recepcionista.nombre_completo,
@@ -995,6 +1198,8 @@ def vincular_pantalla(pantalla_id):
         receps_data = [{'id': str(r.id), 'nombre_completo': r.nombre_completo, 'orden': i}
                        for i, r in enumerate(recepcionistas)]
 
+        tabla_ruteo.invalidar()
+
         socketio.emit('pantalla_vinculada', {
             'pantalla_id':    str(pantalla.id),
             'numero':         pantalla.numero,
@@ -1013,7 +1218,8 @@ def vincular_pantalla(pantalla_id):
         return jsonify({
             'success':  True,
             'message':  'Pantalla vinculada',
-            'pantalla': pantalla.to_dict()
+            'pantalla': pantalla.to_dict([Pantalla.dict_recepcionista(r, i)
+                                          for i, r in enumerate(recepcionistas)])
         }), 200
 
     except Exception as e:
@@ -1034,6 +1240,7 @@ def desvincular_pantalla(pantalla_id):
         pantalla.estado             = 'disponible'
         pantalla.vinculada_at       = None
         db.session.commit()
+        tabla_ruteo.invalidar()
 
         socketio.emit('pantalla_desvinculada', {
             'pantalla_id': str(pantalla.id),
@@ -1105,6 +1312,7 @@ def asignar_recepcionistas(pantalla_id):
         # Actualizar FK legacy
         pantalla.recepcionista_id = recepcionistas[0].id if recepcionistas else None
         db.session.commit()
+        tabla_ruteo.invalidar()
 
         receps_data = [{'id': str(r.id), 'nombre_completo': r.nombre_completo, 'orden': i}
                        for i, r in enumerate(recepcionistas)]
@@ -1126,7 +1334,8 @@ def asignar_recepcionistas(pantalla_id):
             'success':        True,
             'message':        f'{len(recepcionistas)} recepcionista(s) asignado(s)',
             'recepcionistas': receps_data,
-            'pantalla':       pantalla.to_dict()
+            'pantalla':       pantalla.to_dict([Pantalla.dict_recepcionista(r, i)
+                                                for i, r in enumerate(recepcionistas)])
         }), 200
 
     except Exception as e:
@@ -1194,6 +1403,12 @@ def screen_status():
         pantalla.ultima_conexion = datetime.utcnow()
         db.session.commit()
 
+        # Latido de la screen: mantiene vivo su registro de sesión compartido
+        try:
+            sesiones_screen.renovar_device(device_fingerprint)
+        except Exception as e:
+            print(f"[SCREEN] ⚠️ No se pudo renovar la sesión de {device_fingerprint}: {e}")
+
         return jsonify({'success': True, 'status': pantalla.estado, 'pantalla': pantalla.to_dict()}), 200
 
     except Exception as e:
@@ -1380,6 +1595,9 @@ def generar_codigo_paciente(medico_id, motivo):
     - LETRA: Primera letra del NOMBRE (ignorando "Dr." o "Dra.")
     - MOTIVO: Primera letra del motivo (C=Consulta, I=Información)
     - SECUENCIA: 001, 002, 003... (secuencial por médico+motivo)
+
+    La secuencia sale de SecuenciaPaciente (contador atómico por médico+motivo),
+    así dos registros simultáneos nunca obtienen el mismo número.
     """
     
     # Obtener médico
@@ -1409,28 +1627,42 @@ def generar_codigo_paciente(medico_id, motivo):
     else:
         letra_motivo = motivo[0].upper() if motivo else 'X'
     
-    # 3️⃣ Contar pacientes previos con esta combinación (médico+motivo)
-    pacientes_previos = Paciente.query.filter(
-        Paciente.medico_id == medico_id,
-        Paciente.motivo == motivo
-    ).count()
-    secuencia = f"{pacientes_previos + 1:03d}"  # 001, 002, 003...
+    # 3️⃣ Reservar el siguiente número del contador (médico+motivo)
+    numero    = SecuenciaPaciente.siguiente(medico_id, motivo)
+    secuencia = f"{numero:03d}"  # 001, 002, 003...
     
     codigo_paciente = f"{letra_medico}-{letra_motivo}-{secuencia}"
     
     print(f"[GEN_PAC] Motivo: {motivo} → {letra_motivo}")
-    print(f"[GEN_PAC] Pacientes previos (medico+motivo): {pacientes_previos}")
+    print(f"[GEN_PAC] Secuencia reservada (medico+motivo): {numero}")
     print(f"[GEN_PAC] código_paciente final: {codigo_paciente}")
     
     return codigo_paciente
 
+def _filtro_prefijo(columna, prefijo):
+    """
+    WHERE columna empieza con `prefijo`, de forma que use un índice:
+    - PostgreSQL: LIKE 'prefijo%' (ix_turnos_codigo_turno_pattern, text_pattern_ops)
+    - SQLite: rango [prefijo, prefijo+1) sobre ix_turnos_codigo_turno
+    """
+    if db.engine.dialect.name == 'postgresql':
+        escapado = prefijo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return columna.like(escapado + '%', escape='\\')
+    return db.and_(columna >= prefijo,
+                   columna <  prefijo[:-1] + chr(ord(prefijo[-1]) + 1))
+
+
 def generar_codigo_turno(paciente_id, medico_id, motivo):
     """
     Genera un código de turno ÚNICO SIN sufijo -Tn.
     
-    Si el código del paciente ya existe en BD, incrementa el número final:
-    - "M-I-001" existe → intenta "M-I-002" → ✅
+    Si el código del paciente ya existe en BD, usa el número final siguiente
+    al más alto ya usado con el mismo prefijo:
+    - "M-I-001" existe y el mayor es "M-I-004" → "M-I-005" ✅
     - Sin agregar sufijo -T1, -T2, etc.
+
+    Se resuelve en UNA consulta (existe la base + mayor código del prefijo),
+    sin importar cuántos turnos tuvo el paciente.
     """
     
     paciente = db.session.get(Paciente, paciente_id)
@@ -1442,29 +1674,36 @@ def generar_codigo_turno(paciente_id, medico_id, motivo):
         paciente.codigo_paciente = generar_codigo_paciente(medico_id, motivo)
         db.session.flush()
 
-    # 2️⃣ Base del código
+    # 2️⃣ Base del código y prefijo a incrementar
     codigo_base = paciente.codigo_paciente
-    codigo_turno = codigo_base
-    contador = 0
-    
-    # 3️⃣ Si el código ya existe, incrementar número final
-    while Turno.query.filter_by(codigo_turno=codigo_turno).first():
-        contador += 1
-        
-        # Extraer partes y incrementar el número final
-        partes = codigo_base.split('-')
-        
-        if partes[-1].isdigit():
-            # Si termina en número (ej: "M-I-001"), incrementar ese número
-            numero = int(partes[-1]) + contador
-            codigo_turno = '-'.join(partes[:-1]) + f"-{numero:03d}"
-        else:
-            # Si no termina en número, simplemente agregar contador
-            codigo_turno = f"{codigo_base}-{contador}"
-        
-        # Prevención de loop infinito
-        if contador > 1000:
-            raise Exception("No se pudo generar código único de turno")
+    partes      = codigo_base.split('-')
+
+    if partes[-1].isdigit():
+        # Si termina en número (ej: "M-I-001"), se incrementa ese número
+        prefijo     = '-'.join(partes[:-1]) + '-'
+        numero_base = int(partes[-1])
+        ancho       = 3
+    else:
+        # Si no termina en número, se agrega un contador
+        prefijo     = f"{codigo_base}-"
+        numero_base = 0
+        ancho       = 0
+
+    # 3️⃣ Una sola consulta: ¿la base está libre? y el mayor código con ese prefijo
+    base_usada = db.select(Turno.id).where(Turno.codigo_turno == codigo_base).exists()
+    mayor      = (db.select(Turno.codigo_turno)
+                  .where(_filtro_prefijo(Turno.codigo_turno, prefijo))
+                  .order_by(db.func.length(Turno.codigo_turno).desc(), Turno.codigo_turno.desc())
+                  .limit(1)
+                  .scalar_subquery())
+    usada, codigo_mayor = db.session.execute(db.select(base_usada, mayor)).one()
+
+    if not usada:
+        codigo_turno = codigo_base
+    else:
+        sufijo = codigo_mayor[len(prefijo):] if codigo_mayor else ''
+        ultimo = int(sufijo) if sufijo.isdigit() else numero_base
+        codigo_turno = f"{prefijo}{max(ultimo, numero_base) + 1:0{ancho}d}"
     
     print(f"[GEN_CODIGO] Paciente: {paciente.nombre}")
     print(f"[GEN_CODIGO] Código base: {codigo_base}")
@@ -1491,11 +1730,12 @@ def registrar_paciente():
             return jsonify({'success': False, 'message': 'Médico no encontrado'}), 404
 
         # ── Normalización del nombre para comparación ──────────────
-        nombre_normalizado = nombre.lower().strip()
+        # (sin acentos, minúsculas, espacios colapsados — ver normalizar_nombre)
+        nombre_normalizado = normalizar_nombre(nombre)
 
-        # ── Buscar si ya existe este paciente ──
+        # ── Buscar si ya existe este paciente (índice nombre_normalizado+medico+motivo) ──
         paciente_existente = Paciente.query.filter(
-            db.func.lower(db.func.trim(Paciente.nombre)) == nombre_normalizado,
+            Paciente.nombre_normalizado == nombre_normalizado,
             Paciente.medico_id == medico_id,
             Paciente.motivo    == motivo
         ).first()
@@ -1543,6 +1783,15 @@ def registrar_paciente():
             db.session.add(nuevo_turno)
             db.session.commit()
 
+            registrar_cambio('actualizacion', medico_id, paciente_existente.id, paciente_en_cola(
+                paciente_existente.id, paciente_existente.nombre, nuevo_codigo_turno,
+                paciente_existente.codigo_paciente, paciente_existente.motivo,
+                paciente_existente.created_at
+            ), apellido=paciente_existente.apellido)
+
+            descartar_anuncio(paciente_existente.nombre, codigo_anterior)
+            precalentar_anuncio(paciente_existente.nombre, nuevo_codigo_turno)
+
             print(f"✅ RE-REGISTRO: {nombre}")
             print(f"   Anterior: {codigo_anterior}")
             print(f"   Nuevo:    {nuevo_codigo_turno}")
@@ -1606,6 +1855,14 @@ def registrar_paciente():
             db.session.add(turno)
             db.session.commit()
 
+            registrar_cambio('alta', medico_id, nuevo_paciente.id, paciente_en_cola(
+                nuevo_paciente.id, nuevo_paciente.nombre, primer_codigo_turno,
+                nuevo_paciente.codigo_paciente, nuevo_paciente.motivo,
+                nuevo_paciente.created_at
+            ), apellido=nuevo_paciente.apellido)
+
+            precalentar_anuncio(nuevo_paciente.nombre, primer_codigo_turno)
+
             print(f"✅ NUEVO PACIENTE: {nombre}")
             print(f"   código_paciente: {nuevo_paciente.codigo_paciente}")
             print(f"   código_turno:    {primer_codigo_turno}")
@@ -1671,47 +1928,25 @@ def obtener_pacientes_recepcion():
     Retorna la lista de médicos con sus pacientes pendientes.
     Para cada paciente se incluye el código de turno ACTIVO (último pendiente).
     Así, cuando un paciente fue re-registrado, recepción siempre ve el código nuevo.
+    Se sirve desde el índice en memoria de cola_recepcion (sin consultas);
+    si el índice no está cargado, con una sola consulta a la BD.
+
+    Sync incremental: ?since=<cursor> devuelve solo los pacientes actualizados
+    y removidos desde ese cursor. Si el cursor ya no sirve, la cola completa.
     """
     try:
-        medicos   = Usuario.query.filter_by(rol='medico', activo=True).all()
-        resultado = []
+        since = request.args.get('since')
+        if since:
+            delta = cambios_desde(since)
+            if delta is not None:
+                return jsonify({'success': True, 'completo': False, **delta}), 200
 
-        for medico in medicos:
-            # Solo pacientes con al menos un turno pendiente
-            pacientes = (Paciente.query
-                         .filter_by(medico_id=medico.id)
-                         .all())
-
-            pacientes_data = []
-            for p in pacientes:
-                turno_activo = (Turno.query
-                                .filter_by(paciente_id=p.id, estado='pendiente')
-                                .order_by(Turno.created_at.desc())
-                                .first())
-                if not turno_activo:
-                    continue  # paciente sin turno activo → no mostrar en recepción
-
-                pacientes_data.append({
-                    'id':         p.id,
-                    'nombre':     p.nombre,
-                    'codigo':     turno_activo.codigo_turno,   # código de turno ACTIVO
-                    'codigo_paciente': p.codigo_paciente,
-                    'motivo':     p.motivo,
-                    'created_at': p.created_at.isoformat() if p.created_at else None
-                })
-
-            medico_data = {
-                'id':              medico.id,
-                'nombre':          medico.nombre_completo or medico.usuario,
-                'usuario':         medico.usuario,
-                'inicial':         (medico.nombre_completo or medico.usuario)[0].upper(),
-                'total_pacientes': len(pacientes_data),
-                'pacientes':       pacientes_data
-            }
-            resultado.append(medico_data)
+        cursor, resultado = cola_actual()
 
         return jsonify({
             'success':       True,
+            'completo':      True,
+            'cursor':        cursor,
             'medicos':       resultado,
             'total_medicos': len(resultado)
         }), 200
@@ -1719,6 +1954,32 @@ def obtener_pacientes_recepcion():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/api/recepcion/cola/verificar', methods=['GET'])
+@rol_requerido('admin')
+def verificar_cola():
+    """Compara el índice en memoria de la cola contra la BD."""
+    try:
+        diferencias = verificar_indice()
+        return jsonify({
+            'success':     True,
+            'consistente': not diferencias,
+            'diferencias': diferencias[:100],
+            'total':       len(diferencias)
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/api/recepcion/cola/reconstruir', methods=['POST'])
+@rol_requerido('admin')
+def reconstruir_cola():
+    """Recarga el índice en memoria de la cola desde la BD."""
+    try:
+        en_espera = reconstruir_indice()
+        return jsonify({'success': True, 'en_espera': en_espera}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 @app.route('/api/recepcion/medico/<medico_id>/pacientes', methods=['GET'])
 @rol_requerido('recepcion', 'admin')
 def obtener_pacientes_por_medico(medico_id):
@@ -1758,6 +2019,11 @@ def buscar_paciente_codigo(codigo):
     Siempre retorna el turno activo del paciente encontrado.
     """
     try:
+        # Código de turno ACTIVO → se resuelve desde el índice en memoria
+        paciente_data = buscar_turno_activo(codigo)
+        if paciente_data:
+            return jsonify({'success': True, 'paciente': paciente_data}), 200
+
         # Intentar buscar por código de turno exacto
         turno = Turno.query.filter_by(codigo_turno=codigo).first()
 
@@ -1797,6 +2063,12 @@ def buscar_paciente_codigo(codigo):
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+def codigo_turno_activo_de(paciente):
+    """Código del turno pendiente: índice de la cola (sin consulta); BD si no está cargado."""
+    disponible, codigo = codigo_turno_activo(paciente.id)
+    return codigo if disponible else paciente.codigo_turno_activo
+
+
 @app.route('/api/recepcion/paciente/<paciente_id>', methods=['DELETE'])
 @rol_requerido('recepcion', 'admin')
 def eliminar_paciente(paciente_id):
@@ -1805,8 +2077,9 @@ def eliminar_paciente(paciente_id):
         if not paciente:
             return jsonify({'success': False, 'message': 'Paciente no encontrado'}), 404
 
-        nombre    = paciente.nombre
-        medico_id = str(paciente.medico_id)
+        nombre        = paciente.nombre
+        medico_id     = str(paciente.medico_id)
+        codigo_activo = codigo_turno_activo_de(paciente)
 
         # Eliminar primero los turnos (FK constraint)
         Turno.query.filter_by(paciente_id=paciente_id).delete()
@@ -1815,6 +2088,9 @@ def eliminar_paciente(paciente_id):
         db.session.delete(paciente)
         db.session.commit()
 
+        registrar_cambio('baja', medico_id, paciente_id)
+        descartar_anuncio(nombre, codigo_activo)
+
         socketio.emit('paciente_eliminado', {
             'paciente_id': paciente_id,
             'nombre':      nombre,
@@ -1832,7 +2108,7 @@ def eliminar_paciente(paciente_id):
 def obtener_pacientes_medico(medico_id):
     try:
         pacientes      = Paciente.query.filter_by(medico_id=medico_id).all()
-        pacientes_data = [p.to_dict() for p in pacientes]
+        pacientes_data = [p.to_dict(codigo_turno_activo_de(p)) for p in pacientes]
         return jsonify({'success': True, 'pacientes': pacientes_data, 'total': len(pacientes_data)}), 200
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -1845,11 +2121,58 @@ def obtener_paciente_codigo(codigo):
         paciente = Paciente.query.filter_by(codigo_paciente=codigo).first()
         if not paciente:
             return jsonify({'success': False, 'message': 'Paciente no encontrado'}), 404
-        return jsonify({'success': True, 'paciente': paciente.to_dict()}), 200
+        return jsonify({'success': True, 'paciente': paciente.to_dict(codigo_turno_activo_de(paciente))}), 200
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+# ===================================
+# CONTROL DE ADMISIÓN
+# ===================================
+
+# Rutas /api que no pasan por la admisión:
+# - sesión (login / logout / verify-session) y arranque y latido de las screens
+#   (init / status): si se cortaran primero, una screen o un admin quedarían
+#   afuera antes que los pedidos que la admisión tiene que recortar,
+# - las que no tocan la BD (síntesis de TTS, archivos de publicidad en disco).
+# /api/tts/cache y las rutas de publicidad que actualizan pantallas SÍ pasan.
+_ADMISION_EXCLUIDAS = {
+    '/api/login', '/api/logout', '/api/verify-session',
+    '/api/screen/init', '/api/screen/status',
+    '/api/tts',
+    '/api/publicidad/archivos', '/api/publicidad/subir', '/api/publicidad/activo',
+}
+_ADMISION_EXCLUIDAS_PREFIJO = ('/api/tts/audio',)   # /api/tts/audio y /api/tts/audio/<mp3>
+
+# Listados del panel de administración: ceden el lugar a recepción y screens
+_ADMISION_BAJA = {'/api/users', '/api/users/inactivos', '/api/users/recepcionistas', '/api/pantallas'}
+
+
+@app.before_request
+def admitir_request():
+    if (not request.path.startswith('/api/') or request.path in _ADMISION_EXCLUIDAS
+            or request.path.startswith(_ADMISION_EXCLUIDAS_PREFIJO)):
+        return None
+
+    prioridad = (PRIORIDAD_BAJA if request.method == 'GET' and request.path in _ADMISION_BAJA
+                 else PRIORIDAD_NORMAL)
+    try:
+        control_admision.entrar(prioridad)
+    except Saturado as e:
+        print(f"[ADMISION] 🚫 503 {request.method} {request.path}")
+        respuesta = jsonify({'success': False, 'message': 'Servidor ocupado, reintentá en unos segundos'})
+        respuesta.headers['Retry-After'] = str(e.retry_after)
+        return respuesta, 503
+    g.admitido = True
+    return None
+
+
+@app.teardown_request
+def liberar_admision(error=None):
+    if g.pop('admitido', False):
+        control_admision.salir()
+
+
 # ===================================
 # HEALTH CHECK
 # ===================================
@@ -1867,6 +2190,7 @@ def health():
         'service':     'Turnero Medico',
         'database':    db_status,
         'auth':        'JWT',
+        'admision':    control_admision.estadisticas(),
         'timestamp':   datetime.now().isoformat(),
         'environment': os.environ.get('FLASK_ENV', 'production')
     }), 200
@@ -1889,93 +2213,170 @@ def internal_error(error):
 # INICIALIZACION
 # ===================================
 
-def resetear_pantalla_delayed(device_fp):
+def resetear_pantallas_vencidas(vencidas):
     """
-    Resetea la pantalla DESPUÉS del grace period (5 segundos).
-    Solo se ejecuta si NO hubo reconexión en ese tiempo.
-    Usa flag para evitar ejecuciones duplicadas en gevent.
+    Llamado por el planificador con todos los grace periods vencidos juntos
+    [(device_fp, gracia_hasta), ...]. Resetea sus pantallas con un solo UPDATE
+    y avisa al admin con un solo evento.
     """
-    
-    time.sleep(5)
-    
-    # ← VERIFICAR si este timer debe ejecutarse
-    if not _screen_disconnect_active.get(device_fp, False):
-        print(f"[GRACE] ⏸️ Timer cancelado para {device_fp[:20]}... (reconexión detectada)")
+    devices = [fp for fp, gracia_hasta in vencidas if sesiones_screen.gracia_vigente(fp, gracia_hasta)]
+    if not devices:
         return
-    
+
+    print(f"[GRACE] ⏱️ Grace period expirado → {len(devices)} screen(s) sin reconexión")
+
     with app.app_context():
-        pantalla = Pantalla.query.filter_by(device_id=device_fp).first()
-        if not pantalla:
-            print(f"[GRACE] ❌ Pantalla con device_id {device_fp[:20]}... no encontrada")
-            _screen_disconnect_timers.pop(device_fp, None)
-            _screen_disconnect_active.pop(device_fp, None)
-            sids_to_remove = [sid for sid, fp in _screen_sids.items() if fp == device_fp]
-            for sid in sids_to_remove:
-                print(f"[GRACE] Removiendo {sid} de dicts")
-                _screen_sids.pop(sid, None)
-                _screen_pantalla.pop(sid, None)
-            return
+        reseteadas = db.session.execute(
+            db.update(Pantalla)
+            .where(Pantalla.device_id.in_(devices),
+                   Pantalla.estado.in_(('pendiente', 'vinculada')))
+            .values(device_id=None, codigo_vinculacion=None, estado='disponible',
+                    vinculada_at=None, recepcionista_id=None)
+            .returning(Pantalla.id, Pantalla.numero)
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.session.commit()
 
-        numero_pantalla = pantalla.numero
-        pantalla_id     = str(pantalla.id)
+    if reseteadas:
+        tabla_ruteo.invalidar()
 
-        print(f"[GRACE] ⏱️ Grace period expirado → reseteando Pantalla {numero_pantalla}")
+    for device_fp in devices:
+        sesiones_screen.quitar_device(device_fp)
 
-        if pantalla.estado in ('pendiente', 'vinculada'):
-            pantalla.device_id          = None
-            pantalla.codigo_vinculacion = None
-            pantalla.estado             = 'disponible'
-            pantalla.vinculada_at       = None
-            pantalla.recepcionista_id   = None
+    if not reseteadas:
+        print(f"[GRACE] ❌ Ninguna pantalla pendiente/vinculada para esos devices")
+        return
 
-        db.session.commit()
-        print(f"[GRACE] ✅ Pantalla {numero_pantalla} reseteada a 'disponible'")
+    numeros = sorted(numero for _, numero in reseteadas)
+    print(f"[GRACE] ✅ Pantalla(s) {numeros} reseteada(s) a 'disponible'")
 
-        socketio.emit('pantalla_desvinculada', {
-            'pantalla_id': pantalla_id,
-            'numero':      numero_pantalla,
-            'estado':      'disponible',
-            'motivo':      'screen_cerrada'
-            
-        }, room='admin')
+    socketio.emit('pantallas_desvinculadas', {
+        'pantallas': [{'pantalla_id': str(pid), 'numero': numero} for pid, numero in reseteadas],
+        'estado':    'disponible',
+        'motivo':    'screen_cerrada'
+    }, room='admin')
 
-        # Limpiar
-        _screen_disconnect_timers.pop(device_fp, None)
-        _screen_disconnect_active.pop(device_fp, None)
-        
-        sids_to_remove = [sid for sid, fp in _screen_sids.items() if fp == device_fp]
-        for sid in sids_to_remove:
-            print(f"[GRACE] Removiendo {sid} de dicts después de reset")
-            _screen_sids.pop(sid, None)
-            _screen_pantalla.pop(sid, None)
 
+# Reloj de pared: gracia_hasta se compara entre workers
+planificador_gracia = Planificador(resetear_pantallas_vencidas, ventana=0.5,
+                                   iniciar=socketio.start_background_task, reloj=time.time)
 
 
+def renovar_sesiones_screen(vencidos=None):
+    """
+    Renueva el TTL del registro compartido de las screens conectadas a este
+    worker y se vuelve a programar. Si el worker muere, nadie renueva y los
+    registros vencen solos.
+    """
+    try:
+        sesiones_screen.renovar_locales()
+    except Exception as e:
+        print(f"[WS] ❌ No se pudo renovar las sesiones de screens: {e}")
+    finally:
+        planificador_renovacion.programar('sesiones', time.monotonic() + sesiones_screen.ttl / 3)
+
+
+planificador_renovacion = Planificador(renovar_sesiones_screen, ventana=0,
+                                       iniciar=socketio.start_background_task)
+planificador_renovacion.programar('sesiones', time.monotonic() + sesiones_screen.ttl / 3)
+
+
+def cancelar_gracia_screen(device_fp):
+    """Cancela el grace period del device (registro + planificador). True si había uno."""
+    en_registro     = sesiones_screen.cancelar_gracia(device_fp)
+    en_planificador = planificador_gracia.cancelar(device_fp) if device_fp else False
+    return en_registro or en_planificador
+
+
+def sesion_por_evento(f=None, prioridad=None, admitir_si=None, al_rechazar=None):
+    """
+    Alcance de BD de un handler de Socket.IO: cada evento corre en su propio
+    app context y al terminar (bien o con error) se hace rollback de lo no
+    confirmado y db.session.remove(), que devuelve la conexión al pool.
+    Así ningún greenlet de socket se queda con una conexión entre eventos.
+
+    Con `prioridad` el evento pasa además por el control de admisión (solo
+    si `admitir_si()` da True, cuando se indica); si no hay lugar se
+    descarta y se llama a `al_rechazar(*args)`, si se indicó.
+    """
+    if f is None:
+        return lambda f: sesion_por_evento(f, prioridad, admitir_si, al_rechazar)
+
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        admitido = prioridad is not None and (admitir_si is None or admitir_si())
+        if admitido:
+            try:
+                control_admision.entrar(prioridad)
+            except Saturado:
+                print(f"[ADMISION] 🚫 Evento {f.__name__} descartado: BD saturada")
+                if al_rechazar:
+                    al_rechazar(*args)
+                return None
+        try:
+            with app.app_context():
+                try:
+                    return f(*args, **kwargs)
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"[WS] ❌ Error en {f.__name__}: {e}")
+                    raise
+                finally:
+                    db.session.remove()
+        finally:
+            if admitido:
+                control_admision.salir()
+    return decorated
+
+
+def avisar_servidor_ocupado(data=None):
+    """al_rechazar de llamar_paciente: el recepcionista ve el error y puede reintentar."""
+    socketio.emit('error_llamada',
+                  {'mensaje': 'Servidor ocupado, reintentá en unos segundos'},
+                  room=request.sid)
+
+
+def reintentar_luego(evento):
+    """
+    al_rechazar genérico: 'servidor_ocupado' con el evento y sus datos, para
+    que el cliente lo vuelva a emitir pasados retry_after segundos.
+    """
+    def avisar(data=None):
+        socketio.emit('servidor_ocupado', {
+            'evento':      evento,
+            'datos':       data,
+            'retry_after': control_admision.retry_after,
+        }, room=request.sid)
+    return avisar
+
 
 @socketio.on('connect')
-def on_connect():
+@sesion_por_evento
+def on_connect(auth=None):
     print(f"[WS] Cliente conectado: {request.sid}")
 
 
 @socketio.on('disconnect')
-def on_disconnect():
+@sesion_por_evento
+def on_disconnect(reason=None):
     print(f"[WS] Cliente desconectado: {request.sid}")
 
-    device_fp = _screen_sids.get(request.sid, None)
-    if not device_fp:
+    # ── Sacar el sid del registro; si es una screen con device queda en gracia ──
+    sesion = sesiones_screen.desconectar(request.sid, gracia=SCREEN_GRACIA_SEG)
+    if not sesion or sesion.gracia_hasta is None:
         return
 
-    print(f"[WS] 📺 Screen desconectada (GRACE PERIOD 5s): {device_fp[:20]}...")
+    device_fp = sesion.device_fp
+    print(f"[WS] 📺 Screen desconectada (GRACE PERIOD {SCREEN_GRACIA_SEG}s): {device_fp[:20]}...")
 
-    # ── Marcar que este timer DEBE ejecutarse ──────────────────────
-    _screen_disconnect_active[device_fp] = True
-    
-    # ── Iniciar grace period de 5 segundos ─────────────────────────
+    # ── Iniciar (o reprogramar) grace period ───────────────────────
     print(f"[GRACE] ⏳ Grace period iniciado — esperando reconexión...")
-    timer = socketio.start_background_task(resetear_pantalla_delayed, device_fp)
-    _screen_disconnect_timers[device_fp] = timer
+    planificador_gracia.programar(device_fp, sesion.gracia_hasta)
 
+# Unirse a salas e identificar la screen no pasa por la admisión: una screen
+# que no entra a screen_<id> se pierde todos los llamados siguientes
 @socketio.on('join')
+@sesion_por_evento
 def on_join(data):
     room      = data.get('room', '')
     device_fp = data.get('device_fingerprint', None)
@@ -1984,28 +2385,13 @@ def on_join(data):
 
     if room == 'screen' and device_fp:
         # ── PASO 1: CANCELAR grace period si esta screen se reconecta ─────────
-        if device_fp in _screen_disconnect_timers:
+        if cancelar_gracia_screen(device_fp):
             print(f"[GRACE] ✅ Reconexión detectada → screen salvada")
-            _screen_disconnect_active[device_fp] = False
-            _screen_disconnect_timers.pop(device_fp, None)
-
-        # ── PASO 2: Encontrar el SID ANTIGUO del mismo device_fp ──────────────
-        old_sid = None
-        for sid, fp in list(_screen_sids.items()):
-            if fp == device_fp and sid != request.sid:
-                old_sid = sid
-                break
 
+        # ── PASO 2-3: Registrar el sid (migra la sesión del sid anterior) ────
+        old_sid = sesiones_screen.registrar(request.sid, device_fp)
         if old_sid:
             print(f"[WS] 🔄 Migrando de {old_sid} → {request.sid}")
-            if old_sid in _screen_pantalla:
-                pantalla_id = _screen_pantalla[old_sid]
-                _screen_pantalla[request.sid] = pantalla_id
-                del _screen_pantalla[old_sid]
-            del _screen_sids[old_sid]
-
-        # ── PASO 3: Agregar el nuevo sid ──────────────────────────────────────
-        _screen_sids[request.sid] = device_fp
 
         # ── PASO 4: Buscar pantalla y unirse a sala propia SOLO si vinculada ──
         pantalla = Pantalla.query.filter_by(device_id=device_fp).first()
@@ -2015,7 +2401,7 @@ def on_join(data):
                 sala_propia = f'screen_{pantalla.id}'
                 join_room(sala_propia)
                 join_room('screen')
-                _screen_pantalla[request.sid] = str(pantalla.id)
+                sesiones_screen.asignar_pantalla(request.sid, pantalla.id)
                 print(f"[WS] ✅ Screen {request.sid} → sala {sala_propia} (vinculada)")
             elif pantalla.estado == 'pendiente':
                 print(f"[WS] ⏳ Screen {request.sid} → pendiente, esperando vinculación admin")
@@ -2042,57 +2428,58 @@ def on_join(data):
 
 
 @socketio.on('pedir_numero_recepcion')
+@sesion_por_evento
 def on_pedir_numero_recepcion():
-    device_fp = _screen_sids.get(request.sid)
+    device_fp = sesiones_screen.device_de(request.sid)
 
     if not device_fp:
         emit('numero_recepcion', {'numRecepcion': None, 'recepcionistas': []})
         return
 
-    with app.app_context():
-        pantalla = Pantalla.query.filter_by(device_id=device_fp).first()
+    pantalla = Pantalla.query.filter_by(device_id=device_fp).first()
 
-        if not pantalla:
-            emit('numero_recepcion', {'numRecepcion': None, 'recepcionistas': []})
-            return
+    if not pantalla:
+        emit('numero_recepcion', {'numRecepcion': None, 'recepcionistas': []})
+        return
+
+    if pantalla.estado == 'vinculada':
+        # Obtener todos los recepcionistas asignados ordenados por 'orden'
+        filas = (db.session.query(pantalla_recepciones, Usuario)
+                 .join(Usuario, Usuario.id == pantalla_recepciones.c.recepcionista_id)
+                 .filter(pantalla_recepciones.c.pantalla_id == pantalla.id)
+                 .order_by(pantalla_recepciones.c.orden)
+                 .all())
 
-        if pantalla.estado == 'vinculada':
-            # Obtener todos los recepcionistas asignados ordenados por 'orden'
-            filas = (db.session.query(pantalla_recepciones, Usuario)
-                     .join(Usuario, Usuario.id == pantalla_recepciones.c.recepcionista_id)
-                     .filter(pantalla_recepciones.c.pantalla_id == pantalla.id)
-                     .order_by(pantalla_recepciones.c.orden)
-                     .all())
-
-            recepcionistas = []
-            for fila in filas:
-                rid   = fila[0]
-                orden = fila[1]
-                u = db.session.get(Usuario, rid)
-                if u:
-                    recepcionistas.append({
-                        'id':              str(u.id),
-                        'nombre_completo': u.nombre_completo or u.usuario,
-                        'orden':           orden
-                    })
-            if recepcionistas:
-                print(f"[WS] ✅ Emitiendo {len(recepcionistas)} recepcionista(s) a {request.sid}")
-                emit('numero_recepcion', {
-                    # Legacy: primer recepcionista
-                    'numRecepcion':  recepcionistas[0]['nombre_completo'],
-                    # NUEVO: lista completa para construir N paneles
-                    'recepcionistas': recepcionistas
+        recepcionistas = []
+        for fila in filas:
+            rid   = fila[0]
+            orden = fila[1]
+            u = db.session.get(Usuario, rid)
+            if u:
+                recepcionistas.append({
+                    'id':              str(u.id),
+                    'nombre_completo': u.nombre_completo or u.usuario,
+                    'orden':           orden
                 })
-                return
+        if recepcionistas:
+            print(f"[WS] ✅ Emitiendo {len(recepcionistas)} recepcionista(s) a {request.sid}")
+            emit('numero_recepcion', {
+                # Legacy: primer recepcionista
+                'numRecepcion':  recepcionistas[0]['nombre_completo'],
+                # NUEVO: lista completa para construir N paneles
+                'recepcionistas': recepcionistas
+            })
+            return
 
-        # Fallback
-        emit('numero_recepcion', {
-            'numRecepcion':   str(pantalla.numero),
-            'recepcionistas': [{'id': None, 'nombre_completo': str(pantalla.numero), 'orden': 0}]
-        })
+    # Fallback
+    emit('numero_recepcion', {
+        'numRecepcion':   str(pantalla.numero),
+        'recepcionistas': [{'id': None, 'nombre_completo': str(pantalla.numero), 'orden': 0}]
+    })
 
 
 @socketio.on('join_screen_propia')
+@sesion_por_evento
 def on_join_screen_propia(data):
     """
     Llamado por screen_vinculacion.js cuando recibe 'pantalla_vinculada'.
@@ -2103,57 +2490,52 @@ def on_join_screen_propia(data):
     if not pantalla_id:
         return
 
-    if device_fp in _screen_disconnect_timers:
+    if cancelar_gracia_screen(device_fp):
         print(f"[GRACE] ✅ Vinculación detectada → timer cancelado")
-        # ← MARCAR que el timer NO debe ejecutarse
-        _screen_disconnect_active[device_fp] = False
-        _screen_disconnect_timers.pop(device_fp, None)
 
     sala_propia = f'screen_{pantalla_id}'
     join_room(sala_propia)
     join_room('screen')
-    _screen_pantalla[request.sid] = str(pantalla_id)
-
-    if device_fp:
-        _screen_sids[request.sid] = device_fp
+    sesiones_screen.registrar(request.sid, device_fp or None, pantalla_id)
 
     print(f"[WS] ✅ Screen vinculada al sid {request.sid} → sala {sala_propia}")
     emit('joined_screen_propia', {'sala': sala_propia, 'pantalla_id': pantalla_id})
 
-    with app.app_context():
-            pantalla = db.session.get(Pantalla, pantalla_id)
-            if pantalla and pantalla.estado == 'vinculada':
-                filas = (db.session.execute(
-                    db.select(
-                        pantalla_recepciones.c.recepcionista_id,
-                        pantalla_recepciones.c.orden
-                    ).where(
-                        pantalla_recepciones.c.pantalla_id == pantalla_id
-                    ).order_by(pantalla_recepciones.c.orden)
-                )).fetchall()
-
-                recepcionistas = []
-                for fila in filas:
-                    u = db.session.get(Usuario, fila[0])
-                    if u:
-                        recepcionistas.append({
-                            'id':              str(u.id),
-                            'nombre_completo': u.nombre_completo or u.usuario,
-                            'orden':           fila[1]
-                        })
-
-                if recepcionistas:
-                    emit('numero_recepcion', {
-                        'numRecepcion':   recepcionistas[0]['nombre_completo'],
-                        'recepcionistas': recepcionistas
-                    })
-                    print(f"[WS] 📋 Recepcionistas enviados tras join_screen_propia: {len(recepcionistas)}")
+    pantalla = db.session.get(Pantalla, pantalla_id)
+    if pantalla and pantalla.estado == 'vinculada':
+        filas = (db.session.execute(
+            db.select(
+                pantalla_recepciones.c.recepcionista_id,
+                pantalla_recepciones.c.orden
+            ).where(
+                pantalla_recepciones.c.pantalla_id == pantalla_id
+            ).order_by(pantalla_recepciones.c.orden)
+        )).fetchall()
+
+        recepcionistas = []
+        for fila in filas:
+            u = db.session.get(Usuario, fila[0])
+            if u:
+                recepcionistas.append({
+                    'id':              str(u.id),
+                    'nombre_completo': u.nombre_completo or u.usuario,
+                    'orden':           fila[1]
+                })
+
+        if recepcionistas:
+            emit('numero_recepcion', {
+                'numRecepcion':   recepcionistas[0]['nombre_completo'],
+                'recepcionistas': recepcionistas
+            })
+            print(f"[WS] 📋 Recepcionistas enviados tras join_screen_propia: {len(recepcionistas)}")
 
 
+# El llamado se resuelve en memoria (TablaRuteo): solo pasa por la admisión
+# cuando la tabla está desactualizada y hay que recargarla de la BD
 @socketio.on('llamar_paciente')
+@sesion_por_evento(prioridad=PRIORIDAD_ALTA, admitir_si=tabla_ruteo.desactualizada,
+                   al_rechazar=avisar_servidor_ocupado)
 def on_llamar_paciente(data):
-    global _ultimo_llamado
-
     codigo           = data.get('codigo', '')
     nombre           = data.get('nombre', '')
     paciente_id      = data.get('pacienteId', '')
@@ -2165,39 +2547,24 @@ def on_llamar_paciente(data):
         socketio.emit('error_llamada', {'mensaje': 'No hay recepcionista asignado'}, room=request.sid)
         return
 
-    # ── Paso 1: buscar la fila en pantalla_recepciones ────────────────────────
-    stmt = db.select(
-        pantalla_recepciones.c.pantalla_id,
-        pantalla_recepciones.c.orden
-    ).join(
-        Pantalla, Pantalla.id == pantalla_recepciones.c.pantalla_id
-    ).where(
-        pantalla_recepciones.c.recepcionista_id == recepcionista_id,
-        Pantalla.estado == 'vinculada'
-    )
-    fila = db.session.execute(stmt).first()
+    # ── Ruteo en memoria (sin consultas a la BD) ─────────────────────────────
+    ruta = tabla_ruteo.ruta(recepcionista_id)
 
-    if not fila:
+    if not ruta:
         print(f"[WS] ❌ Recepcionista {recepcionista_id} no tiene pantalla vinculada")
         socketio.emit('error_llamada',
                       {'mensaje': 'El recepcionista no tiene pantalla vinculada'},
                       room=request.sid)
         return
 
-    pantalla_id_str = fila[0]
-    orden           = fila[1]
-
-    # ── Paso 2: cargar la pantalla ────────────────────────────────────────────
-    pantalla = db.session.get(Pantalla, pantalla_id_str)
-
-    if not pantalla or not pantalla.device_id:
+    if not ruta.conectada:
         socketio.emit('error_llamada',
                       {'mensaje': f'Pantalla desconectada'},
                       room=request.sid)
         return
 
-    recepcionista        = db.session.get(Usuario, recepcionista_id)
-    nombre_recepcionista = recepcionista.nombre_completo if recepcionista else 'Sin asignar'
+    orden                = ruta.orden
+    nombre_recepcionista = ruta.nombre
 
     payload = {
         'codigo':               codigo,
@@ -2207,16 +2574,16 @@ def on_llamar_paciente(data):
         'recepcionista_id':     recepcionista_id,
         'recepcionista_nombre': nombre_recepcionista,
         'panel_orden':          orden,
-        'pantalla_id':          str(pantalla.id),
+        'pantalla_id':          ruta.pantalla_id,
     }
 
-    sala_destino = f'screen_{pantalla.id}'
+    sala_destino = f'screen_{ruta.pantalla_id}'
     print(f"[WS] ✅ Emitiendo a {sala_destino} panel {orden} — {nombre_recepcionista}")
 
     socketio.emit('llamar_paciente', payload, to=sala_destino)
 
-    _ultimo_llamado = {**payload, 'sala_destino': sala_destino,
-                       'timestamp': datetime.utcnow().isoformat()}
+    historial_llamados.registrar(ruta.pantalla_id, orden, {**payload, 'sala_destino': sala_destino,
+                                                           'timestamp': datetime.utcnow().isoformat()})
 
     # Reenviar al recepcionista para su historial local
     socketio.emit('llamar_paciente', payload, room=request.sid)
@@ -2224,44 +2591,54 @@ def on_llamar_paciente(data):
 
 
 @socketio.on('pedir_ultimo_llamado')
+@sesion_por_evento
 def on_pedir_ultimo_llamado():
     """
-    Solo reenvía el último llamado si pertenece a la sala de ESTA screen.
+    Reenvía el último llamado vigente de la pantalla de ESTA screen (compat).
     """
-    if not _ultimo_llamado:
+    mi_pantalla_id = sesiones_screen.pantalla_de(request.sid)
+    if not mi_pantalla_id:
         return
 
-    # Verificar antigüedad
-    try:
-        ts        = datetime.fromisoformat(_ultimo_llamado['timestamp'])
-        antiguedad = (datetime.utcnow() - ts).total_seconds()
-        if antiguedad > 30:
-            print(f"[WS] Último llamado ignorado — {antiguedad:.0f}s de antigüedad")
-            return
-    except Exception:
+    ultimo = historial_llamados.ultimo(mi_pantalla_id)
+    if ultimo:
+        emit('llamar_paciente', ultimo)
+        print(f"[WS] ↩️ Último llamado restaurado → {request.sid}")
+
+
+@socketio.on('pedir_estado_llamados')
+@sesion_por_evento
+def on_pedir_estado_llamados():
+    """
+    Estado reciente de TODOS los paneles de la pantalla de esta screen, en un
+    solo mensaje: {pantalla_id, vigencia, paneles: {orden: [llamados]}}.
+    """
+    mi_pantalla_id = sesiones_screen.pantalla_de(request.sid)
+    if not mi_pantalla_id:
         return
 
-    # Verificar que esta screen sea la destinataria
-    sala_destino   = _ultimo_llamado.get('sala_destino')
-    mi_pantalla_id = _screen_pantalla.get(request.sid)
+    paneles = historial_llamados.recientes(mi_pantalla_id)
+    emit('estado_llamados', {
+        'pantalla_id': mi_pantalla_id,
+        'vigencia':    historial_llamados.vigencia,
+        'paneles':     paneles
+    })
+    if paneles:
+        print(f"[WS] ↩️ Estado de {len(paneles)} panel(es) restaurado → {request.sid}")
 
-    if sala_destino and mi_pantalla_id:
-        if sala_destino == f'screen_{mi_pantalla_id}':
-            emit('llamar_paciente', _ultimo_llamado)
-            print(f"[WS] ↩️ Último llamado restaurado → {request.sid}")
-        else:
-            print(f"[WS] ↩️ Último llamado NO es para esta screen ({sala_destino} ≠ screen_{mi_pantalla_id})")
-    # Si no hay sala_destino definida, no reenviar a nadie
-    
 # DESPUÉS:
 @socketio.on('limpiar_historial')
+@sesion_por_evento(prioridad=PRIORIDAD_NORMAL, al_rechazar=reintentar_luego('limpiar_historial'))
 def on_limpiar_historial(data=None):
-    global _ultimo_llamado
     recepcionista_id = (data or {}).get('recepcionistaId')
 
     print(f"[WS] 🧹 Historial limpiado — recepcionistaId: {recepcionista_id}")
 
     if recepcionista_id:
+        ruta = tabla_ruteo.ruta(recepcionista_id)
+        if ruta:
+            historial_llamados.limpiar(ruta.pantalla_id, ruta.orden)
+
         pantalla = Pantalla.query.filter_by(
             recepcionista_id = recepcionista_id,
             estado           = 'vinculada'
@@ -2274,9 +2651,6 @@ def on_limpiar_historial(data=None):
             socketio.emit('limpiar_historial',
                           {'recepcionistaId': recepcionista_id},
                           to=sala_destino)
-
-            if _ultimo_llamado and _ultimo_llamado.get('sala_destino') == sala_destino:
-                _ultimo_llamado = None
         else:
             print(f"[WS] ⚠️ Sin pantalla vinculada — buscando por panel_orden")
             # Buscar en qué panel_orden está este recepcionista en cualquier pantalla activa
@@ -2286,11 +2660,23 @@ def on_limpiar_historial(data=None):
                           to='screen')
     else:
         print(f"[WS] 🧹 Sin recepcionistaId → limpieza global")
-        _ultimo_llamado = None
+        historial_llamados.limpiar_todo()
         socketio.emit('limpiar_historial', {}, to='screen')
 
 init_db(app)
 
+with app.app_context():
+    try:
+        reconstruir_indice()
+    except Exception as e:
+        db.session.rollback()
+        print(f'[COLA] ⚠️ Índice de cola no cargado, se usará la BD: {e}')
+    try:
+        tabla_ruteo.reconstruir()
+    except Exception as e:
+        db.session.rollback()
+        print(f'[RUTEO] ⚠️ Tabla de llamados no cargada, se cargará en el primer llamado: {e}')
+
 if __name__ == '__main__':
     port  = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV') == 'development'
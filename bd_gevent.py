@@ -0,0 +1,45 @@
+# bd_gevent.py - psycopg2 cooperativo bajo gevent (wait callback, estilo psycogreen)
+
+from gevent.socket import wait_read, wait_write
+
+
+def _esperar(conexion, timeout=None):
+    """
+    Wait callback de psycopg2: en lugar de bloquear el proceso dentro de libpq
+    esperando al servidor, cede el control al hub de gevent hasta que el
+    socket de la conexión está listo. Mientras una consulta espera, los demás
+    greenlets (WebSockets de las screens, otras requests) siguen corriendo.
+    """
+    from psycopg2 import extensions, OperationalError
+
+    while True:
+        estado = conexion.poll()
+        if estado == extensions.POLL_OK:
+            return
+        if estado == extensions.POLL_READ:
+            wait_read(conexion.fileno(), timeout=timeout)
+        elif estado == extensions.POLL_WRITE:
+            wait_write(conexion.fileno(), timeout=timeout)
+        else:
+            raise OperationalError(f'Resultado inesperado de poll(): {estado!r}')
+
+
+def hacer_cooperativo():
+    """
+    Instala el wait callback en psycopg2. Devuelve False si psycopg2 no está
+    instalado (desarrollo con SQLite). Debe llamarse tras monkey.patch_all().
+    """
+    try:
+        from psycopg2 import extensions
+    except ImportError:
+        return False
+    extensions.set_wait_callback(_esperar)
+    return True
+
+
+def es_cooperativo():
+    try:
+        from psycopg2 import extensions
+    except ImportError:
+        return False
+    return extensions.get_wait_callback() is _esperar
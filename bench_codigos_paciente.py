@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+bench_codigos_paciente.py - Registros simultáneos vs. códigos de paciente duplicados
+
+Lanza N procesos que registran pacientes al mismo tiempo para el mismo
+médico+motivo y cuenta cuántos terminan en IntegrityError por codigo_paciente
+duplicado. Corre contra la BD configurada (usar PostgreSQL vía DATABASE_URL
+para concurrencia real; SQLite serializa todas las escrituras).
+
+    python bench_codigos_paciente.py                 # contador SecuenciaPaciente
+    python bench_codigos_paciente.py --legado        # COUNT(*) + 1 (comportamiento anterior)
+    python bench_codigos_paciente.py -p 32 -n 50     # 32 procesos x 50 registros
+
+Crea un médico temporal y lo borra al terminar. Cada proceso es un subprocess
+independiente (multiprocessing no convive con el monkey-patch de gevent de app.py).
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+import uuid
+
+
+def _registrar(medico_id, motivo, cantidad, legado):
+    from app import app, generar_codigo_paciente
+    from models import db, Paciente
+    from sqlalchemy.exc import IntegrityError
+
+    ok = duplicados = 0
+    with app.app_context():
+        for i in range(cantidad):
+            try:
+                if legado:
+                    previos = Paciente.query.filter_by(medico_id=medico_id, motivo=motivo).count()
+                    codigo  = f"B-C-{previos + 1:03d}"
+                else:
+                    codigo  = generar_codigo_paciente(medico_id, motivo)
+                db.session.add(Paciente(nombre=f'bench {uuid.uuid4().hex[:8]}', apellido='',
+                                        motivo=motivo, medico_id=medico_id,
+                                        codigo_paciente=codigo))
+                db.session.commit()
+                ok += 1
+            except IntegrityError:
+                db.session.rollback()
+                duplicados += 1
+        db.session.remove()
+    return ok, duplicados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-p', '--procesos',  type=int, default=16)
+    parser.add_argument('-n', '--registros', type=int, default=25, help='registros por proceso')
+    parser.add_argument('--legado', action='store_true', help='usar COUNT(*) + 1 en lugar del contador')
+    parser.add_argument('--worker', nargs=2, metavar=('MEDICO_ID', 'MOTIVO'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        ok, duplicados = _registrar(args.worker[0], args.worker[1], args.registros, args.legado)
+        print(json.dumps({'ok': ok, 'duplicados': duplicados}))
+        return 0
+
+    from app import app
+    from models import db, Usuario, Paciente, SecuenciaPaciente
+
+    motivo = 'Consulta'
+    with app.app_context():
+        medico = Usuario(usuario=f'bench_{uuid.uuid4().hex[:8]}', rol='medico',
+                         nombre_completo='Bench Médico', created_by='bench')
+        medico.set_password(uuid.uuid4().hex)
+        db.session.add(medico)
+        db.session.commit()
+        medico_id = medico.id
+
+    modo = 'COUNT(*) + 1 (legado)' if args.legado else 'SecuenciaPaciente'
+    total = args.procesos * args.registros
+    print(f"\n🏁 {args.procesos} procesos x {args.registros} registros = {total} — {modo}\n")
+
+    comando = [sys.executable, __file__, '-n', str(args.registros), '--worker', medico_id, motivo]
+    if args.legado:
+        comando.append('--legado')
+
+    inicio   = time.perf_counter()
+    procesos = [subprocess.Popen(comando, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+                for _ in range(args.procesos)]
+    resultados = [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in procesos]
+    duracion   = time.perf_counter() - inicio
+
+    ok         = sum(r['ok'] for r in resultados)
+    duplicados = sum(r['duplicados'] for r in resultados)
+    print(f"   Registrados:           {ok}")
+    print(f"   Códigos duplicados:    {duplicados}")
+    print(f"   Tiempo total:          {duracion:.2f}s ({ok / duracion:.0f} registros/s)")
+
+    with app.app_context():
+        Paciente.query.filter_by(medico_id=medico_id).delete()
+        SecuenciaPaciente.query.filter_by(medico_id=medico_id).delete()
+        db.session.delete(db.session.get(Usuario, medico_id))
+        db.session.commit()
+
+    print(f"\n{'✅ Sin duplicados' if not duplicados else f'❌ {duplicados} registros fallaron por código duplicado'}\n")
+    return 1 if duplicados else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
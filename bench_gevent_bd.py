@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+bench_gevent_bd.py - Latencia de eventos Socket.IO mientras corren consultas lentas
+
+Mide cada `intervalo` ms la latencia de un evento Socket.IO (cliente de
+prueba) primero sin carga y después con C consultas "SELECT pg_sleep(S)"
+corriendo en paralelo en otros greenlets. Con el wait callback de
+bd_gevent.py la latencia se mantiene plana; sin él (--bloqueante) cada
+consulta congela el hub de gevent y los eventos esperan a que termine.
+
+    python bench_gevent_bd.py                    # wait callback (default de app.py)
+    python bench_gevent_bd.py --bloqueante       # psycopg2 bloqueante (comportamiento anterior)
+    python bench_gevent_bd.py -c 5 -s 2          # 5 consultas de 2 s en paralelo
+
+Requiere PostgreSQL vía DATABASE_URL (pg_sleep); no modifica la BD.
+"""
+
+import argparse
+import time
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-c', '--consultas', type=int,   default=3,   help='consultas lentas en paralelo')
+    parser.add_argument('-s', '--segundos',  type=float, default=1.0, help='duración de cada consulta')
+    parser.add_argument('-i', '--intervalo', type=float, default=20,  help='ms entre eventos medidos')
+    parser.add_argument('--bloqueante', action='store_true', help='desinstalar el wait callback')
+    args = parser.parse_args()
+
+    from app import app, socketio, db
+    from bd_gevent import es_cooperativo
+    import gevent
+
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            print(f"\n❌ Requiere PostgreSQL (DATABASE_URL); la BD actual es {db.engine.dialect.name}\n")
+            return 1
+
+    if args.bloqueante:
+        from psycopg2 import extensions
+        extensions.set_wait_callback(None)
+
+    modo = 'wait callback (cooperativo)' if es_cooperativo() else 'psycopg2 bloqueante'
+    print(f"\n🏁 {args.consultas} x pg_sleep({args.segundos}) en paralelo — {modo}\n")
+
+    cliente   = socketio.test_client(app)
+    intervalo = args.intervalo / 1000
+
+    def medir(duracion):
+        """Latencias (ms) de eventos programados cada `intervalo` durante `duracion` s."""
+        latencias = []
+        inicio    = time.perf_counter()
+        k         = 0
+        while time.perf_counter() - inicio < duracion:
+            objetivo = inicio + k * intervalo
+            gevent.sleep(max(0.0, objetivo - time.perf_counter()))
+            cliente.emit('pedir_estado_llamados')
+            cliente.get_received()
+            latencias.append((time.perf_counter() - objetivo) * 1000)
+            k += 1
+        return latencias
+
+    def consulta_lenta():
+        with app.app_context():
+            db.session.execute(db.text('SELECT pg_sleep(:s)'), {'s': args.segundos})
+            db.session.remove()
+
+    base = medir(args.segundos)
+
+    lentas = [gevent.spawn(consulta_lenta) for _ in range(args.consultas)]
+    carga  = medir(args.segundos)
+    inicio = time.perf_counter()
+    gevent.joinall(lentas, raise_error=True)
+    espera = time.perf_counter() - inicio
+    cliente.disconnect()
+
+    for nombre, latencias in (('Sin carga', base), ('Con consultas lentas', carga)):
+        print(f"   {nombre + ':':22} {len(latencias):4d} eventos — p50 {_percentil(latencias, 0.5):7.1f} ms"
+              f" | p99 {_percentil(latencias, 0.99):7.1f} ms | máx {max(latencias):7.1f} ms")
+    print(f"   Consultas terminadas {espera:.2f}s después de la medición")
+
+    plana = max(carga) < max(10 * max(base), 50)
+    print(f"\n{'✅ La latencia de los eventos no depende de las consultas' if plana else '❌ Las consultas bloquearon el hub de gevent'}\n")
+    return 0 if plana else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
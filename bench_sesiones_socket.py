@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+bench_sesiones_socket.py - Miles de eventos Socket.IO sin fugas del pool de conexiones
+
+Lanza G greenlets, cada uno con su cliente Socket.IO de prueba, que disparan
+eventos que usan la BD (join de screen, pedir_numero_recepcion,
+join_screen_propia, llamar_paciente, limpiar_historial). Cuenta checkouts y
+checkins del pool: al terminar no debe quedar ninguna conexión prestada.
+
+    python bench_sesiones_socket.py                 # 20 greenlets x 250 eventos
+    python bench_sesiones_socket.py -g 50 -n 500
+
+Solo lee: usa devices y recepcionistas inexistentes, no modifica la BD.
+"""
+
+import argparse
+import time
+import uuid
+
+EVENTOS = ('join', 'pedir_numero_recepcion', 'join_screen_propia', 'llamar_paciente', 'limpiar_historial')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-g', '--greenlets', type=int, default=20)
+    parser.add_argument('-n', '--eventos',   type=int, default=250, help='eventos por greenlet')
+    args = parser.parse_args()
+
+    from app import app, socketio, db
+    import gevent
+    from sqlalchemy import event
+
+    pool = {'prestadas': 0, 'maximo': 0, 'checkouts': 0}
+
+    def al_prestar(*_):
+        pool['prestadas'] += 1
+        pool['checkouts'] += 1
+        pool['maximo'] = max(pool['maximo'], pool['prestadas'])
+
+    def al_devolver(*_):
+        pool['prestadas'] -= 1
+
+    with app.app_context():
+        motor = db.engine
+    event.listen(motor, 'checkout', al_prestar)
+    event.listen(motor, 'checkin', al_devolver)
+
+    def cliente(i):
+        c = socketio.test_client(app)
+        device_fp = f'bench-{uuid.uuid4().hex}'
+        for n in range(args.eventos):
+            nombre = EVENTOS[(i + n) % len(EVENTOS)]
+            if nombre == 'join':
+                c.emit('join', {'room': 'screen', 'device_fingerprint': device_fp})
+            elif nombre == 'join_screen_propia':
+                c.emit('join_screen_propia', {'pantalla_id': str(uuid.uuid4()), 'device_fingerprint': device_fp})
+            elif nombre in ('llamar_paciente', 'limpiar_historial'):
+                c.emit(nombre, {'codigo': 'B-C-001', 'nombre': 'bench', 'recepcionistaId': str(uuid.uuid4())})
+            else:
+                c.emit(nombre)
+            c.get_received()
+            gevent.sleep(0)
+        c.disconnect()
+
+    total = args.greenlets * args.eventos
+    print(f"\n🏁 {args.greenlets} greenlets x {args.eventos} eventos = {total}\n")
+
+    inicio = time.perf_counter()
+    gevent.joinall([gevent.spawn(cliente, i) for i in range(args.greenlets)], raise_error=True)
+    duracion = time.perf_counter() - inicio
+
+    print(f"   Eventos:                 {total} en {duracion:.2f}s ({total / duracion:.0f}/s)")
+    print(f"   Checkouts del pool:      {pool['checkouts']}")
+    print(f"   Máximo simultáneo:       {pool['maximo']}")
+    print(f"   Prestadas al terminar:   {pool['prestadas']}")
+
+    fuga = pool['prestadas'] != 0
+    print(f"\n{'❌ El pool quedó con conexiones prestadas' if fuga else '✅ Sin fugas en el pool'}\n")
+    return 1 if fuga else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,501 @@
+# cola_recepcion.py - Cola de recepción: médicos activos con sus pacientes en espera
+
+import threading
+import uuid
+
+from estado_compartido import AlmacenMemoria
+from models import db, Usuario, Paciente, Turno
+
+
+def paciente_en_cola(pid, nombre, codigo_turno, codigo_paciente, motivo, created_at):
+    """Dict de un paciente tal como lo muestra recepción."""
+    return {
+        'id':              pid,
+        'nombre':          nombre,
+        'codigo':          codigo_turno,      # código de turno ACTIVO
+        'codigo_paciente': codigo_paciente,
+        'motivo':          motivo,
+        'created_at':      created_at.isoformat() if created_at else None
+    }
+
+
+def _cabecera_medico(medico_id, nombre_completo, usuario):
+    nombre_medico = nombre_completo or usuario
+    return {
+        'id':              medico_id,
+        'nombre':          nombre_medico,
+        'usuario':         usuario,
+        'inicial':         nombre_medico[0].upper(),
+        'total_pacientes': 0,
+        'pacientes':       []
+    }
+
+
+def _subconsulta_turno_activo():
+    """
+    Último turno 'pendiente' de cada paciente (window function).
+    rn == 1 es el turno ACTIVO, el mismo que devuelve Paciente.turno_activo.
+    """
+    return db.select(
+        Turno.paciente_id,
+        Turno.codigo_turno,
+        db.func.row_number().over(
+            partition_by=Turno.paciente_id,
+            order_by=Turno.created_at.desc()
+        ).label('rn')
+    ).where(
+        Turno.estado == 'pendiente'
+    ).subquery('turno_activo')
+
+
+def consultar_cola_recepcion():
+    """
+    Construye el payload de /api/recepcion/pacientes con UNA sola consulta.
+
+    Antes: 1 consulta de médicos + 1 por médico + 1 por paciente (N+1).
+    Ahora: médicos LEFT JOIN (pacientes JOIN último turno pendiente),
+    así el número de consultas no depende del tamaño de la tabla.
+
+    Retorna lista de dicts: [{id, nombre, usuario, inicial, total_pacientes, pacientes[]}]
+    """
+    ta = _subconsulta_turno_activo()
+
+    en_espera = db.join(
+        Paciente, ta,
+        db.and_(ta.c.paciente_id == Paciente.id, ta.c.rn == 1)
+    )
+
+    stmt = db.select(
+        Usuario.id,
+        Usuario.nombre_completo,
+        Usuario.usuario,
+        Paciente.id,
+        Paciente.nombre,
+        Paciente.codigo_paciente,
+        Paciente.motivo,
+        Paciente.created_at,
+        ta.c.codigo_turno,
+    ).select_from(
+        Usuario
+    ).outerjoin(
+        en_espera, Paciente.medico_id == Usuario.id
+    ).where(
+        Usuario.rol    == 'medico',
+        Usuario.activo.is_(True)
+    ).order_by(
+        Usuario.created_at, Usuario.id, Paciente.created_at, Paciente.id
+    )
+
+    resultado = []
+    por_medico = {}
+
+    for fila in db.session.execute(stmt):
+        (medico_id, medico_nombre, medico_usuario,
+         pid, nombre, codigo_paciente, motivo, created_at, codigo_turno) = fila
+
+        medico_data = por_medico.get(medico_id)
+        if medico_data is None:
+            medico_data = _cabecera_medico(medico_id, medico_nombre, medico_usuario)
+            por_medico[medico_id] = medico_data
+            resultado.append(medico_data)
+
+        if pid is None:
+            continue  # médico sin pacientes en espera
+
+        medico_data['pacientes'].append(paciente_en_cola(
+            pid, nombre, codigo_turno, codigo_paciente, motivo, created_at
+        ))
+        medico_data['total_pacientes'] += 1
+
+    return resultado
+
+
+# ===================================
+# FEED VERSIONADO (sync incremental)
+# ===================================
+#
+# Cada cambio de turno (alta, re-registro, baja) se anota en un registro del
+# AlmacenEstado compartido, que le asigna un número de secuencia. Los clientes
+# piden ?since=<cursor> y reciben solo lo que cambió, atienda el worker que
+# atienda: todos leen el mismo feed.
+# El cursor lleva la "época" del almacén: si el almacén pierde el feed (p. ej.
+# Redis reiniciado sin persistencia, o el almacén en memoria del proceso al
+# reiniciar) los cursores viejos dejan de ser válidos y el cliente recibe la
+# cola completa.
+
+_MAX_CAMBIOS = 1000   # ventana de cambios retenidos; más atrás → cola completa
+CLAVE_FEED   = 'cola:cambios'
+CLAVE_EPOCA  = 'cola:epoca'
+
+_feed_lock          = threading.Lock()
+_almacen            = AlmacenMemoria()
+_epoca              = None    # época del almacén (se lee la primera vez que hace falta)
+_secuencia          = 0       # último cambio del feed aplicado al índice de ESTE worker
+_reinicio_pendiente = False   # un cambio no se pudo anotar: falta avisar a los demás
+
+
+def usar_almacen(almacen):
+    """Feed (y con él el índice) compartido entre workers. Llamar al arrancar."""
+    global _almacen, _epoca
+    _almacen, _epoca = almacen, None
+
+
+def _epoca_actual():
+    global _epoca
+    if _epoca is None:
+        _almacen.crear(CLAVE_EPOCA, uuid.uuid4().hex[:8])
+        _epoca = _almacen.obtener(CLAVE_EPOCA)
+    return _epoca
+
+
+def cursor_actual():
+    return f'{_epoca_actual()}.{_almacen.anotaciones(CLAVE_FEED, 0)[0]}'
+
+
+def registrar_cambio(tipo, medico_id=None, paciente_id=None, paciente=None, apellido=''):
+    """
+    Anota un cambio en la cola. Llamar DESPUÉS del commit.
+    tipo: 'alta' | 'actualizacion' | 'baja' | 'reinicio'
+    'reinicio' obliga a los clientes a pedir la cola completa
+    (p. ej. cuando cambia la lista de médicos).
+
+    El índice de este worker se pone al día en el momento; los demás
+    aplican el cambio en su próxima lectura.
+
+    Nunca interrumpe la ruta que llama (el commit ya está hecho): si el
+    almacén falla se loguea, el índice local queda sucio y se anota un
+    'reinicio' apenas el almacén responda, así clientes e índices de los
+    demás workers se resincronizan completos. Retorna la secuencia, o None.
+    """
+    global _reinicio_pendiente
+    try:
+        _anotar_reinicio_pendiente()
+        secuencia = _almacen.anotar(CLAVE_FEED, _cambio(tipo, medico_id, paciente_id, paciente, apellido),
+                                    _MAX_CAMBIOS)
+        _sincronizar()
+        return secuencia
+    except Exception as e:
+        print(f"[COLA] ⚠️ No se pudo anotar '{tipo}' en el feed ({e}): se forzará un reinicio")
+        _reinicio_pendiente = True
+        with _feed_lock:
+            _indice['sucio'] = True
+        return None
+
+
+def _cambio(tipo, medico_id=None, paciente_id=None, paciente=None, apellido=''):
+    return {
+        'tipo':        tipo,
+        'medico_id':   medico_id,
+        'paciente_id': paciente_id,
+        'paciente':    paciente,
+        'apellido':    apellido or '',
+    }
+
+
+def _anotar_reinicio_pendiente():
+    """Anota el 'reinicio' que quedó debiendo un registrar_cambio fallido."""
+    global _reinicio_pendiente
+    if _reinicio_pendiente:
+        _almacen.anotar(CLAVE_FEED, _cambio('reinicio'), _MAX_CAMBIOS)
+        _reinicio_pendiente = False
+
+
+def cambios_desde(cursor):
+    """
+    Devuelve el delta desde `cursor`, o None si el cliente debe recargar todo
+    (cursor inválido, de otra época, demasiado viejo o con un 'reinicio' en medio).
+
+    Sin cambios → una lectura del almacén.
+    """
+    try:
+        epoca, seq = cursor.split('.', 1)
+        seq = int(seq)
+    except (AttributeError, ValueError):
+        return None
+
+    if epoca != _epoca_actual():
+        return None
+    _anotar_reinicio_pendiente()
+    leido = _almacen.anotaciones_desde(CLAVE_FEED, seq, _MAX_CAMBIOS)
+    if leido is None:
+        return None
+    actual, pendientes = leido
+    if not pendientes:
+        return {'cursor': f'{epoca}.{actual}', 'hay_cambios': False,
+                'actualizados': [], 'removidos': []}
+
+    # Quedarse con el último cambio de cada paciente
+    ultimo = {}
+    for _, cambio in pendientes:
+        if cambio['tipo'] == 'reinicio':
+            return None
+        ultimo[cambio['paciente_id']] = cambio
+
+    actualizados, removidos = [], []
+    for paciente_id, cambio in ultimo.items():
+        if cambio['tipo'] == 'baja':
+            removidos.append({'id': paciente_id, 'medico_id': cambio['medico_id']})
+        else:
+            actualizados.append({'medico_id': cambio['medico_id'], 'paciente': cambio['paciente']})
+
+    return {'cursor': f'{epoca}.{actual}', 'hay_cambios': True,
+            'actualizados': actualizados, 'removidos': removidos}
+
+
+# ===================================
+# ÍNDICE EN MEMORIA DE LA COLA
+# ===================================
+#
+# Turnos pendientes por médico, cargados al arrancar y mantenidos al día con
+# el feed: antes de cada lectura se aplican los cambios anotados (por este u
+# otro worker) desde el último aplicado. Sirve las lecturas de recepción sin
+# ir a la BD. Si un cambio no se puede aplicar, cambian los médicos o faltan
+# cambios en el registro, el índice se reconstruye desde la BD.
+
+_indice = {
+    'cargado':    False,
+    'sucio':      False,
+    'medicos':    {},   # medico_id → (nombre_completo, usuario)   solo activos, en orden
+    'pacientes':  {},   # medico_id → {paciente_id: item}          en orden de llegada
+    'medico_de':  {},   # paciente_id → medico_id
+    'apellidos':  {},   # paciente_id → apellido
+    'por_codigo': {},   # codigo_turno ACTIVO → paciente_id
+}
+
+
+def _consultar_pendientes():
+    """Todos los pacientes con turno pendiente (de cualquier médico), en orden."""
+    ta = _subconsulta_turno_activo()
+    stmt = db.select(
+        Paciente.medico_id,
+        Paciente.id,
+        Paciente.nombre,
+        Paciente.apellido,
+        Paciente.codigo_paciente,
+        Paciente.motivo,
+        Paciente.created_at,
+        ta.c.codigo_turno,
+    ).join(
+        ta, db.and_(ta.c.paciente_id == Paciente.id, ta.c.rn == 1)
+    ).order_by(
+        Paciente.created_at, Paciente.id
+    )
+    return db.session.execute(stmt).all()
+
+
+def _indice_aplicar(tipo, medico_id, paciente_id, paciente, apellido):
+    """Aplica un cambio al índice. Requiere _feed_lock tomado."""
+    if not _indice['cargado']:
+        return
+    if tipo == 'reinicio':
+        _indice['sucio'] = True
+        return
+    try:
+        if tipo == 'baja':
+            _indice_quitar(paciente_id)
+        else:
+            _indice_poner(medico_id, paciente_id, paciente, apellido)
+    except Exception as e:
+        print(f'[COLA] ⚠️ Índice marcado para reconstruir ({tipo} {paciente_id}): {e}')
+        _indice['sucio'] = True
+
+
+def _indice_quitar(paciente_id):
+    medico_id = _indice['medico_de'].pop(paciente_id, None)
+    if medico_id is None:
+        return None
+    item = _indice['pacientes'].get(medico_id, {}).pop(paciente_id, None)
+    _indice['apellidos'].pop(paciente_id, None)
+    if item and _indice['por_codigo'].get(item['codigo']) == paciente_id:
+        del _indice['por_codigo'][item['codigo']]
+    return item
+
+
+def _indice_poner(medico_id, paciente_id, item, apellido):
+    """Alta o reemplazo. Un re-registro conserva la posición del paciente en la cola."""
+    if _indice['medico_de'].get(paciente_id) != medico_id:
+        _indice_quitar(paciente_id)
+    else:
+        anterior = _indice['pacientes'][medico_id][paciente_id]
+        if _indice['por_codigo'].get(anterior['codigo']) == paciente_id:
+            del _indice['por_codigo'][anterior['codigo']]
+    _indice['pacientes'].setdefault(medico_id, {})[paciente_id] = item
+    _indice['medico_de'][paciente_id] = medico_id
+    _indice['apellidos'][paciente_id] = apellido or ''
+    _indice['por_codigo'][item['codigo']] = paciente_id
+
+
+def reconstruir_indice():
+    """
+    Recarga el índice desde la BD (2 consultas). Requiere app context.
+    Retorna el número de pacientes en espera.
+    """
+    global _secuencia, _epoca
+    # Posición del feed ANTES de consultar: lo anotado en el medio se vuelve
+    # a aplicar en la próxima lectura (aplicar un cambio dos veces no altera el índice)
+    actual, _ = _almacen.anotaciones(CLAVE_FEED, 0)
+    medicos = db.session.execute(
+        db.select(Usuario.id, Usuario.nombre_completo, Usuario.usuario)
+        .where(Usuario.rol == 'medico', Usuario.activo.is_(True))
+        .order_by(Usuario.created_at, Usuario.id)
+    ).all()
+    pendientes = _consultar_pendientes()
+
+    with _feed_lock:
+        if actual < _secuencia:
+            _epoca = None   # el almacén perdió el feed: época nueva
+        _indice['medicos']    = {mid: (nombre, usuario) for mid, nombre, usuario in medicos}
+        _indice['pacientes']  = {}
+        _indice['medico_de']  = {}
+        _indice['apellidos']  = {}
+        _indice['por_codigo'] = {}
+        for (medico_id, pid, nombre, apellido, codigo_paciente,
+             motivo, created_at, codigo_turno) in pendientes:
+            _indice_poner(medico_id, pid, paciente_en_cola(
+                pid, nombre, codigo_turno, codigo_paciente, motivo, created_at
+            ), apellido)
+        _indice['cargado'] = True
+        _indice['sucio']   = False
+        _secuencia         = actual
+
+    print(f'[COLA] 🔄 Índice reconstruido: {len(medicos)} médico(s), {len(pendientes)} en espera')
+    return len(pendientes)
+
+
+def _sincronizar():
+    """
+    Pone el índice al día con el feed compartido. True si el índice puede
+    responder. Sin cambios nuevos cuesta una lectura del almacén; si faltan
+    cambios en el registro (o el índice quedó sucio) se reconstruye.
+    """
+    global _secuencia
+    if not _indice['cargado']:
+        return False
+
+    _anotar_reinicio_pendiente()
+    leido = _almacen.anotaciones_desde(CLAVE_FEED, _secuencia, _MAX_CAMBIOS)
+    if leido is None:
+        reconstruir_indice()
+        return True
+
+    _, cambios = leido
+    if cambios:
+        with _feed_lock:
+            for seq, cambio in cambios:
+                if seq <= _secuencia:
+                    continue   # ya aplicado por otra lectura concurrente
+                _indice_aplicar(cambio['tipo'], cambio['medico_id'], cambio['paciente_id'],
+                                cambio['paciente'], cambio['apellido'])
+                _secuencia = seq
+    if _indice['sucio']:
+        reconstruir_indice()
+    return True
+
+
+def _snapshot_indice():
+    """Payload de recepción armado desde memoria. Requiere _feed_lock tomado."""
+    resultado = []
+    for medico_id, (nombre, usuario) in _indice['medicos'].items():
+        medico_data = _cabecera_medico(medico_id, nombre, usuario)
+        medico_data['pacientes'] = list(_indice['pacientes'].get(medico_id, {}).values())
+        medico_data['total_pacientes'] = len(medico_data['pacientes'])
+        resultado.append(medico_data)
+    return resultado
+
+
+def cola_actual():
+    """
+    (cursor, medicos[]) de la cola de recepción, tomados de forma atómica.
+    Usa el índice en memoria; sin índice cargado, la consulta única a la BD.
+    """
+    if _sincronizar():
+        epoca = _epoca_actual()
+        with _feed_lock:
+            return f'{epoca}.{_secuencia}', _snapshot_indice()
+
+    # Cursor ANTES de consultar: un cambio concurrente se reenvía, nunca se pierde
+    cursor = cursor_actual()
+    return cursor, consultar_cola_recepcion()
+
+
+def codigo_turno_activo(paciente_id):
+    """
+    Código del turno pendiente del paciente según el índice.
+    Retorna (True, codigo|None) si el índice puede responder, (False, None) si no.
+    """
+    if not _sincronizar():
+        return False, None
+    with _feed_lock:
+        medico_id = _indice['medico_de'].get(paciente_id)
+        if medico_id is None:
+            return True, None
+        return True, _indice['pacientes'][medico_id][paciente_id]['codigo']
+
+
+def buscar_turno_activo(codigo):
+    """
+    Busca un código de turno ACTIVO en el índice.
+    Retorna el dict que devuelve /api/recepcion/paciente/<codigo>, o None si el
+    índice no lo resuelve (código viejo, código de paciente, médico inactivo...)
+    y hay que ir a la BD.
+    """
+    if not _sincronizar():
+        return None
+    with _feed_lock:
+        paciente_id = _indice['por_codigo'].get(codigo)
+        if paciente_id is None:
+            return None
+        medico_id = _indice['medico_de'][paciente_id]
+        medico    = _indice['medicos'].get(medico_id)
+        if medico is None:
+            return None
+        item     = _indice['pacientes'][medico_id][paciente_id]
+        apellido = _indice['apellidos'].get(paciente_id, '')
+        return {
+            'id':              paciente_id,
+            'nombre':          item['nombre'],
+            'apellido':        apellido,
+            'nombre_completo': f"{item['nombre']} {apellido}".strip(),
+            'codigo_paciente': item['codigo_paciente'],
+            'codigo':          item['codigo'],
+            'motivo':          item['motivo'],
+            'medico':          medico[0],
+            'created_at':      item['created_at']
+        }
+
+
+def verificar_indice():
+    """
+    Compara el índice (al día con el feed) contra la BD. Retorna lista de
+    diferencias (vacía = consistente).
+    """
+    if not _sincronizar():
+        return ['índice no cargado']
+
+    esperado = {pid: (medico_id, codigo_turno)
+                for medico_id, pid, _, _, _, _, _, codigo_turno in _consultar_pendientes()}
+    medicos = [mid for (mid,) in db.session.execute(
+        db.select(Usuario.id)
+        .where(Usuario.rol == 'medico', Usuario.activo.is_(True))
+        .order_by(Usuario.created_at, Usuario.id)
+    ).all()]
+
+    with _feed_lock:
+        actual = {pid: (medico_id, _indice['pacientes'][medico_id][pid]['codigo'])
+                  for pid, medico_id in _indice['medico_de'].items()}
+        medicos_indice = list(_indice['medicos'])
+        sucio = _indice['sucio']
+
+    diferencias = []
+    if sucio:
+        diferencias.append('índice marcado para reconstruir')
+    if medicos != medicos_indice:
+        diferencias.append('lista de médicos activos distinta')
+    for pid in esperado.keys() - actual.keys():
+        diferencias.append(f'falta {pid} ({esperado[pid][1]})')
+    for pid in actual.keys() - esperado.keys():
+        diferencias.append(f'sobra {pid} ({actual[pid][1]})')
+    for pid in esperado.keys() & actual.keys():
+        if esperado[pid] != actual[pid]:
+            diferencias.append(f'distinto {pid}: BD={esperado[pid]} índice={actual[pid]}')
+    return diferencias
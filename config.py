@@ -15,6 +15,52 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False
 
+    # TTS — workers de síntesis y segundos máximos de espera por anuncio
+    TTS_WORKERS = int(os.environ.get('TTS_WORKERS', 3))
+    TTS_TIMEOUT = float(os.environ.get('TTS_TIMEOUT', 15))
+    # Presupuesto del cache de MP3 en disco (LRU); 0 = sin límite
+    TTS_CACHE_MAX_MB = float(os.environ.get('TTS_CACHE_MAX_MB', 200))
+    # MP3 recientes servidos desde RAM (LRU); 0 = desactivado
+    TTS_MEMORIA_MB = float(os.environ.get('TTS_MEMORIA_MB', 16))
+    # MP3 opcional que se antepone a los anuncios pedidos con "beep": true
+    TTS_BEEP_MP3 = os.environ.get('TTS_BEEP_MP3')
+    # Cadena de proveedores (ver tts_proveedores.py), timeout de cada uno y
+    # circuit breaker: fallos seguidos para abrirlo y segundos hasta reintentar
+    TTS_PROVEEDORES       = os.environ.get('TTS_PROVEEDORES', 'gtts,espeak,silencio')
+    TTS_PROVEEDOR_TIMEOUT = float(os.environ.get('TTS_PROVEEDOR_TIMEOUT', 4))
+    TTS_CIRCUITO_FALLOS   = int(os.environ.get('TTS_CIRCUITO_FALLOS', 3))
+    TTS_CIRCUITO_ESPERA   = float(os.environ.get('TTS_CIRCUITO_ESPERA', 30))
+    # Voz de gTTS (dominio/acento: com, com.mx, es...); forma parte de la clave del cache
+    TTS_VOZ = os.environ.get('TTS_VOZ', 'com')
+
+    # Estado compartido entre workers (sesiones y grace periods de screens,
+    # últimos llamados, feed de la cola de recepción, altas/bajas del cache de
+    # TTS): vacío = memoria del proceso (un solo worker); redis://... = Redis
+    ESTADO_URL = os.environ.get('ESTADO_URL', '')
+
+    # Fan-out de los emits de Socket.IO entre workers (ver difusion_socketio.py):
+    # vacío = un solo worker; 'postgres' = LISTEN/NOTIFY sobre DATABASE_URL;
+    # redis://... / amqp://... = broker
+    SOCKETIO_COLA  = os.environ.get('SOCKETIO_COLA', '')
+    SOCKETIO_CANAL = os.environ.get('SOCKETIO_CANAL', 'turnero')
+
+    # Últimos llamados por panel que recupera una screen al reconectar, y
+    # segundos durante los que un llamado sigue vigente para reenviarse
+    LLAMADOS_POR_PANEL   = int(os.environ.get('LLAMADOS_POR_PANEL', 5))
+    LLAMADO_VIGENCIA_SEG = float(os.environ.get('LLAMADO_VIGENCIA_SEG', 30))
+
+    # Cada cuántos segundos se relee la versión de la tabla de llamados en el
+    # estado compartido (ver ruteo_llamados.py); 0 = en cada llamado
+    RUTEO_REVISION_SEG = float(os.environ.get('RUTEO_REVISION_SEG', 1))
+
+    # Control de admisión delante de la BD (ver admision.py): trabajos
+    # simultáneos (vacío = pool_size + max_overflow), pedidos en cola, segundos
+    # máximos de espera en la cola y Retry-After del 503 cuando no hay lugar
+    ADMISION_CAPACIDAD   = int(os.environ.get('ADMISION_CAPACIDAD', 0))
+    ADMISION_COLA        = int(os.environ.get('ADMISION_COLA', 20))
+    ADMISION_ESPERA      = float(os.environ.get('ADMISION_ESPERA', 2))
+    ADMISION_RETRY_AFTER = int(os.environ.get('ADMISION_RETRY_AFTER', 2))
+
     # Pool de conexiones — sobreescrito por cada subclase
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True,   # verifica conexión antes de usarla
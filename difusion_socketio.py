@@ -0,0 +1,101 @@
+# difusion_socketio.py - Fan-out de los emits de Socket.IO entre workers/nodos
+
+import re
+import select
+import threading
+import time
+
+import socketio
+
+
+class GestorPostgresNotify(socketio.PubSubManager):
+    """
+    Client manager de python-socketio sobre LISTEN/NOTIFY de PostgreSQL:
+    sin broker aparte, usa la misma BD que la app (Render).
+
+    Cada emit se resuelve primero en el worker que lo hizo y se publica con
+    pg_notify para que los demás lo entreguen a sus propios clientes.
+    NOTIFY admite hasta ~8000 bytes de payload: los mensajes más grandes se
+    entregan solo en el worker local y se loguea el descarte.
+    """
+
+    name = 'postgres'
+
+    MAX_PAYLOAD = 7900
+
+    def __init__(self, url, channel='turnero', write_only=False, logger=None, json=None):
+        if not re.fullmatch(r'[a-z_][a-z0-9_]*', channel):
+            raise ValueError(f'Canal LISTEN/NOTIFY inválido: {channel}')
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        # psycopg2 no entiende el dialecto de SQLAlchemy ("postgresql+psycopg2://")
+        self.url       = re.sub(r'^postgres(ql)?(\+\w+)?://', 'postgresql://', url)
+        self._conexion = None
+        self._lock     = threading.Lock()
+
+    def _conectar(self):
+        import psycopg2
+        conexion = psycopg2.connect(self.url)
+        conexion.autocommit = True
+        return conexion
+
+    def _publish(self, data):
+        payload = self.json.dumps(data)
+        if len(payload.encode('utf-8')) > self.MAX_PAYLOAD:
+            print(f"[WS] ⚠️ Mensaje '{data.get('event', data.get('method'))}' excede NOTIFY "
+                  f"({len(payload)} bytes): solo se entrega en este worker")
+            return
+        for reintentos in (1, 0):
+            try:
+                with self._lock:
+                    if self._conexion is None or self._conexion.closed:
+                        self._conexion = self._conectar()
+                    with self._conexion.cursor() as cursor:
+                        cursor.execute('SELECT pg_notify(%s, %s)', (self.channel, payload))
+                return
+            except Exception as e:
+                self._conexion = None
+                if not reintentos:
+                    print(f"[WS] ❌ No se pudo publicar en PostgreSQL: {e}")
+
+    def _listen(self):
+        espera = 1
+        while True:
+            try:
+                conexion = self._conectar()
+                with conexion.cursor() as cursor:
+                    cursor.execute(f'LISTEN {self.channel}')
+                espera = 1
+                while True:
+                    # select() está parcheado por gevent: espera sin bloquear el hub
+                    if select.select([conexion], [], [], 60) == ([], [], []):
+                        continue
+                    conexion.poll()
+                    while conexion.notifies:
+                        aviso = conexion.notifies.pop(0)
+                        if aviso.channel == self.channel:
+                            yield aviso.payload
+            except Exception as e:
+                print(f"[WS] ❌ LISTEN {self.channel} caído, reintento en {espera}s: {e}")
+                time.sleep(espera)
+                espera = min(espera * 2, 60)
+
+
+def opciones_difusion(cola, canal, url_bd):
+    """
+    kwargs para SocketIO(...) según SOCKETIO_COLA:
+
+    - ''                        → sin fan-out (un solo worker)
+    - 'postgres'                → LISTEN/NOTIFY sobre la BD de la app (url_bd)
+    - 'postgresql://...'        → LISTEN/NOTIFY sobre esa BD
+    - 'redis://...', 'amqp://...', 'kafka://...', 'zmq+tcp://...'
+                                → broker, vía el message_queue de Flask-SocketIO
+    """
+    if not cola:
+        return {}
+    if cola == 'postgres':
+        cola = url_bd
+    if cola.startswith(('postgres://', 'postgresql://', 'postgresql+')):
+        return {'client_manager': GestorPostgresNotify(cola, channel=canal)}
+    if cola.startswith('sqlite'):
+        raise ValueError('SOCKETIO_COLA=postgres requiere PostgreSQL (la BD actual es SQLite)')
+    return {'message_queue': cola, 'channel': canal}
@@ -0,0 +1,256 @@
+# estado_compartido.py - Estado de las screens compartido entre workers (memoria o Redis)
+
+import json
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+
+class AlmacenEstado:
+    """
+    Interfaz clave → valor (dict JSON) con TTL opcional.
+
+    Todo el estado que los workers necesitan ver igual (sesiones por device,
+    grace periods, llamados recientes, feed de la cola de recepción, índice
+    del cache de TTS) pasa por acá.
+    Los valores se guardan serializados: nunca se comparten objetos mutables.
+
+    Además de claves simples, "registros": listas acotadas con un número de
+    secuencia. anotar() agrega y numera en una sola operación atómica, así
+    que todos los workers ven las mismas anotaciones en el mismo orden.
+    """
+
+    nombre = 'base'
+
+    def obtener(self, clave):
+        raise NotImplementedError
+
+    def guardar(self, clave, valor, ttl=None):
+        raise NotImplementedError
+
+    def crear(self, clave, valor, ttl=None):
+        """Guarda solo si la clave no existe. True si la creó este llamado."""
+        raise NotImplementedError
+
+    def borrar(self, clave):
+        """Borra la clave o el registro `clave`."""
+        raise NotImplementedError
+
+    def renovar(self, claves, ttl):
+        """Vuelve a contar el TTL de las claves que existen, sin tocar su valor."""
+        raise NotImplementedError
+
+    def anotar(self, clave, valor, maximo, ttl=None):
+        """
+        Agrega `valor` al registro `clave` (se conservan los últimos `maximo`)
+        y devuelve su número de secuencia (1, 2, 3...). Con `ttl` el registro
+        entero vence si no se anota nada en ese tiempo.
+        """
+        raise NotImplementedError
+
+    def anotaciones(self, clave, cantidad):
+        """
+        (secuencia, [hasta `cantidad` valores, el más nuevo primero]) leídos
+        juntos: el primer valor es el de número `secuencia`, el segundo el
+        de `secuencia - 1`, etc. Registro inexistente → (0, []).
+        """
+        raise NotImplementedError
+
+    def anotaciones_de(self, claves, cantidad):
+        """anotaciones() de varios registros, en el mismo orden que `claves`."""
+        return [self.anotaciones(clave, cantidad) for clave in claves]
+
+    def anotaciones_desde(self, clave, desde, maximo):
+        """
+        (secuencia, [(n, valor), ...] del más viejo al más nuevo) con todo lo
+        anotado después de `desde`, o None si ya no está completo en el
+        registro (más de `maximo` atrás, o el registro se perdió y volvió a
+        empezar). Sin novedades cuesta una sola lectura.
+        """
+        actual, _ = self.anotaciones(clave, 0)
+        for _ in range(3):
+            faltan = actual - desde
+            if faltan < 0 or faltan > maximo:
+                return None
+            if faltan == 0:
+                return actual, []
+            # Margen para lo que se anote entre las dos lecturas
+            actual, valores = self.anotaciones(clave, faltan + 8)
+            if 0 <= actual - desde <= len(valores):
+                return actual, [(actual - i, valores[i]) for i in reversed(range(actual - desde))]
+        return None
+
+
+class AlmacenMemoria(AlmacenEstado):
+    """Dict del proceso. Correcto solo con un worker (el default)."""
+
+    nombre = 'memoria'
+
+    PURGAR_CADA = 60
+
+    def __init__(self):
+        self._datos     = {}     # clave → (json, expira | None)
+        self._registros = {}     # clave → [secuencia, deque(json), expira | None]
+        self._lock      = threading.Lock()
+        self._purgado   = time.monotonic()
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            datos, expira = entrada
+            if expira is not None and expira <= time.monotonic():
+                del self._datos[clave]
+                return None
+            return json.loads(datos)
+
+    def guardar(self, clave, valor, ttl=None):
+        expira = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._datos[clave] = (json.dumps(valor), expira)
+        self._purgar_si_corresponde()
+
+    def crear(self, clave, valor, ttl=None):
+        expira = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None and (entrada[1] is None or entrada[1] > time.monotonic()):
+                return False
+            self._datos[clave] = (json.dumps(valor), expira)
+            return True
+
+    def borrar(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+            self._registros.pop(clave, None)
+
+    def renovar(self, claves, ttl):
+        ahora = time.monotonic()
+        with self._lock:
+            for clave in claves:
+                entrada = self._datos.get(clave)
+                if entrada is not None and (entrada[1] is None or entrada[1] > ahora):
+                    self._datos[clave] = (entrada[0], ahora + ttl)
+
+    def _registro(self, clave):
+        """Registro vigente o None. Requiere el lock."""
+        registro = self._registros.get(clave)
+        if registro is not None and registro[2] is not None and registro[2] <= time.monotonic():
+            del self._registros[clave]
+            return None
+        return registro
+
+    def anotar(self, clave, valor, maximo, ttl=None):
+        expira = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            registro = self._registro(clave)
+            if registro is None:
+                registro = self._registros[clave] = [0, deque(maxlen=maximo), None]
+            elif registro[1].maxlen != maximo:
+                registro[1] = deque(islice(registro[1], maximo), maxlen=maximo)
+            registro[0] += 1
+            registro[1].appendleft(json.dumps(valor))
+            registro[2]  = expira
+            secuencia    = registro[0]
+        self._purgar_si_corresponde()
+        return secuencia
+
+    def anotaciones(self, clave, cantidad):
+        with self._lock:
+            registro = self._registro(clave)
+            if registro is None:
+                return 0, []
+            secuencia, valores = registro[0], list(islice(registro[1], max(cantidad, 0)))
+        return secuencia, [json.loads(v) for v in valores]
+
+    def _purgar_si_corresponde(self):
+        ahora = time.monotonic()
+        if ahora - self._purgado < self.PURGAR_CADA:
+            return
+        with self._lock:
+            vencidas = [c for c, (_, expira) in self._datos.items() if expira is not None and expira <= ahora]
+            for clave in vencidas:
+                del self._datos[clave]
+            for clave in [c for c, r in self._registros.items() if r[2] is not None and r[2] <= ahora]:
+                del self._registros[clave]
+            self._purgado = ahora
+
+
+class AlmacenRedis(AlmacenEstado):
+    """
+    Redis compartido por todos los workers/nodos. Requiere el paquete
+    `redis`; el TTL lo aplica el propio servidor.
+    """
+
+    nombre = 'redis'
+
+    def __init__(self, url, prefijo='turnero:', timeout=2):
+        import redis
+        self.prefijo = prefijo
+        self._redis  = redis.Redis.from_url(url, socket_timeout=timeout,
+                                            socket_connect_timeout=timeout)
+
+    def obtener(self, clave):
+        datos = self._redis.get(self.prefijo + clave)
+        return json.loads(datos) if datos is not None else None
+
+    def guardar(self, clave, valor, ttl=None):
+        self._redis.set(self.prefijo + clave, json.dumps(valor), px=int(ttl * 1000) if ttl else None)
+
+    def crear(self, clave, valor, ttl=None):
+        return bool(self._redis.set(self.prefijo + clave, json.dumps(valor), nx=True,
+                                    px=int(ttl * 1000) if ttl else None))
+
+    def borrar(self, clave):
+        # La secuencia de un registro vive en <clave>:seq
+        self._redis.delete(self.prefijo + clave, self.prefijo + clave + ':seq')
+
+    def renovar(self, claves, ttl):
+        """PEXPIRE de cada clave en un solo viaje (las que no existen se ignoran)."""
+        pipe = self._redis.pipeline(transaction=False)
+        for clave in claves:
+            pipe.pexpire(self.prefijo + clave, int(ttl * 1000))
+        pipe.execute()
+
+    def anotar(self, clave, valor, maximo, ttl=None):
+        """MULTI: INCR de la secuencia + LPUSH + LTRIM (+ PEXPIRE de ambas claves)."""
+        lista, secuencia = self.prefijo + clave, self.prefijo + clave + ':seq'
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.incr(secuencia)
+        pipe.lpush(lista, json.dumps(valor))
+        pipe.ltrim(lista, 0, maximo - 1)
+        if ttl:
+            pipe.pexpire(lista, int(ttl * 1000))
+            pipe.pexpire(secuencia, int(ttl * 1000))
+        return pipe.execute()[0]
+
+    def anotaciones(self, clave, cantidad):
+        lista, secuencia = self.prefijo + clave, self.prefijo + clave + ':seq'
+        if cantidad <= 0:
+            return int(self._redis.get(secuencia) or 0), []
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.get(secuencia)
+        pipe.lrange(lista, 0, cantidad - 1)
+        actual, valores = pipe.execute()
+        return int(actual or 0), [json.loads(v) for v in valores]
+
+    def anotaciones_de(self, claves, cantidad):
+        """Un solo viaje a Redis: GET + LRANGE de cada registro en un pipeline."""
+        pipe = self._redis.pipeline(transaction=False)
+        for clave in claves:
+            pipe.get(self.prefijo + clave + ':seq')
+            pipe.lrange(self.prefijo + clave, 0, max(cantidad, 0) - 1)
+        resultados = pipe.execute()
+        return [(int(actual or 0), [json.loads(v) for v in valores] if cantidad > 0 else [])
+                for actual, valores in zip(resultados[::2], resultados[1::2])]
+
+
+def crear_almacen(url=None):
+    """'' / 'memoria' → AlmacenMemoria; 'redis://...' o 'rediss://...' → AlmacenRedis."""
+    if not url or url == 'memoria':
+        return AlmacenMemoria()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return AlmacenRedis(url)
+    raise ValueError(f'ESTADO_URL no soportada: {url}')
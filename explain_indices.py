@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+explain_indices.py - Verifica con EXPLAIN que las consultas calientes usan los índices
+
+Corre contra la BD configurada (SQLite local o PostgreSQL vía DATABASE_URL),
+que debe estar migrada con "flask db upgrade".
+
+    python explain_indices.py
+
+Sale con código 1 si alguna consulta no usa el índice esperado.
+En PostgreSQL se desactiva enable_seqscan dentro de la transacción: con tablas
+chicas el planner prefiere un seq scan aunque el índice sea utilizable.
+"""
+
+import sys
+
+from app import app, db, _filtro_prefijo
+from models import Paciente, Pantalla, SecuenciaPaciente, Turno, pantalla_recepciones
+from cola_recepcion import _subconsulta_turno_activo
+
+_ID = '00000000-0000-0000-0000-000000000000'
+
+
+def consultas_calientes():
+    """(descripción, statement, índices aceptados)"""
+    turno_activo = (db.select(Turno)
+                    .where(Turno.paciente_id == _ID, Turno.estado == 'pendiente')
+                    .order_by(Turno.created_at.desc())
+                    .limit(1))
+
+    siguiente_secuencia = (db.update(SecuenciaPaciente)
+                           .where(SecuenciaPaciente.medico_id == _ID, SecuenciaPaciente.motivo == 'Consulta')
+                           .values(ultimo=SecuenciaPaciente.ultimo + 1)
+                           .returning(SecuenciaPaciente.ultimo))
+
+    semilla_secuencia = (db.select(Paciente.codigo_paciente)
+                         .where(Paciente.medico_id == _ID, Paciente.motivo == 'Consulta'))
+
+    dedup = (db.select(Paciente)
+             .where(Paciente.nombre_normalizado == 'juan',
+                    Paciente.medico_id == _ID,
+                    Paciente.motivo    == 'Consulta')
+             .limit(1))
+
+    llamar = (db.select(pantalla_recepciones.c.pantalla_id, pantalla_recepciones.c.orden)
+              .join(Pantalla, Pantalla.id == pantalla_recepciones.c.pantalla_id)
+              .where(pantalla_recepciones.c.recepcionista_id == _ID,
+                     Pantalla.estado == 'vinculada'))
+
+    prefijo_turno = (db.select(Turno.codigo_turno)
+                     .where(_filtro_prefijo(Turno.codigo_turno, 'M-C-'))
+                     .order_by(db.func.length(Turno.codigo_turno).desc(), Turno.codigo_turno.desc())
+                     .limit(1))
+
+    ta = _subconsulta_turno_activo()
+    cola = db.select(ta.c.paciente_id, ta.c.codigo_turno).where(ta.c.rn == 1)
+
+    turno_idx = ('ix_turnos_paciente_estado_created', 'ix_turnos_pendientes_paciente_created')
+    return [
+        ('Paciente.turno_activo',                 turno_activo,         turno_idx),
+        ('generar_codigo_paciente (secuencia)',   siguiente_secuencia,
+         ('secuencias_paciente_pkey', 'sqlite_autoindex_secuencias_paciente_1')),
+        ('secuencia nueva (semilla)',             semilla_secuencia,    ('ix_pacientes_medico_motivo',)),
+        ('registrar_paciente (re-registro)',      dedup,                ('ix_pacientes_nombre_normalizado_medico_motivo',)),
+        ('recepcionista en otra pantalla',      llamar,              ('ix_pantalla_recepciones_recepcionista_id',)),
+        ('cola de recepción (turnos pendientes)', cola,                 ('ix_turnos_pendientes_paciente_created',)),
+        ('generar_codigo_turno (prefijo)',        prefijo_turno,
+         ('ix_turnos_codigo_turno_pattern', 'ix_turnos_codigo_turno')),
+    ]
+
+
+def plan(stmt):
+    dialecto = db.engine.dialect
+    sql = str(stmt.compile(dialect=dialecto, compile_kwargs={'literal_binds': True}))
+    if dialecto.name == 'sqlite':
+        filas = db.session.execute(db.text('EXPLAIN QUERY PLAN ' + sql)).fetchall()
+        return '\n'.join(str(f[-1]) for f in filas)
+    if dialecto.name == 'postgresql':
+        db.session.execute(db.text('SET LOCAL enable_seqscan = off'))
+        filas = db.session.execute(db.text('EXPLAIN ' + sql)).fetchall()
+        return '\n'.join(f[0] for f in filas)
+    raise RuntimeError(f'Dialecto no soportado: {dialecto.name}')
+
+
+def main():
+    with app.app_context():
+        print(f"\n🔎 EXPLAIN sobre {db.engine.dialect.name}\n")
+        fallos = 0
+        for descripcion, stmt, indices in consultas_calientes():
+            texto = plan(stmt)
+            usado = next((i for i in indices if i in texto), None)
+            if usado:
+                print(f"✅ {descripcion}: {usado}")
+            else:
+                fallos += 1
+                print(f"❌ {descripcion}: no usa {' / '.join(indices)}")
+                for linea in texto.splitlines():
+                    print(f"      {linea}")
+        db.session.rollback()
+
+        print(f"\n{'✅ Todas las consultas usan sus índices' if not fallos else f'❌ {fallos} consulta(s) sin índice'}\n")
+        return 1 if fallos else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
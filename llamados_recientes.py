@@ -0,0 +1,80 @@
+# llamados_recientes.py - Últimos llamados de cada panel de cada pantalla (ring buffer)
+
+import time
+import uuid
+
+
+class HistorialLlamados:
+    """
+    Por pantalla y por panel (orden), los últimos `por_panel` llamados con su
+    timestamp. Una screen que reconecta recupera en un solo mensaje el estado
+    reciente de todos sus paneles.
+
+    - Vive en el AlmacenEstado compartido, como un registro por panel
+      recortado a `por_panel`: cada llamado se anota con una sola operación
+      atómica (LPUSH + LTRIM en Redis), así dos workers que llaman a la vez
+      no se pisan, y un panel con mucho movimiento no desplaza a los demás.
+    - Los paneles de una pantalla son 0..max_paneles-1 (app.py admite hasta 4
+      recepcionistas por pantalla); se leen todos juntos en un solo viaje.
+    - Solo cuentan los llamados de los últimos `vigencia` segundos; cada
+      registro vence con el mismo TTL. La memoria queda acotada a
+      pantallas x max_paneles x por_panel.
+    - La limpieza global no recorre claves: cambia la "época" y todo lo
+      anterior deja de contar.
+    """
+
+    CLAVE_EPOCA = 'llamados:epoca'
+
+    def __init__(self, almacen, por_panel=5, vigencia=30, max_paneles=4):
+        self.almacen     = almacen
+        self.por_panel   = por_panel
+        self.vigencia    = vigencia
+        self.max_paneles = max_paneles
+
+    @staticmethod
+    def _clave(pantalla_id, orden):
+        return f'llamados:panel:{pantalla_id}:{orden}'
+
+    def _epoca(self):
+        return self.almacen.obtener(self.CLAVE_EPOCA)
+
+    def _leer(self, pantalla_id):
+        """{orden (int): [llamados, el más nuevo al final]} vigentes."""
+        ordenes   = range(self.max_paneles)
+        registros = self.almacen.anotaciones_de([self._clave(pantalla_id, o) for o in ordenes],
+                                                self.por_panel)
+        if not any(anotaciones for _, anotaciones in registros):
+            return {}
+        epoca   = self._epoca()
+        limite  = time.time() - self.vigencia
+        paneles = {}
+        for orden, (_, anotaciones) in zip(ordenes, registros):
+            vigentes = [a['llamado'] for a in reversed(anotaciones)
+                        if a['epoca'] == epoca and a['llamado']['ts'] >= limite]
+            if vigentes:
+                paneles[orden] = vigentes
+        return paneles
+
+    def registrar(self, pantalla_id, orden, llamado):
+        self.almacen.anotar(self._clave(pantalla_id, orden), {
+            'epoca':   self._epoca(),
+            'llamado': {**llamado, 'ts': time.time()},
+        }, self.por_panel, ttl=self.vigencia)
+
+    def recientes(self, pantalla_id):
+        """{orden (int): [llamados vigentes, el más nuevo al final]}"""
+        return self._leer(pantalla_id)
+
+    def ultimo(self, pantalla_id):
+        """El llamado vigente más nuevo de la pantalla (de cualquier panel), o None."""
+        llamados = [l[-1] for l in self._leer(pantalla_id).values()]
+        return max(llamados, key=lambda l: l['ts']) if llamados else None
+
+    def limpiar(self, pantalla_id, orden=None):
+        """Borra un panel o, sin orden, toda la pantalla."""
+        ordenes = range(self.max_paneles) if orden is None else (orden,)
+        for o in ordenes:
+            self.almacen.borrar(self._clave(pantalla_id, o))
+
+    def limpiar_todo(self):
+        self.almacen.guardar(self.CLAVE_EPOCA, uuid.uuid4().hex)
@@ -90,9 +90,20 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # objects restricted to another dialect with .ddl_if(dialect=...) (e.g. the
+    # PostgreSQL-only ix_turnos_codigo_turno_pattern) are not created there,
+    # so autogenerate must not report them as missing
+    def include_object(object, name, type_, reflected, compare_to):
+        ddl_if = getattr(object, '_ddl_if', None)
+        if ddl_if is None or ddl_if.dialect is None:
+            return True
+        return ddl_if.dialect == get_engine().dialect.name
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
 
     connectable = get_engine()
 
@@ -0,0 +1,72 @@
+"""paciente nombre_normalizado para detectar re-registros por índice
+
+Revision ID: 5c1d8e2f7b46
+Revises: b7e2c4d91a3f
+Create Date: 2026-10-18 10:03:54.902117
+
+"""
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1d8e2f7b46'
+down_revision = 'b7e2c4d91a3f'
+branch_labels = None
+depends_on = None
+
+
+def _normalizar_nombre(nombre):
+    # Copia de models.normalizar_nombre al momento de esta migración
+    if not nombre:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', nombre)
+    sin_acentos  = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_acentos.casefold().split())
+
+
+_ACENTUADAS = 'áàâäãåéèêëíìîïóòôöõúùûüñçÁÀÂÄÃÅÉÈÊËÍÌÎÏÓÒÔÖÕÚÙÛÜÑÇ'
+_BASES      = 'aaaaaaeeeeiiiiooooouuuuncaaaaaaeeeeiiiiooooouuuunc'
+
+
+def _expresion_normalizada(conn, columna):
+    """
+    normalizar_nombre como expresión SQL, para rellenar la columna con un
+    solo UPDATE en lugar de uno por fila.
+    - SQLite: la misma función de Python registrada en la conexión.
+    - PostgreSQL: translate() de los acentos del español y regexp_replace()
+      de los espacios (sin depender de la extensión unaccent).
+    """
+    if conn.dialect.name == 'sqlite':
+        conn.connection.driver_connection.create_function(
+            'normalizar_nombre', 1, _normalizar_nombre, deterministic=True)
+        return sa.func.normalizar_nombre(columna)
+
+    sin_acentos = sa.func.translate(sa.func.lower(columna), _ACENTUADAS, _BASES)
+    return sa.func.btrim(sa.func.regexp_replace(sin_acentos, r'\s+', ' ', 'g'))
+
+
+def upgrade():
+    with op.batch_alter_table('pacientes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('nombre_normalizado', sa.String(length=100), nullable=True))
+
+    # Backfill de los pacientes existentes en un solo UPDATE
+    pacientes = sa.table('pacientes',
+                         sa.column('id', sa.String),
+                         sa.column('nombre', sa.String),
+                         sa.column('nombre_normalizado', sa.String))
+    conn = op.get_bind()
+    conn.execute(pacientes.update()
+                 .values(nombre_normalizado=_expresion_normalizada(conn, pacientes.c.nombre)))
+
+    with op.batch_alter_table('pacientes', schema=None) as batch_op:
+        batch_op.create_index('ix_pacientes_nombre_normalizado_medico_motivo',
+                              ['nombre_normalizado', 'medico_id', 'motivo'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('pacientes', schema=None) as batch_op:
+        batch_op.drop_index('ix_pacientes_nombre_normalizado_medico_motivo')
+        batch_op.drop_column('nombre_normalizado')
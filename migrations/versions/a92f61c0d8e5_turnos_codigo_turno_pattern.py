@@ -0,0 +1,34 @@
+"""indice text_pattern_ops sobre turnos.codigo_turno para busqueda por prefijo
+
+Revision ID: a92f61c0d8e5
+Revises: e4a09b3c6d12
+Create Date: 2026-10-18 12:41:19.630284
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a92f61c0d8e5'
+down_revision = 'e4a09b3c6d12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # En PostgreSQL (collation no-C) LIKE 'prefijo%' solo usa un índice text_pattern_ops.
+    # En SQLite postgresql_ops se ignora y quedaría un duplicado de ix_turnos_codigo_turno
+    # (generar_codigo_turno usa un rango sobre ese índice), así que no se crea.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.batch_alter_table('turnos', schema=None) as batch_op:
+        batch_op.create_index('ix_turnos_codigo_turno_pattern', ['codigo_turno'], unique=False,
+                              postgresql_ops={'codigo_turno': 'text_pattern_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.batch_alter_table('turnos', schema=None) as batch_op:
+        batch_op.drop_index('ix_turnos_codigo_turno_pattern')
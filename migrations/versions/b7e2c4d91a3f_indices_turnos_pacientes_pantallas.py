@@ -0,0 +1,48 @@
+"""indices compuestos y parciales para turnos, pacientes y pantalla_recepciones
+
+Revision ID: b7e2c4d91a3f
+Revises: 969594c9e24a
+Create Date: 2026-10-18 09:12:31.418205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2c4d91a3f'
+down_revision = '969594c9e24a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('turnos', schema=None) as batch_op:
+        # turno_activo, re-registro, buscar_paciente_codigo, eliminar_paciente
+        batch_op.create_index('ix_turnos_paciente_estado_created',
+                              ['paciente_id', 'estado', sa.text('created_at DESC')], unique=False)
+        # Parcial: solo la cola de pendientes (PostgreSQL y SQLite lo soportan)
+        batch_op.create_index('ix_turnos_pendientes_paciente_created',
+                              ['paciente_id', sa.text('created_at DESC')], unique=False,
+                              postgresql_where=sa.text("estado = 'pendiente'"),
+                              sqlite_where=sa.text("estado = 'pendiente'"))
+
+    with op.batch_alter_table('pacientes', schema=None) as batch_op:
+        # generar_codigo_paciente y la búsqueda de re-registro
+        batch_op.create_index('ix_pacientes_medico_motivo', ['medico_id', 'motivo'], unique=False)
+
+    with op.batch_alter_table('pantalla_recepciones', schema=None) as batch_op:
+        # llamar_paciente y _recepcionista_en_otra_pantalla
+        batch_op.create_index('ix_pantalla_recepciones_recepcionista_id', ['recepcionista_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('pantalla_recepciones', schema=None) as batch_op:
+        batch_op.drop_index('ix_pantalla_recepciones_recepcionista_id')
+
+    with op.batch_alter_table('pacientes', schema=None) as batch_op:
+        batch_op.drop_index('ix_pacientes_medico_motivo')
+
+    with op.batch_alter_table('turnos', schema=None) as batch_op:
+        batch_op.drop_index('ix_turnos_pendientes_paciente_created')
+        batch_op.drop_index('ix_turnos_paciente_estado_created')
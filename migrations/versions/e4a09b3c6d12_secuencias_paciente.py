@@ -0,0 +1,57 @@
+"""secuencias_paciente: contador atómico por medico+motivo
+
+Revision ID: e4a09b3c6d12
+Revises: 5c1d8e2f7b46
+Create Date: 2026-10-18 11:27:08.155732
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a09b3c6d12'
+down_revision = '5c1d8e2f7b46'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('secuencias_paciente',
+    sa.Column('medico_id', sa.String(length=36), nullable=False),
+    sa.Column('motivo', sa.String(length=100), nullable=False),
+    sa.Column('ultimo', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['medico_id'], ['usuarios.id'], ),
+    sa.PrimaryKeyConstraint('medico_id', 'motivo')
+    )
+
+    # Sembrar con la mayor secuencia ya usada (COUNT histórico o sufijo más alto)
+    pacientes = sa.table('pacientes',
+                         sa.column('medico_id', sa.String),
+                         sa.column('motivo', sa.String),
+                         sa.column('codigo_paciente', sa.String))
+    secuencias = sa.table('secuencias_paciente',
+                          sa.column('medico_id', sa.String),
+                          sa.column('motivo', sa.String),
+                          sa.column('ultimo', sa.Integer))
+
+    conn   = op.get_bind()
+    grupos = {}
+    for medico_id, motivo, codigo in conn.execute(
+            sa.select(pacientes.c.medico_id, pacientes.c.motivo, pacientes.c.codigo_paciente)
+            .where(pacientes.c.medico_id.isnot(None), pacientes.c.motivo.isnot(None))):
+        cantidad, maximo = grupos.get((medico_id, motivo), (0, 0))
+        sufijo = codigo.rsplit('-', 1)[-1] if codigo else ''
+        if sufijo.isdigit():
+            maximo = max(maximo, int(sufijo))
+        grupos[(medico_id, motivo)] = (cantidad + 1, maximo)
+
+    if grupos:
+        op.bulk_insert(secuencias, [
+            {'medico_id': medico_id, 'motivo': motivo, 'ultimo': max(cantidad, maximo)}
+            for (medico_id, motivo), (cantidad, maximo) in grupos.items()
+        ])
+
+
+def downgrade():
+    op.drop_table('secuencias_paciente')
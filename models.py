@@ -1,18 +1,22 @@
 # models.py - Modelos de base de datos con SQLAlchemy
 
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from cryptography.fernet import Fernet
 import uuid
 import random
 import string
+import unicodedata
 import os
 
 db = SQLAlchemy()
 
 _CIPHER_INSTANCE = None
 
+_CONSULTAR = object()   # Paciente.to_dict: codigo_turno no resuelto por quien llama
+
 def _get_cipher():
     global _CIPHER_INSTANCE
     if _CIPHER_INSTANCE is not None:
@@ -58,6 +62,19 @@ def decrypt_password(encrypted_password):
         return ""
 
 
+def normalizar_nombre(nombre):
+    """
+    Forma canónica de un nombre para detectar re-registros:
+    sin acentos, minúsculas y espacios colapsados.
+    "  José  PÉREZ " → "jose perez"
+    """
+    if not nombre:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', nombre)
+    sin_acentos  = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_acentos.casefold().split())
+
+
 # ==========================================
 # MODELO: Usuario
 # ==========================================
@@ -134,7 +151,9 @@ pantalla_recepciones = db.Table(
     db.Column('pantalla_id',      db.String(36), db.ForeignKey('pantallas.id'),  primary_key=True),
     db.Column('recepcionista_id', db.String(36), db.ForeignKey('usuarios.id'),   primary_key=True),
     db.Column('orden',            db.Integer,    default=0),
-    db.Column('asignado_at',      db.DateTime,   default=datetime.utcnow)
+    db.Column('asignado_at',      db.DateTime,   default=datetime.utcnow),
+    # llamar_paciente y _recepcionista_en_otra_pantalla filtran por recepcionista
+    db.Index('ix_pantalla_recepciones_recepcionista_id', 'recepcionista_id')
 )
 
 
@@ -169,44 +188,58 @@ class Pantalla(db.Model):
     def generar_codigo():
         return ''.join(random.choices(string.digits, k=6))
 
-    def _get_recepcionistas_ordenados(self):
+    @staticmethod
+    def dict_recepcionista(usuario, orden):
+        return {
+            'id':              str(usuario.id),
+            'nombre_completo': usuario.nombre_completo or usuario.usuario,
+            'usuario':         usuario.usuario,
+            'orden':           orden,
+        }
+
+    @staticmethod
+    def recepcionistas_por_pantalla(pantalla_ids):
         """
-        Devuelve lista de dicts con recepcionistas ordenados por 'orden'.
-        Usa db.select() para evitar el problema 'too many values to unpack'
-        que ocurre con db.session.query(tabla_asociacion, Modelo).
+        {pantalla_id: [recepcionistas ordenados por 'orden']} para varias
+        pantallas en UNA consulta (pantalla_recepciones JOIN usuarios).
         """
-        try:
-            # Paso 1: obtener (recepcionista_id, orden) de la tabla de asociación
-            stmt = db.select(
-                pantalla_recepciones.c.recepcionista_id,
-                pantalla_recepciones.c.orden
-            ).where(
-                pantalla_recepciones.c.pantalla_id == self.id
-            ).order_by(
-                pantalla_recepciones.c.orden
-            )
-            filas = db.session.execute(stmt).fetchall()
-
-            # Paso 2: cargar el objeto Usuario para cada fila
-            resultado = []
-            for fila in filas:
-                rid   = fila[0]
-                orden = fila[1]
-                u = db.session.get(Usuario, rid)
-                if u:
-                    resultado.append({
-                        'id':              str(u.id),
-                        'nombre_completo': u.nombre_completo or u.usuario,
-                        'usuario':         u.usuario,
-                        'orden':           orden,
-                    })
+        resultado = {pid: [] for pid in pantalla_ids}
+        if not resultado:
             return resultado
+        stmt = db.select(
+            pantalla_recepciones.c.pantalla_id,
+            pantalla_recepciones.c.orden,
+            Usuario
+        ).join(
+            Usuario, Usuario.id == pantalla_recepciones.c.recepcionista_id
+        ).where(
+            pantalla_recepciones.c.pantalla_id.in_(list(resultado))
+        ).order_by(
+            pantalla_recepciones.c.pantalla_id,
+            pantalla_recepciones.c.orden
+        )
+        for pantalla_id, orden, u in db.session.execute(stmt):
+            resultado[pantalla_id].append(Pantalla.dict_recepcionista(u, orden))
+        return resultado
+
+    @classmethod
+    def serializar(cls, pantallas):
+        """to_dict() de una lista de pantallas con un número fijo de consultas."""
+        pantallas = list(pantallas)
+        receps    = cls.recepcionistas_por_pantalla([p.id for p in pantallas])
+        return [p.to_dict(receps[p.id]) for p in pantallas]
+
+    def _get_recepcionistas_ordenados(self):
+        """Lista de dicts con los recepcionistas de esta pantalla ordenados por 'orden'."""
+        try:
+            return self.recepcionistas_por_pantalla([self.id])[self.id]
         except Exception as e:
             print(f'[WARN] _get_recepcionistas_ordenados error: {e}')
             return []
 
-    def to_dict(self):
-        receps = self._get_recepcionistas_ordenados()
+    def to_dict(self, recepcionistas=None):
+        """recepcionistas: lista ya cargada (ver serializar); si falta se consulta."""
+        receps = self._get_recepcionistas_ordenados() if recepcionistas is None else recepcionistas
         return {
             'id':                   self.id,
             'numero':               self.numero,
@@ -236,6 +269,7 @@ class Paciente(db.Model):
 
     id              = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     nombre          = db.Column(db.String(100), nullable=False)
+    nombre_normalizado = db.Column(db.String(100), nullable=True)   # ver normalizar_nombre()
     apellido        = db.Column(db.String(100), nullable=False, default='')
     codigo_paciente = db.Column(db.String(50),  unique=True, nullable=True, index=True)
     motivo          = db.Column(db.String(100), nullable=True)
@@ -243,10 +277,23 @@ class Paciente(db.Model):
     created_at      = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at      = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # generar_codigo_paciente y la búsqueda de re-registro
+        db.Index('ix_pacientes_medico_motivo', 'medico_id', 'motivo'),
+        # búsqueda de re-registro por nombre normalizado
+        db.Index('ix_pacientes_nombre_normalizado_medico_motivo',
+                 'nombre_normalizado', 'medico_id', 'motivo'),
+    )
+
     medico = db.relationship('Usuario', backref='pacientes', foreign_keys=[medico_id])
     turnos = db.relationship('Turno', backref='paciente', lazy='dynamic',
                              order_by='Turno.created_at.desc()')
 
+    @db.validates('nombre')
+    def _actualizar_nombre_normalizado(self, key, nombre):
+        self.nombre_normalizado = normalizar_nombre(nombre)
+        return nombre
+
     @property
     def turno_activo(self):
         return (Turno.query
@@ -259,14 +306,20 @@ class Paciente(db.Model):
         t = self.turno_activo
         return t.codigo_turno if t else None
 
-    def to_dict(self):
+    def to_dict(self, codigo_turno=_CONSULTAR):
+        """
+        `codigo_turno`: el código del turno activo si quien llama ya lo tiene
+        (p. ej. del índice de la cola); si no se pasa, se consulta.
+        """
+        if codigo_turno is _CONSULTAR:
+            codigo_turno = self.codigo_turno_activo
         return {
             'id':              self.id,
             'nombre':          self.nombre,
             'apellido':        self.apellido,
             'nombre_completo': f"{self.nombre} {self.apellido}".strip(),
             'codigo_paciente': self.codigo_paciente,
-            'codigo_turno':    self.codigo_turno_activo,
+            'codigo_turno':    codigo_turno,
             'motivo':          self.motivo,
             'medico_id':       self.medico_id,
             'medico_nombre':   self.medico.nombre_completo if self.medico else None,
@@ -309,6 +362,79 @@ class Turno(db.Model):
         return f'<Turno {self.codigo_turno} - {self.estado}>'
 
 
+# Turno activo de un paciente: paciente_id + estado, el más reciente primero
+db.Index('ix_turnos_paciente_estado_created',
+         Turno.paciente_id, Turno.estado, Turno.created_at.desc())
+
+# Búsqueda por prefijo de codigo_turno (generar_codigo_turno) con LIKE en PostgreSQL.
+# Solo PostgreSQL: en SQLite sería un duplicado de ix_turnos_codigo_turno
+db.Index('ix_turnos_codigo_turno_pattern', Turno.codigo_turno,
+         postgresql_ops={'codigo_turno': 'text_pattern_ops'}).ddl_if(dialect='postgresql')
+
+# Índice parcial: solo turnos pendientes (la cola de recepción)
+db.Index('ix_turnos_pendientes_paciente_created',
+         Turno.paciente_id, Turno.created_at.desc(),
+         postgresql_where=(Turno.estado == 'pendiente'),
+         sqlite_where=(Turno.estado == 'pendiente'))
+
+
+# ==========================================
+# MODELO: SecuenciaPaciente
+# ==========================================
+
+class SecuenciaPaciente(db.Model):
+    """
+    Contador por (médico, motivo) para la SECUENCIA de codigo_paciente.
+    Reemplaza el COUNT(*) de pacientes: O(1) y sin colisiones entre
+    registros simultáneos (la fila queda bloqueada hasta el commit).
+    """
+    __tablename__ = 'secuencias_paciente'
+
+    medico_id = db.Column(db.String(36),  db.ForeignKey('usuarios.id'), primary_key=True)
+    motivo    = db.Column(db.String(100), primary_key=True)
+    ultimo    = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def siguiente(cls, medico_id, motivo):
+        """
+        Reserva y devuelve el próximo número de secuencia.
+        UPDATE ... RETURNING es atómico; la primera vez de cada (médico, motivo)
+        se crea la fila sembrada con los pacientes que ya existían.
+        """
+        incrementar = (db.update(cls)
+                       .where(cls.medico_id == medico_id, cls.motivo == motivo)
+                       .values(ultimo=cls.ultimo + 1)
+                       .returning(cls.ultimo)
+                       .execution_options(synchronize_session=False))
+
+        valor = db.session.execute(incrementar).scalar()
+        if valor is not None:
+            return valor
+
+        valor = cls._semilla(medico_id, motivo) + 1
+        try:
+            with db.session.begin_nested():
+                db.session.add(cls(medico_id=medico_id, motivo=motivo, ultimo=valor))
+            return valor
+        except IntegrityError:
+            # Otro registro creó la fila al mismo tiempo → usar el contador
+            return db.session.execute(incrementar).scalar()
+
+    @staticmethod
+    def _semilla(medico_id, motivo):
+        """Mayor secuencia ya usada: el COUNT histórico o el sufijo más alto."""
+        codigos = [c for (c,) in db.session.execute(
+            db.select(Paciente.codigo_paciente)
+            .where(Paciente.medico_id == medico_id, Paciente.motivo == motivo)
+        )]
+        sufijos = [int(c.rsplit('-', 1)[-1]) for c in codigos
+                   if c and c.rsplit('-', 1)[-1].isdigit()]
+        return max([len(codigos)] + sufijos)
+
+    def __repr__(self):
+        return f'<SecuenciaPaciente {self.medico_id}/{self.motivo} = {self.ultimo}>'
+
+
 # ==========================================
 # FUNCIONES AUXILIARES
 # ==========================================
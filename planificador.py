@@ -0,0 +1,88 @@
+# planificador.py - Un solo greenlet para todos los vencimientos (grace period de screens)
+
+import heapq
+import itertools
+import threading
+import time
+
+
+class Planificador:
+    """
+    Heap de vencimientos atendido por un único greenlet. Los vencimientos se
+    miden con `reloj` (time.monotonic por defecto).
+
+    - programar(clave, vence): alta o reprogramación; la entrada anterior de
+      esa clave queda anulada (borrado perezoso en el heap).
+    - cancelar(clave): cancelación real, el vencimiento ya no se dispara.
+    - Los vencimientos se procesan en lote: al vencer el primero se espera
+      `ventana` segundos más y se entrega todo lo vencido en una sola llamada
+      a al_vencer([(clave, vence), ...]).
+
+    `iniciar` arranca el greenlet (socketio.start_background_task); se lanza
+    con la primera programación.
+    """
+
+    def __init__(self, al_vencer, ventana=0.5, iniciar=None, reloj=time.monotonic):
+        self.al_vencer  = al_vencer
+        self.ventana    = ventana
+        self.reloj      = reloj
+        self._iniciar   = iniciar or (lambda f: threading.Thread(target=f, daemon=True).start())
+        self._heap      = []       # (vence, seq, clave)
+        self._vigentes  = {}       # clave → (vence, seq)
+        self._seq       = itertools.count()
+        self._lock      = threading.Lock()
+        self._despertar = threading.Event()
+        self._activo    = False
+
+    def programar(self, clave, vence):
+        with self._lock:
+            entrada = (vence, next(self._seq))
+            self._vigentes[clave] = entrada
+            heapq.heappush(self._heap, (*entrada, clave))
+            arrancar, self._activo = not self._activo, True
+        if arrancar:
+            self._iniciar(self._bucle)
+        self._despertar.set()
+
+    def cancelar(self, clave):
+        """True si la clave tenía un vencimiento pendiente."""
+        with self._lock:
+            return self._vigentes.pop(clave, None) is not None
+
+    def _limpiar_tope(self):
+        while self._heap:
+            vence, seq, clave = self._heap[0]
+            if self._vigentes.get(clave) == (vence, seq):
+                return
+            heapq.heappop(self._heap)
+
+    def _vencidos(self, ahora):
+        lote = []
+        while self._heap and self._heap[0][0] <= ahora:
+            vence, seq, clave = heapq.heappop(self._heap)
+            if self._vigentes.get(clave) == (vence, seq):
+                del self._vigentes[clave]
+                lote.append((clave, vence))
+        return lote
+
+    def _bucle(self):
+        while True:
+            self._despertar.clear()
+            with self._lock:
+                self._limpiar_tope()
+                ahora = self.reloj()
+                if not self._heap:
+                    espera = None
+                else:
+                    espera = self._heap[0][0] + self.ventana - ahora
+                    lote   = self._vencidos(ahora) if espera <= 0 else []
+
+            if espera is None or espera > 0:
+                self._despertar.wait(espera)
+                continue
+
+            if lote:
+                try:
+                    self.al_vencer(lote)
+                except Exception as e:
+                    print(f"[GRACE] ❌ Error procesando {len(lote)} vencimiento(s): {e}")
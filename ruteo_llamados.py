@@ -0,0 +1,104 @@
+# ruteo_llamados.py - Tabla en memoria recepcionista → pantalla/panel para llamar_paciente
+
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from models import db, Usuario, Pantalla, pantalla_recepciones
+
+
+RutaLlamado = namedtuple('RutaLlamado', 'pantalla_id orden nombre conectada')
+
+CLAVE_VERSION = 'ruteo:version'
+
+
+def cargar_rutas():
+    """
+    Todas las rutas con UNA consulta: pantalla_recepciones JOIN pantallas
+    vinculadas LEFT JOIN usuarios. Si un recepcionista figurara en más de una
+    pantalla, gana la de menor número.
+    """
+    filas = db.session.execute(
+        db.select(pantalla_recepciones.c.recepcionista_id,
+                  pantalla_recepciones.c.pantalla_id,
+                  pantalla_recepciones.c.orden,
+                  Usuario.nombre_completo,
+                  Pantalla.device_id)
+        .join(Pantalla, Pantalla.id == pantalla_recepciones.c.pantalla_id)
+        .outerjoin(Usuario, Usuario.id == pantalla_recepciones.c.recepcionista_id)
+        .where(Pantalla.estado == 'vinculada')
+        .order_by(Pantalla.numero.desc())
+    ).all()
+    return {str(rid): RutaLlamado(str(pid), orden, nombre or 'Sin asignar', device_id is not None)
+            for rid, pid, orden, nombre, device_id in filas}
+
+
+class TablaRuteo:
+    """
+    recepcionista_id → RutaLlamado(pantalla_id, orden, nombre, conectada).
+
+    Se carga al arrancar y se invalida desde las rutas que la modifican
+    (vincular / asignar / desvincular pantalla, reseteo por grace period,
+    edición o borrado de usuarios). La siguiente consulta la reconstruye.
+
+    La versión vive en el AlmacenEstado compartido: invalidar en un worker
+    obliga a los demás a recargar. Para no ir al almacén en cada llamado, la
+    versión se relee como mucho cada `revision` segundos; invalidar en este
+    worker tiene efecto en el acto, en los demás dentro de ese intervalo.
+    """
+
+    def __init__(self, almacen, cargar=cargar_rutas, revision=1.0, reloj=time.monotonic):
+        self.almacen     = almacen
+        self.revision    = revision
+        self._cargar     = cargar
+        self._reloj      = reloj
+        self._rutas      = None
+        self._version    = None     # versión con la que se cargó _rutas
+        self._vista      = None     # última versión leída del almacén
+        self._revisar_en = 0.0
+        self._lock       = threading.Lock()
+        self.cargas      = 0
+
+    def _version_compartida(self):
+        """Versión del almacén; entre revisiones, la última que se leyó."""
+        ahora = self._reloj()
+        if ahora >= self._revisar_en:
+            self._vista      = self.almacen.obtener(CLAVE_VERSION)
+            self._revisar_en = ahora + self.revision
+        return self._vista
+
+    def ruta(self, recepcionista_id):
+        rutas = self._rutas
+        if rutas is None:
+            rutas = self.reconstruir()
+        else:
+            version = self._version_compartida()
+            if version != self._version:
+                rutas = self.reconstruir(version)
+        return rutas.get(str(recepcionista_id))
+
+    def desactualizada(self):
+        """True si la próxima ruta() va a tener que recargar desde la BD."""
+        return self._rutas is None or self._version_compartida() != self._version
+
+    def reconstruir(self, version=None):
+        with self._lock:
+            if version is None:
+                version          = self.almacen.obtener(CLAVE_VERSION)
+                self._vista      = version
+                self._revisar_en = self._reloj() + self.revision
+            if self._rutas is not None and version == self._version:
+                return self._rutas
+            # La versión se lee ANTES de consultar: si alguien invalida en el
+            # medio, la próxima consulta vuelve a cargar
+            rutas = self._cargar()
+            self._rutas, self._version = rutas, version
+            self.cargas += 1
+            print(f"[RUTEO] 🔄 Tabla de llamados cargada: {len(rutas)} recepcionista(s)")
+            return rutas
+
+    def invalidar(self):
+        with self._lock:
+            self._rutas = None
+            self.almacen.guardar(CLAVE_VERSION, uuid.uuid4().hex)
@@ -0,0 +1,189 @@
+# sesiones_screen.py - Registro de las conexiones Socket.IO de las pantallas (TV)
+
+import threading
+import time
+
+from estado_compartido import AlmacenMemoria
+
+
+class SesionScreen:
+    """Conexión de una pantalla. Con __slots__: cientos de screens ocupan poco."""
+
+    __slots__ = ('sid', 'device_fp', 'pantalla_id', 'conectada', 'gracia_hasta')
+
+    def __init__(self, sid, device_fp=None, pantalla_id=None):
+        self.sid          = sid
+        self.device_fp    = device_fp
+        self.pantalla_id  = pantalla_id
+        self.conectada    = True
+        self.gracia_hasta = None    # time.time() en que vence el grace period (si está desconectada)
+
+
+class RegistroSesionesScreen:
+    """
+    Sesiones de screens en dos niveles:
+
+    - Local (este worker): los sids conectados acá, indexados por sid con
+      lookup O(1). Un sid solo existe en el proceso que lo aceptó.
+    - Compartido (AlmacenEstado): un registro por device fingerprint con su
+      sid actual, pantalla y grace period. Es lo que permite que una screen que
+      reconecta a OTRO worker cancele el reseteo que programó el anterior.
+
+    - Un device tiene una sola sesión: al reconectar con otro sid se migra
+      (y conserva su pantalla_id).
+    - Al desconectarse el sid sale del índice local; si tiene device,
+      su registro compartido queda en gracia y vence por TTL si nadie lo limpia.
+    - Todo registro compartido vence por TTL, también el de una screen
+      conectada: el worker que la atiende lo renueva (renovar_locales, cada
+      ttl/3) y también el polling de /api/screen/status (renovar_device). Si
+      el worker muere sin llegar a desconectar, el registro vence solo.
+    """
+
+    def __init__(self, almacen=None, ttl=300):
+        self.almacen  = almacen or AlmacenMemoria()
+        self.ttl      = ttl
+        self._por_sid = {}    # sid → SesionScreen
+        self._lock    = threading.Lock()
+
+    # ── Registro compartido por device ─────────────────────
+
+    @staticmethod
+    def _clave(device_fp):
+        return f'screen:{device_fp}'
+
+    def _leer(self, device_fp):
+        return self.almacen.obtener(self._clave(device_fp)) if device_fp else None
+
+    def _guardar(self, sesion):
+        """Publica la sesión con TTL (las conectadas se renuevan mientras sigan)."""
+        self.almacen.guardar(self._clave(sesion.device_fp), {
+            'sid':          sesion.sid,
+            'pantalla_id':  sesion.pantalla_id,
+            'conectada':    sesion.conectada,
+            'gracia_hasta': sesion.gracia_hasta,
+        }, ttl=self.ttl)
+
+    # ── Altas y cambios ────────────────────────────────────
+
+    def registrar(self, sid, device_fp=None, pantalla_id=None):
+        """
+        Alta (o reconexión) de una screen. Si el device ya tenía sesión con
+        otro sid (en este u otro worker), se migra a este sid y se cancela su
+        grace period. Devuelve el sid anterior migrado, o None.
+        """
+        with self._lock:
+            sid_anterior = None
+            previa       = self._por_sid.get(sid)
+            device_fp    = device_fp or (previa.device_fp if previa else None)
+            pantalla_id  = str(pantalla_id) if pantalla_id else None
+
+            registro = self._leer(device_fp)
+            if registro:
+                pantalla_id = pantalla_id or registro.get('pantalla_id')
+                if registro['sid'] != sid:
+                    # Reconexión: el device migra del sid viejo al nuevo
+                    sid_anterior = registro['sid']
+                    vieja = self._por_sid.get(sid_anterior)
+                    if vieja is not None and vieja.device_fp == device_fp:
+                        del self._por_sid[sid_anterior]
+
+            if previa is not None:
+                # El sid ya estaba registrado (p. ej. join_screen_propia antes que join)
+                pantalla_id = pantalla_id or previa.pantalla_id
+                sesion = previa
+            else:
+                sesion = SesionScreen(sid)
+
+            sesion.device_fp    = device_fp
+            sesion.pantalla_id  = pantalla_id
+            sesion.conectada    = True
+            sesion.gracia_hasta = None
+            self._por_sid[sid]  = sesion
+            if device_fp:
+                self._guardar(sesion)
+            return sid_anterior
+
+    def asignar_pantalla(self, sid, pantalla_id):
+        with self._lock:
+            sesion = self._por_sid.get(sid)
+            if sesion is None:
+                return
+            sesion.pantalla_id = str(pantalla_id) if pantalla_id else None
+            if sesion.device_fp:
+                self._guardar(sesion)
+
+    def desconectar(self, sid, gracia=None):
+        """
+        Baja del sid. Si la sesión tiene device y se pasa `gracia` (segundos),
+        queda pendiente hasta sesion.gracia_hasta; si no, se elimina del todo.
+        Si el device ya reconectó con otro sid, no se toca su registro y
+        gracia_hasta queda en None. Devuelve la sesión (o None si el sid no era
+        de una screen).
+        """
+        with self._lock:
+            sesion = self._por_sid.pop(sid, None)
+            if sesion is None:
+                return None
+            sesion.conectada = False
+            if not sesion.device_fp:
+                return sesion
+
+            registro = self._leer(sesion.device_fp)
+            if registro and registro['sid'] != sid:
+                return sesion
+            if gracia is not None:
+                sesion.gracia_hasta = time.time() + gracia
+                self._guardar(sesion)
+            else:
+                self.almacen.borrar(self._clave(sesion.device_fp))
+            return sesion
+
+    def cancelar_gracia(self, device_fp):
+        """True si el device tenía un grace period pendiente."""
+        with self._lock:
+            registro = self._leer(device_fp)
+            if not registro or registro.get('gracia_hasta') is None:
+                return False
+            registro['gracia_hasta'] = None
+            self.almacen.guardar(self._clave(device_fp), registro, ttl=self.ttl)
+            return True
+
+    def renovar_locales(self):
+        """Renueva el TTL de los registros de las screens conectadas a este worker."""
+        with self._lock:
+            claves = [self._clave(s.device_fp) for s in self._por_sid.values() if s.device_fp]
+        if claves:
+            self.almacen.renovar(claves, self.ttl)
+        return len(claves)
+
+    def renovar_device(self, device_fp):
+        """Renueva el TTL del registro del device si está conectado (en cualquier worker)."""
+        registro = self._leer(device_fp)
+        if registro and registro['conectada']:
+            self.almacen.renovar([self._clave(device_fp)], self.ttl)
+
+    def gracia_vigente(self, device_fp, gracia_hasta):
+        """True si el grace period que vence en gracia_hasta sigue sin cancelarse."""
+        registro = self._leer(device_fp)
+        return bool(registro) and not registro['conectada'] and registro.get('gracia_hasta') == gracia_hasta
+
+    def quitar_device(self, device_fp):
+        """Elimina todo rastro del device (pantalla reseteada)."""
+        with self._lock:
+            registro = self._leer(device_fp)
+            if registro is None:
+                return
+            self.almacen.borrar(self._clave(device_fp))
+            sesion = self._por_sid.get(registro['sid'])
+            if sesion is not None and sesion.device_fp == device_fp:
+                del self._por_sid[sesion.sid]
+
+    # ── Consultas ──────────────────────────────────────────
+
+    def device_de(self, sid):
+        sesion = self._por_sid.get(sid)
+        return sesion.device_fp if sesion else None
+
+    def pantalla_de(self, sid):
+        sesion = self._por_sid.get(sid)
+        return sesion.pantalla_id if sesion else None
@@ -562,6 +562,17 @@ document.addEventListener('DOMContentLoaded', () => {
             );
         });
 
+        // Grace period vencido: el servidor agrupa todas las screens caídas en un solo aviso
+        socket.on('pantallas_desvinculadas', (data) => {
+            const numeros = (data.pantallas || []).map(p => p.numero).join(', ');
+            document.getElementById('modalGestionarRecepcionistas')?.remove();
+            cargarPantallas();
+            mostrarMensajePantallas(
+                `⚠️ Pantalla${data.pantallas?.length > 1 ? 's' : ''} ${numeros || '?'} se desconect${data.pantallas?.length > 1 ? 'aron' : 'ó'}`,
+                'warning'
+            );
+        });
+
         socket.on('usuario_desactivado', (data) => {
             if (data.rol === 'recepcion') limpiarRecepcionistaEliminado(data.usuario_id);
         });
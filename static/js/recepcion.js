@@ -11,6 +11,7 @@ let codigosAnteriores = {};
 let intervaloRefresco = null;
 let socket            = null;
 let historialLlamados = [];
+let cursorCola        = null;   // cursor del feed incremental (/api/recepcion/pacientes?since=)
 const INTERVALO_REFRESCO_MS = 15_000;
 
 // ==================== INICIALIZACIÓN ====================
@@ -23,7 +24,7 @@ document.addEventListener('DOMContentLoaded', () => {
     cargarPacientes();
     cargarPapelera();
     conectarSocket();
-    intervaloRefresco = setInterval(cargarPacientes, INTERVALO_REFRESCO_MS);
+    intervaloRefresco = setInterval(sincronizarCola, INTERVALO_REFRESCO_MS);
 });
 
 window.addEventListener('beforeunload', () => {
@@ -45,6 +46,14 @@ function conectarSocket() {
         console.log('✅ Unido a sala:', data.room);
     });
 
+    // ── Servidor saturado: reintentar el evento descartado ──
+    socket.on('servidor_ocupado', (data) => {
+        console.warn(`⏳ Servidor ocupado — reintentando '${data.evento}' en ${data.retry_after}s`);
+        setTimeout(() => {
+            if (socket && socket.connected) socket.emit(data.evento, data.datos);
+        }, data.retry_after * 1000);
+    });
+
     socket.on('disconnect', () => {
         console.log('🔌 Socket desconectado — usando fallback de 15s');
     });
@@ -436,40 +445,106 @@ async function cargarPacientes() {
             return;
         }
 
-        if (!data.medicos || data.medicos.length === 0) {
-            mostrarEmptyState('medicosContainer', 'No hay médicos con pacientes registrados');
-            pacientesData = {};
+        aplicarColaCompleta(data);
+
+    } catch (error) {
+        console.error('Error al cargar pacientes:', error);
+    }
+}
+
+// ── Refresco periódico: solo pide lo que cambió desde cursorCola ──
+async function sincronizarCola() {
+    if (!cursorCola) { cargarPacientes(); return; }
+    try {
+        const response = await Auth.fetch(
+            `/api/recepcion/pacientes?since=${encodeURIComponent(cursorCola)}`, { method: 'GET' });
+        const data     = await response.json();
+
+        if (!response.ok) {
+            console.error('Error al sincronizar cola:', data.message);
+            return;
+        }
+
+        if (data.completo) {            // cursor vencido → el servidor manda todo
+            aplicarColaCompleta(data);
             return;
         }
 
-        const codigosNuevos = {};
-        data.medicos.forEach(medico => {
-            (medico.pacientes || []).forEach(p => {
-                codigosNuevos[p.id] = p.codigo;
-            });
-        });
+        cursorCola = data.cursor;
+        if (!data.hay_cambios) return;
 
-        const cambios = {};
-        Object.entries(codigosNuevos).forEach(([pid, codigoNuevo]) => {
-            const codigoAnterior = codigosAnteriores[pid];
-            if (codigoAnterior && codigoAnterior !== codigoNuevo) {
-                cambios[pid] = { anterior: codigoAnterior, nuevo: codigoNuevo };
-            }
-        });
+        aplicarCambiosCola(data);
+
+    } catch (error) {
+        console.error('Error al sincronizar cola:', error);
+    }
+}
 
-        codigosAnteriores = codigosNuevos;
+function aplicarColaCompleta(data) {
+    cursorCola = data.cursor || null;
 
+    if (!data.medicos || data.medicos.length === 0) {
+        mostrarEmptyState('medicosContainer', 'No hay médicos con pacientes registrados');
         pacientesData = {};
-        data.medicos.forEach(m => { pacientesData[m.id] = m; });
+        return;
+    }
 
-        renderizarMedicos(data.medicos, cambios);
+    const codigosNuevos = {};
+    data.medicos.forEach(medico => {
+        (medico.pacientes || []).forEach(p => {
+            codigosNuevos[p.id] = p.codigo;
+        });
+    });
 
-        if (Object.keys(cambios).length > 0) {
-            mostrarNotificacionCambio(cambios);
+    const cambios = {};
+    Object.entries(codigosNuevos).forEach(([pid, codigoNuevo]) => {
+        const codigoAnterior = codigosAnteriores[pid];
+        if (codigoAnterior && codigoAnterior !== codigoNuevo) {
+            cambios[pid] = { anterior: codigoAnterior, nuevo: codigoNuevo };
         }
+    });
 
-    } catch (error) {
-        console.error('Error al cargar pacientes:', error);
+    codigosAnteriores = codigosNuevos;
+
+    pacientesData = {};
+    data.medicos.forEach(m => { pacientesData[m.id] = m; });
+
+    renderizarMedicos(data.medicos, cambios);
+
+    if (Object.keys(cambios).length > 0) {
+        mostrarNotificacionCambio(cambios);
+    }
+}
+
+function aplicarCambiosCola(data) {
+    const cambios = {};
+
+    (data.removidos || []).forEach(r => {
+        const medico = pacientesData[r.medico_id];
+        if (medico) medico.pacientes = medico.pacientes.filter(p => p.id != r.id);
+        delete codigosAnteriores[r.id];
+    });
+
+    (data.actualizados || []).forEach(({ medico_id, paciente }) => {
+        const medico = pacientesData[medico_id];
+        if (!medico) return;
+        const idx = medico.pacientes.findIndex(p => p.id == paciente.id);
+        if (idx >= 0) medico.pacientes[idx] = paciente;
+        else          medico.pacientes.push(paciente);
+
+        const codigoAnterior = codigosAnteriores[paciente.id];
+        if (codigoAnterior && codigoAnterior !== paciente.codigo) {
+            cambios[paciente.id] = { anterior: codigoAnterior, nuevo: paciente.codigo };
+        }
+        codigosAnteriores[paciente.id] = paciente.codigo;
+    });
+
+    const medicos = Object.values(pacientesData);
+    medicos.forEach(m => { m.total_pacientes = m.pacientes.length; });
+    renderizarMedicos(medicos, cambios);
+
+    if (Object.keys(cambios).length > 0) {
+        mostrarNotificacionCambio(cambios);
     }
 }
 
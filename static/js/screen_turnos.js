@@ -131,11 +131,10 @@ async function _procesarColaAudio() {
 }
 async function reproducirAudio(texto) {
     try {
-        const res  = await fetch('/api/tts', { method:'POST', headers:{'Content-Type':'application/json'}, body:JSON.stringify({texto}) });
-        const data = await res.json();
-        if (!data.success) return;
+        // Un solo GET: la URL depende solo del texto y la respuesta es inmutable,
+        // así que un anuncio repetido sale del cache del navegador.
         const audio = _getAudio();
-        audio.src = data.url + '?t=' + Date.now();
+        audio.src = '/api/tts/audio?texto=' + encodeURIComponent(texto);
         audio.volume = 1.0;
         return new Promise(resolve => {
             let done = false;
@@ -267,6 +266,19 @@ function mostrarTurnoEnPanel(orden, codigo, nombre, medico, hablar = true) {
     }
 }
 
+// Estado reciente de todos los paneles (reconexión): { paneles: { orden: [llamados] } }.
+// Se muestra el último de cada panel; solo se anuncia si esta screen no lo había mostrado.
+function restaurarLlamados(data) {
+    Object.entries(data?.paneles || {}).forEach(([orden, llamados]) => {
+        const ultimo = llamados[llamados.length - 1];
+        if (!ultimo) return;
+        const i      = Number(orden);
+        const previo = recuperarUltimoLlamado(i);
+        const medico = ultimo.medico || ultimo.medico_nombre || null;
+        mostrarTurnoEnPanel(i, ultimo.codigo, ultimo.nombre, medico, previo?.codigo !== ultimo.codigo);
+    });
+}
+
 function resolverOrdenPanel(data) {
     if (data.panel_orden !== undefined && data.panel_orden !== null) return data.panel_orden;
     if (data.recepcionista_id) {
@@ -336,8 +348,11 @@ function registrarListeners(socketInstance) {
         const receps = data.recepcionistas;
         if (receps && receps.length > 0) construirPaneles(receps);
         else if (data.numRecepcion) construirPaneles([{ id:null, nombre_completo:data.numRecepcion, orden:0 }]);
+        socket.emit('pedir_estado_llamados');
     });
 
+    socket.on('estado_llamados', restaurarLlamados);
+
     socket.on('recepcionistas_asignados', (data) => {
         if (data.recepcionistas && data.recepcionistas.length > 0) construirPaneles(data.recepcionistas);
     });
@@ -740,5 +740,6 @@ function conectarSocketAdmin() {
     // ── Pantallas ──
     socketAdmin.on('pantalla_vinculada',     () => { if (typeof cargarPantallas === 'function') cargarPantallas(); });
     socketAdmin.on('pantalla_desvinculada',  () => { if (typeof cargarPantallas === 'function') cargarPantallas(); });
+    socketAdmin.on('pantallas_desvinculadas', () => { if (typeof cargarPantallas === 'function') cargarPantallas(); });
     socketAdmin.on('recepcionista_asignado', () => { if (typeof cargarPantallas === 'function') cargarPantallas(); });
 }
\ No newline at end of file
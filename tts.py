@@ -0,0 +1,690 @@
+# tts.py - Síntesis de voz para los anuncios de las pantallas
+
+import atexit
+import hashlib
+import json
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from estado_compartido import AlmacenMemoria
+from tts_proveedores import CadenaTTS, ProveedorGTTS
+
+
+# ── Textos de anuncio (mismo armado que encolarAnuncio en screen_turnos.js) ──
+
+def formatear_codigo_para_voz(codigo):
+    """'M-C-001' → 'M, C, 1' (letras deletreadas, números sin ceros a la izquierda)."""
+    if not codigo:
+        return ''
+    partes = []
+    for p in re.split(r'[-_]', codigo):
+        if re.fullmatch(r'[A-Za-z]+', p):
+            partes.append(' '.join(p))
+        elif re.fullmatch(r'\d+', p):
+            partes.append(str(int(p)))
+        else:
+            partes.append(p)
+    return ', '.join(partes)
+
+
+def textos_anuncio(nombre, codigo, recepciones=()):
+    """
+    Textos que la pantalla pide a /api/tts al llamar a un paciente:
+    "Paciente X. Código Y." y un "Diríjase a recepción Z." por cada recepción.
+    """
+    texto1 = ''
+    if nombre and nombre.strip():
+        texto1 += f'Paciente {nombre}. '
+    texto1 += f'Código {formatear_codigo_para_voz(codigo)}.'
+
+    textos = [texto1]
+    for recepcion in recepciones:
+        num = re.sub(r'recepci[oó]n\s*', '', str(recepcion or ''), count=1, flags=re.IGNORECASE).strip()
+        if num:
+            textos.append(f'Diríjase a recepción {num}.')
+    return list(dict.fromkeys(textos))
+
+
+_RE_CODIGO_CRUDO = re.compile(r'\b[A-Za-z]{1,3}(?:[-_][A-Za-z0-9]+)+\b')
+
+
+def canonizar(texto):
+    """
+    Forma canónica de un texto antes de hashearlo, para que variantes que se
+    pronuncian igual compartan MP3:
+    NFC, espacios colapsados, puntuación sin repetir ni espacio previo,
+    códigos crudos expandidos ('M-C-001' → 'M, C, 1') y punto final.
+    """
+    texto = unicodedata.normalize('NFC', texto).replace('\u00a0', ' ')
+    texto = _RE_CODIGO_CRUDO.sub(
+        lambda m: formatear_codigo_para_voz(m.group()) if re.search(r'\d', m.group()) else m.group(),
+        texto)
+    texto = re.sub(r'\s+', ' ', texto).strip()
+    texto = re.sub(r'\s+([.,;:!?])', r'\1', texto)          # sin espacio antes
+    texto = re.sub(r'([.,;:!?])[.,;:!?]+', r'\1', texto)     # '..', '!!', '.,' → uno solo
+    texto = re.sub(r'([.,;:!?])(?=[^\s\d])', r'\1 ', texto)  # espacio después
+    if texto and texto[-1] not in '.!?':
+        texto += '.'
+    return texto
+
+
+_RE_LLAMADO   = re.compile(r'^(?:Paciente (?P<nombre>.+?)\. )?Código (?P<codigo>[^.!?]+)[.!?]$', re.IGNORECASE)
+_RE_RECEPCION = re.compile(r'^Diríjase a recepción (?P<num>.+?)[.!?]$', re.IGNORECASE)
+
+
+def fragmentos_anuncio(texto):
+    """
+    Parte un texto de textos_anuncio en fragmentos reutilizables:
+    'Paciente Juan. Código M, C, 1.' → ['Paciente', 'Juan', 'Código', 'M', 'C', '1']
+    Solo el nombre es único; frases fijas, letras y números se comparten entre
+    llamados. Devuelve None si el texto no sigue ninguna plantilla conocida.
+    """
+    m = _RE_LLAMADO.match(texto)
+    if m:
+        fragmentos = []
+        if m.group('nombre'):
+            fragmentos += ['Paciente', m.group('nombre')]
+        fragmentos.append('Código')
+        for parte in m.group('codigo').split(', '):
+            fragmentos += parte.split(' ') if re.fullmatch(r'[A-Za-z]( [A-Za-z])*', parte) else [parte]
+        return fragmentos
+
+    m = _RE_RECEPCION.match(texto)
+    if m:
+        return ['Diríjase a recepción', m.group('num')]
+    return None
+
+
+def frames_mp3(datos):
+    """Quita los tags ID3v2/ID3v1 para poder concatenar MP3 frame a frame."""
+    if datos[:3] == b'ID3' and len(datos) >= 10:
+        tam = (datos[6] << 21) | (datos[7] << 14) | (datos[8] << 7) | datos[9]
+        datos = datos[10 + tam:]
+    if datos[-128:-125] == b'TAG':
+        datos = datos[:-128]
+    return datos
+
+
+class CacheTTS:
+    """
+    Índice LRU de los MP3 del directorio de cache, con presupuesto en bytes.
+
+    - Tamaño y último uso de cada MP3 se persisten en un índice JSON: al
+      arrancar solo se hace stat de los archivos que no figuran en él.
+    - Al superar max_bytes se borran los MP3 menos usados, salvo los que
+      devuelve protegidos() (trabajos en curso y anuncios precalentados).
+    - Lleva contadores de hits, misses y desalojos para /api/tts/cache.
+    - Varios workers comparten el directorio: cada alta y baja de un MP3 se
+      anota en un registro del AlmacenEstado y cada worker aplica las de los
+      demás antes de consultar su índice. Así todos ven los mismos archivos
+      y llevan la misma cuenta de bytes. El último uso es de cada worker.
+    """
+
+    ARCHIVO_INDICE = '.indice.json'
+    GUARDAR_CADA   = 30     # segundos mínimos entre escrituras del índice
+    MAX_CAMBIOS    = 2000   # altas/bajas retenidas; un worker más atrasado reescanea el directorio
+    _PATRON_MP3    = re.compile(r'^([0-9a-f]{32})\.mp3$')   # excluye temporales .tmp-*
+
+    def __init__(self, directorio, max_bytes, protegidos=frozenset, almacen=None):
+        self.directorio  = directorio
+        self.max_bytes   = max_bytes       # 0 = sin límite
+        self.almacen     = almacen or AlmacenMemoria()
+        # Un registro por directorio: workers de otro host tienen su propio disco
+        self._clave      = f'tts:cache:{socket.gethostname()}:{os.path.abspath(directorio)}'
+        self._protegidos = protegidos
+        self._entradas   = OrderedDict()   # hash → [bytes, ultimo_uso], del menos al más reciente
+        self._bytes      = 0
+        self._secuencia  = 0               # última alta/baja del registro aplicada
+        self._lock       = threading.Lock()
+        self._sucio      = False
+        self._guardado   = time.monotonic()
+
+        self.hits              = 0
+        self.misses            = 0
+        self.desalojos         = 0
+        self.bytes_desalojados = 0
+
+        self._cargar()
+        atexit.register(self.guardar)
+
+    def _ruta(self, hash_key):
+        return os.path.join(self.directorio, f'{hash_key}.mp3')
+
+    def _ruta_indice(self):
+        return os.path.join(self.directorio, self.ARCHIVO_INDICE)
+
+    # ── Índice persistente ─────────────────────────────────
+
+    def _cargar(self):
+        try:
+            with open(self._ruta_indice()) as f:
+                guardado = json.load(f)
+        except (OSError, ValueError):
+            guardado = {}
+
+        # Posición del registro ANTES de mirar el directorio: lo anotado en el
+        # medio se aplica en la próxima consulta (aplicarlo dos veces no cambia nada)
+        self._secuencia, _ = self.almacen.anotaciones(self._clave, 0)
+        sin_indice = self._escanear(guardado)
+        self._sucio = sin_indice > 0 or len(guardado) != len(self._entradas)
+
+        print(f"[TTS] 📚 Cache: {len(self._entradas)} MP3, {self._bytes / 1048576:.1f} MB "
+              f"({sin_indice} fuera del índice)")
+        self.desalojar()
+        self.guardar()
+
+    def _escanear(self, conocidos):
+        """
+        Rehace el índice con los MP3 del directorio. De los que figuran en
+        `conocidos` (hash → [bytes, ultimo_uso]) no hace stat. Devuelve
+        cuántos hubo que mirar en disco.
+        """
+        presentes = [m.group(1) for m in map(self._PATRON_MP3.match, os.listdir(self.directorio)) if m]
+        entradas, sin_indice = [], 0
+        for hash_key in presentes:
+            dato = conocidos.get(hash_key)
+            if isinstance(dato, list) and len(dato) == 2:
+                entradas.append((hash_key, int(dato[0]), float(dato[1])))
+                continue
+            try:
+                st = os.stat(self._ruta(hash_key))
+            except OSError:
+                continue
+            entradas.append((hash_key, st.st_size, st.st_mtime))
+            sin_indice += 1
+
+        with self._lock:
+            self._entradas = OrderedDict((h, [tam, uso]) for h, tam, uso in sorted(entradas, key=lambda e: e[2]))
+            self._bytes    = sum(tam for _, tam, _ in entradas)
+        return sin_indice
+
+    # ── Registro compartido de altas y bajas ───────────────
+
+    def _anotar(self, operacion, hash_key, tam=0):
+        self.almacen.anotar(self._clave, {'op': operacion, 'hash': hash_key, 'bytes': tam},
+                            self.MAX_CAMBIOS)
+
+    def _sincronizar(self):
+        """
+        Aplica las altas y bajas anotadas (por este u otro worker) desde la
+        última aplicada. Si ya no están todas en el registro, reescanea el
+        directorio. Sin novedades cuesta una lectura del almacén.
+        """
+        leido = self.almacen.anotaciones_desde(self._clave, self._secuencia, self.MAX_CAMBIOS)
+        if leido is None:
+            secuencia, _ = self.almacen.anotaciones(self._clave, 0)
+            with self._lock:
+                conocidos = {h: list(e) for h, e in self._entradas.items()}
+            print(f"[TTS] 🔄 Cache: registro de cambios incompleto, reescaneando {self.directorio}")
+            self._escanear(conocidos)
+            with self._lock:
+                self._secuencia = secuencia
+                self._sucio     = True
+            return
+
+        _, cambios = leido
+        if not cambios:
+            return
+        with self._lock:
+            for seq, cambio in cambios:
+                if seq <= self._secuencia:
+                    continue   # ya aplicado por otra consulta concurrente
+                anterior = self._entradas.pop(cambio['hash'], None)
+                if anterior:
+                    self._bytes -= anterior[0]
+                if cambio['op'] == 'agregar':
+                    self._entradas[cambio['hash']] = [cambio['bytes'], time.time()]
+                    self._bytes += cambio['bytes']
+                self._secuencia = seq
+            self._sucio = True
+
+    def guardar(self):
+        """Escribe el índice (temporal + rename) si hubo cambios."""
+        with self._lock:
+            if not self._sucio:
+                return
+            datos = {h: list(e) for h, e in self._entradas.items()}
+            self._sucio    = False
+            self._guardado = time.monotonic()
+
+        fd, temporal = tempfile.mkstemp(dir=self.directorio, prefix='.tmp-', suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(datos, f)
+            os.replace(temporal, self._ruta_indice())
+        except OSError as e:
+            print(f"[TTS] ⚠️ No se pudo guardar el índice de cache: {e}")
+            try:
+                os.unlink(temporal)
+            except OSError:
+                pass
+
+    def _guardar_si_corresponde(self):
+        if time.monotonic() - self._guardado >= self.GUARDAR_CADA:
+            self.guardar()
+
+    # ── API ────────────────────────────────────────────────
+
+    def __contains__(self, hash_key):
+        self._sincronizar()
+        with self._lock:
+            return hash_key in self._entradas
+
+    def consultar(self, hash_key):
+        """True si el MP3 está en cache; cuenta hit/miss y renueva su último uso."""
+        self._sincronizar()
+        with self._lock:
+            entrada = self._entradas.get(hash_key)
+            if entrada is None:
+                self.misses += 1
+                return False
+            self.hits  += 1
+            entrada[1]  = time.time()
+            self._entradas.move_to_end(hash_key)
+            self._sucio = True
+        self._guardar_si_corresponde()
+        return True
+
+    def agregar(self, hash_key):
+        """Registra un MP3 recién escrito y desaloja si se pasó del presupuesto."""
+        try:
+            tam = os.path.getsize(self._ruta(hash_key))
+        except OSError:
+            return
+        self._anotar('agregar', hash_key, tam)
+        self._sincronizar()
+        self.desalojar()
+        self._guardar_si_corresponde()
+
+    def quitar(self, hash_key):
+        self._anotar('quitar', hash_key)
+        self._sincronizar()
+
+    def desalojar(self):
+        """Borra los MP3 menos usados hasta volver a max_bytes."""
+        if not self.max_bytes:
+            return 0
+        protegidos = set(self._protegidos())
+        victimas   = []
+        with self._lock:
+            sobran = self._bytes - self.max_bytes
+            for hash_key, (tam, _) in self._entradas.items():
+                if sobran <= 0:
+                    break
+                if hash_key in protegidos:
+                    continue
+                victimas.append((hash_key, tam))
+                sobran -= tam
+        if not victimas:
+            return 0
+
+        borrados = 0
+        for hash_key, tam in victimas:
+            try:
+                os.unlink(self._ruta(hash_key))
+            except FileNotFoundError:
+                pass       # otro worker lo desalojó primero (la baja se anota igual)
+            else:
+                borrados += 1
+                with self._lock:
+                    self.desalojos         += 1
+                    self.bytes_desalojados += tam
+            self._anotar('quitar', hash_key)
+        self._sincronizar()
+        if borrados:
+            print(f"[TTS] 🧹 Cache: {borrados} MP3 desalojados ({self._bytes / 1048576:.1f} MB en uso)")
+        return borrados
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                'archivos':          len(self._entradas),
+                'bytes':             self._bytes,
+                'max_bytes':         self.max_bytes,
+                'hits':              self.hits,
+                'misses':            self.misses,
+                'hit_ratio':         round(self.hits / consultas, 3) if consultas else None,
+                'desalojos':         self.desalojos,
+                'bytes_desalojados': self.bytes_desalojados,
+            }
+
+
+class MemoriaTTS:
+    """
+    LRU en RAM con los bytes de los MP3 más pedidos, delante del disco: los
+    replays (reconexión, varias pantallas, eco en recepción) no tocan el disco.
+    Presupuesto total en bytes; un MP3 mayor que max_archivo no entra.
+    """
+
+    def __init__(self, max_bytes, max_archivo=512 * 1024):
+        self.max_bytes   = max_bytes       # 0 = desactivada
+        self.max_archivo = max_archivo
+        self._datos      = OrderedDict()   # nombre_mp3 → bytes, del menos al más reciente
+        self._bytes      = 0
+        self._lock       = threading.Lock()
+        self.hits        = 0
+        self.misses      = 0
+
+    def obtener(self, nombre):
+        with self._lock:
+            datos = self._datos.get(nombre)
+            if datos is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._datos.move_to_end(nombre)
+            return datos
+
+    def guardar(self, nombre, datos):
+        if not self.max_bytes or len(datos) > min(self.max_archivo, self.max_bytes):
+            return
+        with self._lock:
+            anterior = self._datos.pop(nombre, None)
+            if anterior is not None:
+                self._bytes -= len(anterior)
+            self._datos[nombre] = datos
+            self._bytes += len(datos)
+            while self._bytes > self.max_bytes:
+                _, viejo = self._datos.popitem(last=False)
+                self._bytes -= len(viejo)
+
+    def quitar(self, nombre):
+        with self._lock:
+            datos = self._datos.pop(nombre, None)
+            if datos is not None:
+                self._bytes -= len(datos)
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                'archivos':  len(self._datos),
+                'bytes':     self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits':      self.hits,
+                'misses':    self.misses,
+                'hit_ratio': round(self.hits / consultas, 3) if consultas else None,
+            }
+
+
+class MotorTTS:
+    """
+    Genera los MP3 de los anuncios en un pool acotado de workers.
+
+    - El request no sintetiza: encarga un trabajo y espera con timeout.
+    - Pedidos simultáneos del mismo texto (varias pantallas anunciando el mismo
+      llamado) esperan el MISMO trabajo en vez de sintetizar cada uno.
+    - El MP3 se escribe en un temporal y se renombra: ninguna pantalla puede
+      descargar un archivo a medio escribir.
+    - Precalentado: al registrar un paciente se sintetizan sus anuncios en un
+      pool aparte de baja prioridad; un pedido en vivo nunca espera detrás.
+      El MP3 precalentado queda fijado (no se desaloja) hasta su primer uso.
+    - Los anuncios se arman con fragmentos cacheados (ver fragmentos_anuncio):
+      solo se sintetiza lo que falta, normalmente el nombre del paciente.
+      Con beep_mp3 configurado, un pedido con beep antepone ese sonido.
+    - La voz sale de una CadenaTTS (ver tts_proveedores.py). Si respondió un
+      proveedor de respaldo, el MP3 se sirve como <hash>-d.mp3 y no entra al
+      cache: el próximo pedido vuelve a intentar con el proveedor principal.
+    """
+
+    FIJADO_MAX = 12 * 3600   # segundos que un precalentado sin usar sigue fijado
+
+    def __init__(self, directorio, workers=3, timeout=15, lang='es', workers_prewarm=1, max_bytes=0,
+                 beep_mp3=None, proveedores=None, voz='com', memoria_bytes=0, almacen=None):
+        self.directorio    = directorio
+        self.timeout       = timeout
+        self.lang          = lang
+        self.voz           = voz
+        self.beep_mp3      = beep_mp3 if beep_mp3 and os.path.isfile(beep_mp3) else None
+        self.proveedores   = proveedores or CadenaTTS([ProveedorGTTS(lang, timeout, voz)])
+        self.sintesis      = 0       # llamadas a proveedores (frases enteras o fragmentos)
+        # Efecto de canonizar(): pedidos cuyo texto cambió y cuántos de ellos
+        # dieron hit (con el texto crudo habrían sido un MP3 nuevo)
+        self.pedidos           = 0
+        self.normalizados      = 0
+        self.hits_normalizados = 0
+        self._pool         = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tts')
+        self._pool_prewarm = ThreadPoolExecutor(max_workers=workers_prewarm, thread_name_prefix='tts-prewarm')
+        self._en_curso     = {}      # hash → (Future, prioridad)
+        self._descartar    = set()   # hashes a borrar cuando termine su trabajo
+        self._fijados      = {}      # hash precalentado → monotonic de cuando se encargó
+        self._lock         = threading.RLock()
+        os.makedirs(directorio, exist_ok=True)
+        self.cache         = CacheTTS(directorio, max_bytes, protegidos=self._protegidos, almacen=almacen)
+        self.memoria       = MemoriaTTS(memoria_bytes)
+        for nombre in os.listdir(directorio):
+            if nombre.endswith('-d.mp3'):          # respaldos de una ejecución anterior
+                os.unlink(os.path.join(directorio, nombre))
+
+    # ── Claves y rutas ─────────────────────────────────────
+
+    def clave(self, texto, beep=False):
+        """Hash del audio: texto canónico sin mayúsculas + idioma, voz y beep."""
+        partes = (self.lang, self.voz, 'beep' if beep else '', canonizar(texto).casefold())
+        return hashlib.md5('|'.join(partes).encode()).hexdigest()
+
+    @staticmethod
+    def nombre_archivo(hash_key, degradado=False):
+        return f'{hash_key}-d.mp3' if degradado else f'{hash_key}.mp3'
+
+    def ruta(self, hash_key, degradado=False):
+        return os.path.join(self.directorio, self.nombre_archivo(hash_key, degradado))
+
+    def clave_pedido(self, texto, beep=False):
+        """Hash con que obtener() guarda el texto (el beep solo cuenta si está configurado)."""
+        return self.clave(texto, beep and self.beep_mp3 is not None)
+
+    # ── API ────────────────────────────────────────────────
+
+    def obtener(self, texto, beep=False):
+        """
+        Devuelve (nombre_mp3, desde_cache) con el MP3 ya escrito en disco.
+        Lanza concurrent.futures.TimeoutError si la síntesis supera el timeout
+        (el trabajo sigue y queda en cache para el próximo pedido).
+        """
+        beep        = beep and self.beep_mp3 is not None
+        canonico    = canonizar(texto)
+        hash_key    = self.clave(canonico, beep)
+        normalizado = canonico != texto.strip()
+        with self._lock:
+            self._fijados.pop(hash_key, None)   # ya se usó: vuelve al LRU normal
+            self.pedidos      += 1
+            self.normalizados += normalizado
+        if self.cache.consultar(hash_key):
+            if normalizado:
+                with self._lock:
+                    self.hits_normalizados += 1
+            return self.nombre_archivo(hash_key), True
+
+        nombre = self.encargar(hash_key, canonico, beep=beep).result(timeout=self.timeout)
+        return nombre, False
+
+    def encargar(self, hash_key, texto, prioridad='alta', beep=False):
+        """
+        Future del trabajo de síntesis; reutiliza el que esté en curso.
+        Un pedido 'alta' que encuentra un precalentado todavía en cola lo
+        saca de esa cola y lo pasa al pool en vivo.
+        """
+        with self._lock:
+            self._descartar.discard(hash_key)
+            actual = self._en_curso.get(hash_key)
+            if actual is not None:
+                futuro, prio_actual = actual
+                if not (prioridad == 'alta' and prio_actual == 'baja' and futuro.cancel()):
+                    return futuro
+
+            pool   = self._pool if prioridad == 'alta' else self._pool_prewarm
+            futuro = pool.submit(self._sintetizar, hash_key, texto, beep)
+            self._en_curso[hash_key] = (futuro, prioridad)
+
+        futuro.add_done_callback(lambda f: self._terminar(hash_key, f))
+        return futuro
+
+    def en_curso(self, hash_key):
+        with self._lock:
+            return hash_key in self._en_curso
+
+    def promover(self, nombre):
+        """Sube a RAM un MP3 que se acaba de servir desde disco."""
+        if not self.memoria.max_bytes or nombre.endswith('-d.mp3'):
+            return
+        try:
+            if os.path.getsize(os.path.join(self.directorio, nombre)) > self.memoria.max_archivo:
+                return
+            with open(os.path.join(self.directorio, nombre), 'rb') as f:
+                self.memoria.guardar(nombre, f.read())
+        except OSError:
+            pass
+
+    def estadisticas_canon(self):
+        with self._lock:
+            return {
+                'pedidos':           self.pedidos,
+                'normalizados':      self.normalizados,
+                'hits_normalizados': self.hits_normalizados,
+            }
+
+    def precalentar(self, textos):
+        """Encarga en baja prioridad los textos que todavía no están en cache."""
+        encargados = 0
+        for texto in textos:
+            canonico = canonizar(texto)
+            hash_key = self.clave(canonico)
+            if hash_key in self.cache:
+                continue
+            with self._lock:
+                self._fijados[hash_key] = time.monotonic()
+            self.encargar(hash_key, canonico, prioridad='baja')
+            encargados += 1
+        return encargados
+
+    def descartar(self, textos):
+        """
+        Borra el audio de anuncios que ya no se van a reproducir (turno
+        reemplazado o eliminado). Si el trabajo sigue en curso se borra al terminar.
+        """
+        for texto in textos:
+            hash_key = self.clave(texto)
+            with self._lock:
+                self._fijados.pop(hash_key, None)
+                actual = self._en_curso.get(hash_key)
+                if actual is not None and not actual[0].cancel():
+                    self._descartar.add(hash_key)
+                    continue
+            self._borrar(hash_key)
+
+    # ── Internos ───────────────────────────────────────────
+
+    def _protegidos(self):
+        """Hashes que el LRU no puede borrar: en curso o precalentados sin usar."""
+        limite = time.monotonic() - self.FIJADO_MAX
+        with self._lock:
+            for hash_key in [h for h, t in self._fijados.items() if t < limite]:
+                del self._fijados[hash_key]
+            return set(self._en_curso) | set(self._fijados)
+
+    def _terminar(self, hash_key, futuro):
+        with self._lock:
+            actual = self._en_curso.get(hash_key)
+            if actual is not None and actual[0] is futuro:
+                del self._en_curso[hash_key]
+                if hash_key in self._descartar:
+                    self._descartar.discard(hash_key)
+                    self._borrar(hash_key)
+        if futuro.cancelled():
+            return
+        if futuro.exception() is not None:
+            print(f"[TTS] ❌ Error sintetizando {hash_key}: {futuro.exception()}")
+
+    def _borrar(self, hash_key):
+        self.cache.quitar(hash_key)
+        for degradado in (False, True):
+            self.memoria.quitar(self.nombre_archivo(hash_key, degradado))
+            try:
+                os.unlink(self.ruta(hash_key, degradado))
+                print(f"[TTS] 🗑️ MP3 descartado: {self.nombre_archivo(hash_key, degradado)}")
+            except FileNotFoundError:
+                pass
+
+    def _sintetizar(self, hash_key, texto, beep=False):
+        """Escribe el MP3 del texto y devuelve su nombre de archivo."""
+        if hash_key in self.cache:
+            return self.nombre_archivo(hash_key)
+
+        fragmentos = fragmentos_anuncio(texto)
+        if fragmentos is None and not beep:
+            datos, degradado = self._voz(texto)
+            return self._escribir(hash_key, datos, degradado)
+
+        partes, degradado = [], False
+        for fragmento in (fragmentos or [texto]):
+            datos, deg = self._fragmento(fragmento)
+            partes.append(datos)
+            degradado = degradado or deg
+        if beep:
+            with open(self.beep_mp3, 'rb') as f:
+                partes.insert(0, f.read())
+        return self._escribir(hash_key, b''.join(frames_mp3(p) for p in partes), degradado)
+
+    def _fragmento(self, texto):
+        """(MP3, degradado) de un fragmento: desde cache o sintetizado en el momento."""
+        hash_key = self.clave(texto)
+        if self.cache.consultar(hash_key):
+            datos = self.memoria.obtener(self.nombre_archivo(hash_key))
+            if datos is not None:
+                return datos, False
+            try:
+                with open(self.ruta(hash_key), 'rb') as f:
+                    datos = f.read()
+                self.memoria.guardar(self.nombre_archivo(hash_key), datos)
+                return datos, False
+            except FileNotFoundError:
+                self.cache.quitar(hash_key)
+        datos, degradado = self._voz(texto)
+        if not degradado:
+            self._escribir(hash_key, datos)
+        return datos, degradado
+
+    def _voz(self, texto):
+        self.sintesis += 1
+        return self.proveedores.sintetizar(texto)
+
+    def _escribir(self, hash_key, datos, degradado=False):
+        """
+        Escribe el MP3 (temporal + rename) y devuelve su nombre. El audio de
+        respaldo queda fuera del índice del cache.
+        """
+        ruta = self.ruta(hash_key, degradado)
+        fd, temporal = tempfile.mkstemp(dir=self.directorio, prefix='.tmp-', suffix='.mp3')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(datos)
+            os.replace(temporal, ruta)   # atómico: el archivo aparece completo o no aparece
+        except BaseException:
+            try:
+                os.unlink(temporal)
+            except OSError:
+                pass
+            raise
+
+        nombre = self.nombre_archivo(hash_key, degradado)
+        if degradado:
+            print(f"[TTS] 🔈 MP3 de respaldo: {nombre}")
+            return nombre
+
+        print(f"[TTS] 🔊 MP3 generado: {nombre}")
+        self.cache.agregar(hash_key)
+        self.memoria.guardar(nombre, datos)
+        try:
+            os.unlink(self.ruta(hash_key, degradado=True))
+        except FileNotFoundError:
+            pass
+        return nombre
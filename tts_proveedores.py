@@ -0,0 +1,203 @@
+# tts_proveedores.py - Proveedores de síntesis de voz con timeout, circuit breaker y fallback
+
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from io import BytesIO
+
+from gtts import gTTS
+
+
+# Todos los proveedores devuelven MP3 MPEG-2 Layer III, 24 kHz, mono, 64 kbps
+# (el formato de gTTS), para que los fragmentos se puedan concatenar
+# frame a frame sin importar quién generó cada uno.
+_CABECERA_FRAME = b'\xff\xf3\x84\xc4'
+_BYTES_FRAME    = 192      # 72 * 64000 / 24000
+_SEG_FRAME      = 0.024    # 576 muestras a 24 kHz
+
+
+class ErrorProveedor(Exception):
+    """Ningún proveedor pudo sintetizar el texto."""
+
+
+class Circuito:
+    """
+    Circuit breaker de un proveedor.
+
+    - cerrado:     se usa normalmente.
+    - abierto:     tras `umbral` fallos seguidos se saltea durante `espera` segundos.
+    - semiabierto: pasada la espera se deja pasar un solo intento; si sale bien
+                   se cierra, si falla vuelve a abrirse.
+    """
+
+    def __init__(self, umbral=3, espera=30):
+        self.umbral  = umbral
+        self.espera  = espera
+        self.fallos  = 0
+        self.estado  = 'cerrado'
+        self._abierto_desde = 0.0
+        self._lock   = threading.Lock()
+
+    def permitir(self):
+        with self._lock:
+            if self.estado == 'cerrado':
+                return True
+            if self.estado == 'abierto' and time.monotonic() - self._abierto_desde >= self.espera:
+                self.estado = 'semiabierto'
+                return True
+            return False    # abierto, o semiabierto con el intento de prueba en curso
+
+    def exito(self):
+        with self._lock:
+            self.fallos = 0
+            self.estado = 'cerrado'
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            if self.estado == 'semiabierto' or self.fallos >= self.umbral:
+                self.estado = 'abierto'
+                self._abierto_desde = time.monotonic()
+
+
+class Proveedor:
+    """
+    Interfaz de un motor de voz: sintetizar(texto) → bytes MP3.
+    degradado=True marca audio de respaldo que no debe quedar en el cache.
+    """
+
+    nombre    = 'base'
+    degradado = False
+
+    def __init__(self, lang='es', timeout=5, voz=None):
+        self.lang    = lang
+        self.timeout = timeout
+        self.voz     = voz
+
+    def disponible(self):
+        return True
+
+    def sintetizar(self, texto):
+        raise NotImplementedError
+
+
+class ProveedorGTTS(Proveedor):
+    """Google Translate TTS (requiere red). La voz es el dominio (tld): 'com', 'com.mx', 'es'..."""
+
+    nombre = 'gtts'
+
+    def sintetizar(self, texto):
+        buffer = BytesIO()
+        gTTS(text=texto, lang=self.lang, tld=self.voz or 'com', slow=False,
+             timeout=self.timeout).write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+class ProveedorEspeak(Proveedor):
+    """
+    Motor local sin red: espeak-ng (o espeak) genera WAV y ffmpeg lo pasa
+    al formato MP3 de gTTS. Disponible solo si ambos binarios están instalados.
+    """
+
+    nombre    = 'espeak'
+    degradado = True
+
+    def __init__(self, lang='es', timeout=5, voz=None):
+        super().__init__(lang, timeout, voz)
+        self._espeak = shutil.which('espeak-ng') or shutil.which('espeak')
+        self._ffmpeg = shutil.which('ffmpeg')
+
+    def disponible(self):
+        return bool(self._espeak and self._ffmpeg)
+
+    def sintetizar(self, texto):
+        fd, wav = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        try:
+            subprocess.run([self._espeak, '-v', self.lang, '-w', wav, texto],
+                           check=True, timeout=self.timeout, capture_output=True)
+            salida = subprocess.run([self._ffmpeg, '-loglevel', 'error', '-i', wav,
+                                     '-ar', '24000', '-ac', '1', '-b:a', '64k', '-f', 'mp3', '-'],
+                                    check=True, timeout=self.timeout, capture_output=True)
+            return salida.stdout
+        finally:
+            os.unlink(wav)
+
+
+class ProveedorSilencio(Proveedor):
+    """
+    Stub determinístico y sin dependencias: MP3 de silencio con una duración
+    proporcional al texto. Último recurso (la pantalla igual muestra el
+    llamado) y motor para probar todo el circuito sin red.
+    """
+
+    nombre    = 'silencio'
+    degradado = True
+
+    SEG_POR_CARACTER = 0.06
+
+    def sintetizar(self, texto):
+        frames = max(1, round(len(texto) * self.SEG_POR_CARACTER / _SEG_FRAME))
+        return (_CABECERA_FRAME + bytes(_BYTES_FRAME - 4)) * frames
+
+
+PROVEEDORES = {p.nombre: p for p in (ProveedorGTTS, ProveedorEspeak, ProveedorSilencio)}
+
+
+class CadenaTTS:
+    """
+    Prueba los proveedores en orden y devuelve el primero que responde.
+    Cada uno tiene su propio timeout y circuit breaker: un proveedor caído
+    se saltea sin esperar hasta que su circuito vuelve a semiabierto.
+    """
+
+    def __init__(self, proveedores, umbral=3, espera=30):
+        self.proveedores = [p for p in proveedores if p.disponible()]
+        if not self.proveedores:
+            raise ValueError('No hay ningún proveedor TTS disponible')
+        self.circuitos = {p.nombre: Circuito(umbral, espera) for p in self.proveedores}
+        self.usos      = {p.nombre: 0 for p in self.proveedores}
+
+    def sintetizar(self, texto):
+        """Devuelve (bytes_mp3, degradado)."""
+        ultimo_error = None
+        for proveedor in self.proveedores:
+            circuito = self.circuitos[proveedor.nombre]
+            if not circuito.permitir():
+                continue
+            try:
+                datos = proveedor.sintetizar(texto)
+                if not datos:
+                    raise ErrorProveedor(f'{proveedor.nombre} devolvió audio vacío')
+            except Exception as e:
+                circuito.fallo()
+                ultimo_error = e
+                print(f"[TTS] ⚠️ {proveedor.nombre} falló ({circuito.estado}): {e}")
+                continue
+            circuito.exito()
+            self.usos[proveedor.nombre] += 1
+            return datos, proveedor.degradado
+
+        raise ErrorProveedor(f'Ningún proveedor TTS respondió: {ultimo_error}')
+
+    def estado(self):
+        return [{
+            'nombre':    p.nombre,
+            'degradado': p.degradado,
+            'circuito':  self.circuitos[p.nombre].estado,
+            'fallos':    self.circuitos[p.nombre].fallos,
+            'usos':      self.usos[p.nombre],
+        } for p in self.proveedores]
+
+
+def crear_cadena(nombres, lang='es', timeout=5, umbral=3, espera=30, voz=None):
+    """'gtts,espeak,silencio' → CadenaTTS con los proveedores disponibles, en ese orden."""
+    proveedores = []
+    for nombre in [n.strip() for n in nombres.split(',') if n.strip()]:
+        if nombre not in PROVEEDORES:
+            raise ValueError(f'Proveedor TTS desconocido: {nombre}')
+        proveedores.append(PROVEEDORES[nombre](lang=lang, timeout=timeout, voz=voz))
+    return CadenaTTS(proveedores, umbral=umbral, espera=espera)
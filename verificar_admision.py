@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+"""
+verificar_admision.py - Control de admisión de app.py forzado a saturarse
+
+Arranca la app con capacidad 1 y ocupa ese único lugar con un request que
+queda bloqueado en un Event. Con la BD "saturada" lanza greenlets de cada
+prioridad y verifica que:
+
+  - lo que no entra en la cola recibe 503 con Retry-After, en el acto,
+  - un pedido de más prioridad desplaza al peor de la cola llena (503),
+  - al liberar el lugar se admite primero alta, después normal, después baja,
+  - llamar_paciente con el ruteo al día no pasa por la admisión (no espera
+    ni se descarta aunque la BD esté saturada),
+  - llamar_paciente que tiene que recargar el ruteo sí pasa: si vence la
+    espera se descarta y el recepcionista recibe error_llamada,
+  - join de una screen y login no pasan por la admisión: con la BD saturada
+    la screen igual entra a su sala y el login no recibe 503,
+  - limpiar_historial descartado recibe servidor_ocupado con retry_after y,
+    reemitido al liberarse la BD, se procesa.
+
+    python verificar_admision.py
+
+Corre contra la BD configurada y solo lee (llama y limpia con un
+recepcionista inexistente).
+"""
+
+import os
+import sys
+import uuid
+
+RETRY_AFTER = 3
+
+os.environ['ADMISION_CAPACIDAD']   = '1'
+os.environ['ADMISION_COLA']        = '3'
+os.environ['ADMISION_ESPERA']      = '10'
+os.environ['ADMISION_RETRY_AFTER'] = str(RETRY_AFTER)
+
+
+def main():
+    import app as aplicacion
+    from app import app, socketio, control_admision, tabla_ruteo
+    from admision import PRIORIDAD_ALTA, PRIORIDAD_NORMAL, PRIORIDAD_BAJA
+    import gevent
+    from gevent.event import Event
+
+    # ── Handler que retiene el único lugar hasta que se lo suelte ───────────
+    soltar      = Event()
+    ruta_normal = '/api/_verificar_admision/bloquear'
+    ruta_baja   = '/api/_verificar_admision/listado'
+
+    def bloquear():
+        soltar.wait()
+        return {'success': True}, 200
+
+    app.add_url_rule(ruta_normal, 'verificar_admision_bloquear', bloquear)
+    app.add_url_rule(ruta_baja, 'verificar_admision_listado', lambda: ({'success': True}, 200))
+    aplicacion._ADMISION_BAJA.add(ruta_baja)
+
+    # ── Orden en que la admisión deja pasar (por prioridad) ─────────────────
+    admitidos = []
+    original  = control_admision.entrar
+
+    def entrar_registrado(prioridad=PRIORIDAD_NORMAL):
+        original(prioridad)
+        admitidos.append(prioridad)
+    control_admision.entrar = entrar_registrado
+
+    respuestas = {}
+
+    def pedir(nombre, ruta):
+        r = app.test_client().get(ruta)
+        respuestas[nombre] = (r.status_code, r.headers.get('Retry-After'))
+
+    def llamar(nombre):
+        c = socketio.test_client(app)
+        c.emit('llamar_paciente', {'codigo': 'V-C-001', 'nombre': 'verificar',
+                                   'recepcionistaId': str(uuid.uuid4())})
+        respuestas[nombre] = [m['args'][0]['mensaje'] for m in c.get_received()
+                              if m['name'] == 'error_llamada']
+        c.disconnect()
+
+    def esperar(condicion, limite=5.0):
+        for _ in range(int(limite / 0.01)):
+            if condicion():
+                return True
+            gevent.sleep(0.01)
+        return False
+
+    def estado():
+        return control_admision.estadisticas()
+
+    def ruteo_al_dia():
+        with app.app_context():
+            tabla_ruteo.reconstruir()
+
+    errores = []
+
+    def comprobar(ok, mensaje):
+        print(f"   {'✅' if ok else '❌'} {mensaje}")
+        if not ok:
+            errores.append(mensaje)
+
+    print(f"\n🚦 Capacidad {control_admision.capacidad}, cola {control_admision.cola_max}, "
+          f"Retry-After {control_admision.retry_after}s\n")
+
+    ruteo_al_dia()
+    greenlets = [gevent.spawn(pedir, 'bloqueador', ruta_normal)]
+    comprobar(esperar(lambda: estado()['en_uso'] == 1), 'el bloqueador ocupa el único lugar')
+
+    # ── Cola: dos listados (baja) y un llamado que recarga el ruteo (alta) ──
+    greenlets += [gevent.spawn(pedir, 'baja_1', ruta_baja)]
+    esperar(lambda: estado()['en_cola'] == 1)
+    greenlets += [gevent.spawn(pedir, 'baja_2', ruta_baja)]
+    esperar(lambda: estado()['en_cola'] == 2)
+    tabla_ruteo.invalidar()
+    greenlets += [gevent.spawn(llamar, 'alta')]
+    comprobar(esperar(lambda: estado()['en_cola'] == 3), 'baja, baja y alta esperan en la cola')
+
+    # ── Cola llena: el de baja prioridad recibe 503 en el acto ──────────────
+    pedir('baja_rechazado', ruta_baja)
+    comprobar(respuestas['baja_rechazado'] == (503, str(RETRY_AFTER)),
+              f"cola llena → 503 con Retry-After {RETRY_AFTER} "
+              f"(recibido {respuestas['baja_rechazado']})")
+
+    # ── Uno normal desplaza al último de baja ───────────────────────────────
+    greenlets += [gevent.spawn(pedir, 'normal', ruta_normal)]
+    comprobar(esperar(lambda: 'baja_2' in respuestas), 'normal desplaza a un listado de la cola')
+    comprobar(respuestas.get('baja_2') == (503, str(RETRY_AFTER)),
+              f"el desplazado recibe 503 con Retry-After (recibido {respuestas.get('baja_2')})")
+
+    # ── Con el ruteo al día llamar_paciente no pasa por la admisión ─────────
+    ruteo_al_dia()
+    antes = estado()['admitidos']
+    llamar('alta_sin_bd')
+    comprobar(estado()['admitidos'] == antes and not any('ocupado' in m for m in respuestas['alta_sin_bd']),
+              'llamar_paciente con el ruteo al día no espera ni se descarta')
+
+    # ── Liberar: el lugar pasa por prioridad ────────────────────────────────
+    tabla_ruteo.invalidar()
+    del admitidos[:]
+    soltar.set()
+    gevent.joinall(greenlets, timeout=15)
+    comprobar(admitidos == [PRIORIDAD_ALTA, PRIORIDAD_NORMAL, PRIORIDAD_BAJA],
+              f"al liberar entra alta, después normal, después baja (orden {admitidos})")
+    comprobar(respuestas.get('baja_1') == (200, None) and respuestas.get('normal') == (200, None)
+              and respuestas.get('bloqueador') == (200, None), 'los admitidos responden 200')
+
+    # ── Llamado que necesita la BD y vence la espera: error_llamada ─────────
+    soltar.clear()
+    control_admision.espera = 0.2
+    bloqueador = gevent.spawn(pedir, 'bloqueador_2', ruta_normal)
+    esperar(lambda: estado()['en_uso'] == 1)
+    tabla_ruteo.invalidar()
+    llamar('alta_rechazado')
+    comprobar(any('ocupado' in m for m in respuestas['alta_rechazado']),
+              f"llamado descartado → error_llamada al recepcionista ({respuestas['alta_rechazado']})")
+
+    # ── Join y login con la BD saturada: no pasan por la admisión ───────────
+    antes  = estado()['admitidos']
+    screen = socketio.test_client(app)
+    screen.emit('join', {'room': 'screen'})
+    unido  = any(m['name'] == 'joined' for m in screen.get_received())
+    screen.disconnect()
+    comprobar(unido and estado()['admitidos'] == antes, 'join de una screen entra a la sala aunque la BD esté saturada')
+    login = app.test_client().post('/api/login', json={'usuario': 'nadie', 'password': 'x'})
+    comprobar(login.status_code != 503, f"login no recibe 503 con la BD saturada (recibido {login.status_code})")
+
+    # ── limpiar_historial descartado: servidor_ocupado y reintento ──────────
+    recepcion = socketio.test_client(app)
+    recepcion.emit('limpiar_historial', {'recepcionistaId': str(uuid.uuid4())})
+    ocupado = [m['args'][0] for m in recepcion.get_received() if m['name'] == 'servidor_ocupado']
+    comprobar(bool(ocupado) and ocupado[0]['evento'] == 'limpiar_historial'
+              and ocupado[0]['retry_after'] == RETRY_AFTER,
+              f"limpiar_historial descartado → servidor_ocupado con retry_after ({ocupado})")
+    soltar.set()
+    bloqueador.join(timeout=5)
+    if ocupado:
+        antes = estado()['admitidos']
+        recepcion.emit(ocupado[0]['evento'], ocupado[0]['datos'])
+        recibidos = [m['name'] for m in recepcion.get_received()]
+        comprobar(estado()['admitidos'] == antes + 1 and 'servidor_ocupado' not in recibidos,
+                  'el reintento tras retry_after se procesa')
+    recepcion.disconnect()
+
+    control_admision.entrar = original
+    final = estado()
+    comprobar(final['en_uso'] == 0 and final['en_cola'] == 0, 'no quedan lugares tomados')
+
+    print(f"\n{'❌ ' + str(len(errores)) + ' verificación(es) fallida(s)' if errores else '✅ Admisión acotada, 503 con Retry-After y prioridades respetadas'}\n")
+    return 1 if errores else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+verificar_consultas_cola.py - La cola de recepción cuesta UNA consulta, sin importar su tamaño
+
+Cuenta las ejecuciones de cursor (evento before_cursor_execute de SQLAlchemy)
+de consultar_cola_recepcion() con distintas cantidades de pacientes en
+espera. El payload debe armarse con exactamente una consulta en todos los
+casos (antes: 1 de médicos + 1 por médico + 1 por paciente).
+
+    python verificar_consultas_cola.py                  # 0, 10 y 100 pacientes
+    python verificar_consultas_cola.py -t 0 50 500
+
+Corre contra la BD configurada. Crea médicos y pacientes temporales y los
+borra al terminar.
+"""
+
+import argparse
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-t', '--tamanios', type=int, nargs='+', default=[0, 10, 100],
+                        help='pacientes en espera a probar')
+    parser.add_argument('-m', '--medicos', type=int, default=3)
+    args = parser.parse_args()
+
+    from app import app
+    from models import db, Usuario, Paciente, Turno
+    from cola_recepcion import consultar_cola_recepcion
+    from sqlalchemy import event
+
+    consultas = {'n': 0}
+
+    def contar(*_):
+        consultas['n'] += 1
+
+    prefijo = f'vq{uuid.uuid4().hex[:6]}'
+    with app.app_context():
+        medicos = []
+        for i in range(args.medicos):
+            medico = Usuario(usuario=f'{prefijo}_{i}', rol='medico',
+                             nombre_completo=f'Verificar Médico {i}', created_by='verificar')
+            medico.set_password(uuid.uuid4().hex)
+            db.session.add(medico)
+            medicos.append(medico)
+        db.session.commit()
+        medico_ids = [m.id for m in medicos]
+
+        print(f"\n🔎 Consultas de consultar_cola_recepcion() sobre {db.engine.dialect.name}\n")
+
+        fallos = creados = 0
+        ahora  = datetime.utcnow()
+        try:
+            for tamanio in sorted(args.tamanios):
+                for k in range(creados, tamanio):
+                    medico_id = medico_ids[k % len(medico_ids)]
+                    paciente  = Paciente(nombre=f'verificar {k}', apellido='', motivo='Consulta',
+                                         medico_id=medico_id, codigo_paciente=f'{prefijo}-{k}')
+                    db.session.add(paciente)
+                    db.session.flush()
+                    db.session.add(Turno(paciente_id=paciente.id, medico_id=medico_id,
+                                         fecha=ahora.date(), hora=ahora.time(), motivo='Consulta',
+                                         estado='pendiente', codigo_turno=f'{prefijo}-T{k}',
+                                         created_at=ahora + timedelta(microseconds=k)))
+                creados = max(creados, tamanio)
+                db.session.commit()
+
+                consultas['n'] = 0
+                event.listen(db.engine, 'before_cursor_execute', contar)
+                try:
+                    cola = consultar_cola_recepcion()
+                finally:
+                    event.remove(db.engine, 'before_cursor_execute', contar)
+
+                propios = sum(m['total_pacientes'] for m in cola if m['id'] in medico_ids)
+                ok = consultas['n'] == 1 and propios == creados
+                fallos += not ok
+                print(f"{'✅' if ok else '❌'} {creados:5d} pacientes en espera → "
+                      f"{consultas['n']} consulta(s), {propios} en el payload")
+        finally:
+            db.session.rollback()
+            paciente_ids = db.select(Paciente.id).where(Paciente.medico_id.in_(medico_ids))
+            Turno.query.filter(Turno.paciente_id.in_(paciente_ids)).delete(synchronize_session=False)
+            Paciente.query.filter(Paciente.medico_id.in_(medico_ids)).delete(synchronize_session=False)
+            Usuario.query.filter(Usuario.id.in_(medico_ids)).delete(synchronize_session=False)
+            db.session.commit()
+            db.session.remove()
+
+    print(f"\n{'✅ Una sola consulta en todos los casos' if not fallos else f'❌ {fallos} caso(s) con más de una consulta'}\n")
+    return 1 if fallos else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+"""
+verificar_difusion.py - Un emit hecho en un worker llega a los clientes de otro
+
+Levanta dos workers de la app (subprocess, puertos distintos) compartiendo
+SOCKETIO_COLA y ESTADO_URL, conecta una "screen" al worker B y una
+recepción al worker A, y verifica que los eventos emitidos desde A
+(limpiar_historial a la sala 'screen') lleguen a la screen del worker B.
+
+    python verificar_difusion.py                              # Redis falso local (fakeredis)
+    python verificar_difusion.py --cola redis://localhost:6379/0
+    python verificar_difusion.py --cola postgres              # LISTEN/NOTIFY (DATABASE_URL)
+
+Sin --cola usa fakeredis.TcpFakeServer como broker de prueba
+(pip install fakeredis; no es dependencia de la app).
+
+Con PostgreSQL (GestorPostgresNotify) además verifica:
+
+  - límite de NOTIFY: un evento de más de MAX_PAYLOAD bytes no cruza (se
+    entrega solo en el worker que lo emitió) y no traba los siguientes,
+  - reconexión: corta con pg_terminate_backend las conexiones LISTEN y de
+    publicación de los workers; el LISTEN debe volver solo y los eventos
+    siguientes cruzar igual.
+
+Sale con código 1 si algún evento no cruza de worker.
+"""
+
+import argparse
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _worker(puerto):
+    from app import app, socketio
+    socketio.run(app, host='127.0.0.1', port=puerto, use_reloader=False, log_output=False,
+                 allow_unsafe_werkzeug=True)
+
+
+def _esperar_puerto(puerto, timeout=30):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            socket.create_connection(('127.0.0.1', puerto), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def _broker_local():
+    from fakeredis import TcpFakeServer
+    puerto   = _puerto_libre()
+    servidor = TcpFakeServer(('127.0.0.1', puerto), server_type='redis')
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return f'redis://127.0.0.1:{puerto}/0', servidor
+
+
+def _url_postgres(cola):
+    url = os.environ.get('DATABASE_URL', '') if cola == 'postgres' else cola
+    return re.sub(r'^postgres(ql)?(\+\w+)?://', 'postgresql://', url)
+
+
+def _conexiones(url, canal, cortar=()):
+    """
+    pid → 'listen' / 'notify' de las conexiones de GestorPostgresNotify de los
+    workers. Antes de listar termina (pg_terminate_backend) los pids de `cortar`.
+    """
+    import psycopg2
+    conexion = psycopg2.connect(url)
+    conexion.autocommit = True
+    try:
+        with conexion.cursor() as cursor:
+            for pid in cortar:
+                cursor.execute('SELECT pg_terminate_backend(%s)', (pid,))
+            cursor.execute(
+                "SELECT pid, query FROM pg_stat_activity WHERE pid <> pg_backend_pid() "
+                "AND (query = %s OR query LIKE 'SELECT pg_notify(%%')", (f'LISTEN {canal}',))
+            return {pid: 'listen' if query.startswith('LISTEN') else 'notify'
+                    for pid, query in cursor.fetchall()}
+    finally:
+        conexion.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cola', help='SOCKETIO_COLA (default: fakeredis local)')
+    parser.add_argument('-n', '--eventos', type=int, default=20)
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker(args.worker)
+        return 0
+
+    import socketio
+
+    servidor = None
+    cola     = args.cola
+    if not cola:
+        cola, servidor = _broker_local()
+    entorno = {**os.environ, 'SOCKETIO_COLA': cola}
+    if cola.startswith('redis'):
+        entorno['ESTADO_URL'] = cola
+
+    puertos  = [_puerto_libre(), _puerto_libre()]
+    workers  = [subprocess.Popen([sys.executable, __file__, '--worker', str(p)], env=entorno,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                for p in puertos]
+    print(f"\n🔀 Cola: {cola}\n   Workers en :{puertos[0]} (A) y :{puertos[1]} (B)\n")
+
+    postgres  = cola == 'postgres' or cola.startswith(('postgres://', 'postgresql://', 'postgresql+'))
+    canal     = entorno.get('SOCKETIO_CANAL', 'turnero')
+    recibidos = []
+    errores   = []
+    try:
+        if not all(_esperar_puerto(p) for p in puertos):
+            print("❌ Los workers no arrancaron")
+            return 1
+
+        screen = socketio.Client()
+        screen.on('limpiar_historial', lambda data=None: recibidos.append(data or {}))
+        screen.connect(f'http://127.0.0.1:{puertos[1]}', transports=['polling'])
+        screen.emit('join', {'room': 'screen'})
+
+        recepcion = socketio.Client()
+        recepcion.connect(f'http://127.0.0.1:{puertos[0]}', transports=['polling'])
+        time.sleep(1)
+
+        def ronda(nombre, antes=None):
+            """Emite args.eventos limpiar_historial desde A y cuenta los que llegan a B."""
+            recibidos.clear()
+            inicio = time.perf_counter()
+            if antes:
+                recepcion.emit('limpiar_historial', antes)
+            for _ in range(args.eventos):
+                recepcion.emit('limpiar_historial', {})
+                time.sleep(0.05)
+            limite = time.monotonic() + 10
+            while len(recibidos) < args.eventos and time.monotonic() < limite:
+                time.sleep(0.1)
+            time.sleep(0.5)   # margen para lo que no debía llegar
+            duracion = time.perf_counter() - inicio
+            print(f"   {nombre:<22} {len(recibidos)}/{args.eventos} en B ({duracion:.2f}s)")
+            return recibidos.count({}), len(recibidos) - recibidos.count({})
+
+        llegaron, _ = ronda('Eventos')
+        if llegaron != args.eventos:
+            errores.append('hay eventos que no llegaron al otro worker')
+
+        if postgres:
+            from difusion_socketio import GestorPostgresNotify
+            url = _url_postgres(cola)
+
+            grande = {'recepcionistaId': 'x' * (GestorPostgresNotify.MAX_PAYLOAD + 100)}
+            llegaron, grandes = ronda('Payload > NOTIFY', antes=grande)
+            if grandes:
+                errores.append('un evento más grande que NOTIFY cruzó de worker')
+            if llegaron != args.eventos:
+                errores.append('tras un evento demasiado grande se perdieron los siguientes')
+
+            viejas = _conexiones(url, canal)
+            _conexiones(url, canal, cortar=viejas)
+            print(f"   Conexiones cortadas:   {len(viejas)} "
+                  f"({list(viejas.values()).count('listen')} LISTEN)")
+            limite = time.monotonic() + 15
+            while time.monotonic() < limite:
+                nuevas = [pid for pid, tipo in _conexiones(url, canal).items()
+                          if tipo == 'listen' and pid not in viejas]
+                if len(nuevas) >= len(puertos):
+                    break
+                time.sleep(0.2)
+            else:
+                errores.append('el LISTEN no se reconectó')
+            llegaron, _ = ronda('Tras reconexión')
+            if llegaron != args.eventos:
+                errores.append('tras cortar las conexiones los eventos no cruzan')
+
+        screen.disconnect()
+        recepcion.disconnect()
+    finally:
+        for w in workers:
+            w.terminate()
+        for w in workers:
+            w.wait(timeout=10)
+        if servidor:
+            servidor.shutdown()
+
+    print(f"\n{'❌ ' + '; '.join(errores) if errores else '✅ Todos los eventos cruzaron de worker'}\n")
+    return 1 if errores else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
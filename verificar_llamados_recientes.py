@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+verificar_llamados_recientes.py - Un panel con mucho movimiento no borra a los demás
+
+Contra un AlmacenEstado (memoria o Redis) verifica que HistorialLlamados:
+
+  - conserva el último llamado de un panel quieto aunque otro panel de la
+    misma pantalla reciba cientos de llamados,
+  - recorta cada panel a sus últimos `por_panel` llamados,
+  - no pierde llamados hechos a la vez desde varios workers (hilos con
+    instancias propias sobre el mismo almacén),
+  - limpia un panel sin tocar los demás, y la limpieza global los vacía.
+
+    python verificar_llamados_recientes.py                    # almacén en memoria
+    python verificar_llamados_recientes.py --estado redis://localhost:6379/0
+
+Usa una pantalla (y una época) de prueba con id aleatorio y las borra al terminar.
+"""
+
+import argparse
+import sys
+import threading
+import uuid
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--estado', default='', help='ESTADO_URL (default: memoria)')
+    parser.add_argument('-n', '--llamados', type=int, default=500, help='llamados al panel con movimiento')
+    args = parser.parse_args()
+
+    from estado_compartido import crear_almacen
+    from llamados_recientes import HistorialLlamados
+
+    pantalla = f'verificar-{uuid.uuid4().hex[:8]}'
+
+    class Historial(HistorialLlamados):
+        CLAVE_EPOCA = f'llamados:epoca:{pantalla}'   # la limpieza global no toca la real
+
+    almacen   = crear_almacen(args.estado)
+    historial = Historial(almacen, por_panel=3, vigencia=60)
+    errores   = []
+
+    def comprobar(ok, mensaje):
+        print(f"   {'✅' if ok else '❌'} {mensaje}")
+        if not ok:
+            errores.append(mensaje)
+
+    def codigos(orden):
+        return [l['codigo'] for l in historial.recientes(pantalla).get(orden, [])]
+
+    print(f"\n📺 HistorialLlamados sobre {almacen.nombre}\n")
+
+    historial.registrar(pantalla, 1, {'codigo': 'QUIETO'})
+    for i in range(args.llamados):
+        historial.registrar(pantalla, 0, {'codigo': f'A{i}'})
+    ultimos = [f'A{i}' for i in range(args.llamados - 3, args.llamados)]
+    comprobar(codigos(1) == ['QUIETO'], f'el panel quieto conserva su llamado tras {args.llamados} en otro panel')
+    comprobar(codigos(0) == ultimos, f'el panel con movimiento queda en sus últimos 3 ({codigos(0)})')
+    comprobar(historial.ultimo(pantalla)['codigo'] == ultimos[-1], 'ultimo() es el más nuevo de la pantalla')
+
+    workers = [Historial(almacen, por_panel=3, vigencia=60) for _ in range(2)]
+    hilos   = [threading.Thread(target=workers[k % 2].registrar, args=(pantalla, 2 + k % 2, {'codigo': f'W{k}'}))
+               for k in range(6)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    comprobar(sorted(codigos(2) + codigos(3)) == sorted(f'W{k}' for k in range(6)),
+              'llamados simultáneos desde dos workers: no se pierde ninguno')
+
+    historial.limpiar(pantalla, 0)
+    comprobar(not codigos(0) and codigos(1) == ['QUIETO'], 'limpiar un panel no toca los demás')
+    historial.limpiar_todo()
+    comprobar(historial.recientes(pantalla) == {} and historial.ultimo(pantalla) is None,
+              'la limpieza global vacía la pantalla')
+    historial.limpiar(pantalla)
+    almacen.borrar(Historial.CLAVE_EPOCA)
+
+    print(f"\n{'❌ ' + str(len(errores)) + ' verificación(es) fallida(s)' if errores else '✅ Cada panel conserva sus últimos llamados'}\n")
+    return 1 if errores else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+verificar_ruteo.py - La tabla de llamados no va al almacén en cada llamado
+
+Contra un AlmacenEstado (memoria o Redis) verifica que TablaRuteo:
+
+  - resuelve llamados seguidos sin leer la versión del almacén (una lectura
+    como mucho cada `revision` segundos),
+  - invalidar en el mismo worker recarga en el próximo llamado,
+  - invalidar en otro worker (otra instancia sobre el mismo almacén) se ve
+    pasada la revisión, y no antes,
+  - desactualizada() anticipa esa recarga sin consumirla.
+
+    python verificar_ruteo.py                    # almacén en memoria
+    python verificar_ruteo.py --estado redis://localhost:6379/0
+
+No usa la BD: las rutas salen de una función de carga de prueba. Toca la
+clave de versión real del ruteo (los workers en marcha recargan una vez).
+"""
+
+import argparse
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--estado', default='', help='ESTADO_URL (default: memoria)')
+    parser.add_argument('-n', '--llamados', type=int, default=1000, help='llamados seguidos')
+    args = parser.parse_args()
+
+    from estado_compartido import crear_almacen
+    from ruteo_llamados import TablaRuteo, RutaLlamado
+
+    almacen  = crear_almacen(args.estado)
+    lecturas = {'n': 0}
+    obtener  = almacen.obtener
+
+    def obtener_contado(clave):
+        lecturas['n'] += 1
+        return obtener(clave)
+    almacen.obtener = obtener_contado
+
+    ahora = {'t': 0.0}
+
+    def cargar():
+        return {'r1': RutaLlamado('p1', 0, 'Recepción 1', True)}
+
+    local   = TablaRuteo(almacen, cargar=cargar, revision=1.0, reloj=lambda: ahora['t'])
+    otro    = TablaRuteo(almacen, cargar=cargar, revision=1.0, reloj=lambda: ahora['t'])
+    errores = []
+
+    def comprobar(ok, mensaje):
+        print(f"   {'✅' if ok else '❌'} {mensaje}")
+        if not ok:
+            errores.append(mensaje)
+
+    print(f"\n🧭 TablaRuteo sobre {almacen.nombre}\n")
+
+    local.reconstruir()
+    lecturas['n'] = 0
+    for _ in range(args.llamados):
+        local.ruta('r1')
+    comprobar(lecturas['n'] == 0, f"{args.llamados} llamados dentro de la revisión: {lecturas['n']} lectura(s) del almacén")
+
+    ahora['t'] += 1.0
+    for _ in range(args.llamados):
+        local.ruta('r1')
+    comprobar(lecturas['n'] == 1 and local.cargas == 1, 'pasada la revisión se relee una vez la versión, sin recargar')
+
+    local.invalidar()
+    comprobar(local.desactualizada(), 'invalidar en el mismo worker: desactualizada() en el acto')
+    local.ruta('r1')
+    comprobar(local.cargas == 2, 'invalidar en el mismo worker recarga en el próximo llamado')
+
+    otro.invalidar()
+    ahora['t'] += 0.5
+    comprobar(not local.desactualizada() and local.ruta('r1') and local.cargas == 2,
+              'invalidar en otro worker no se ve antes de la revisión')
+    ahora['t'] += 0.5
+    comprobar(local.desactualizada(), 'pasada la revisión, desactualizada() ve la invalidación del otro worker')
+    comprobar(local.cargas == 2, 'desactualizada() no recarga')
+    local.ruta('r1')
+    comprobar(local.cargas == 3, 'y el siguiente llamado recarga')
+
+    almacen.obtener = obtener
+
+    print(f"\n{'❌ ' + str(len(errores)) + ' verificación(es) fallida(s)' if errores else '✅ La versión del ruteo se lee del almacén solo al revisar'}\n")
+    return 1 if errores else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())